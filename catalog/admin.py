@@ -1,8 +1,12 @@
+from django import forms
 from django.contrib import admin
 from django.contrib import messages
+from django.contrib.admin.helpers import ActionForm
 from django.utils.safestring import mark_safe
-from django.db.models import F
+from django.db.models import F, Q
 from .models import Category, Brand, Product, Tag, ProductDetail, Order, OrderItem
+from . import pricing, thumbnails
+from .signals import invalidate_bulk_changes
 
 class HasDiscountFilter(admin.SimpleListFilter):
     title = 'Со скидкой'
@@ -35,6 +39,10 @@ class BrandAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
 
+class PricingActionForm(ActionForm):
+    pricing_value = forms.DecimalField(label='Значение', required=False, max_digits=10, decimal_places=2)
+    dry_run = forms.BooleanField(label='Только показать', required=False)
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'price', 'old_price', 'discount_percent_edit', 'category', 'brand', 'is_available', 'status', 'created']
@@ -44,7 +52,13 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created', 'updated', 'image_preview']
     filter_horizontal = ['tags']
-    actions = ['mark_published', 'mark_unavailable', 'apply_discount_10']
+    list_select_related = ['category', 'brand']
+    show_full_result_count = False
+    action_form = PricingActionForm
+    actions = [
+        'mark_published', 'mark_unavailable', 'apply_discount_10',
+        'apply_percent_discount', 'apply_fixed_discount', 'revert_discount', 'round_prices',
+    ]
     
     fieldsets = (
         ('Основная информация', {
@@ -84,29 +98,60 @@ class ProductAdmin(admin.ModelAdmin):
     discount_percent_edit.short_description = 'Скидка %'
 
     def mark_published(self, request, queryset):
-        updated = queryset.update(status=Product.Status.PUBLISHED, is_available=True)
+        ids = list(queryset.values_list('pk', flat=True))
+        updated = Product.objects.filter(pk__in=ids).update(status=Product.Status.PUBLISHED, is_available=True)
+        invalidate_bulk_changes(ids)
         messages.success(request, f"Опубликовано и доступно: {updated} товаров")
     mark_published.short_description = 'Опубликовать и сделать доступными'
 
     def mark_unavailable(self, request, queryset):
-        updated = queryset.update(is_available=False)
+        ids = list(queryset.values_list('pk', flat=True))
+        updated = Product.objects.filter(pk__in=ids).update(is_available=False)
+        invalidate_bulk_changes(ids)
         messages.warning(request, f"Недоступно: {updated} товаров")
     mark_unavailable.short_description = 'Сделать недоступными'
 
+    def _reprice(self, request, queryset, operation, value=None):
+        try:
+            change = pricing.build_change(operation, value)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return
+        if request.POST.get('dry_run'):
+            stats = pricing.preview(queryset, change)
+            messages.info(
+                request,
+                f"{change.label}: выбрано {stats['matched']}, применимо к {stats['affected']}, "
+                f"цена изменится у {stats['changed']}; сумма цен {stats['current_total']} → {stats['new_total']} руб. "
+                f"(изменения не сохранены)"
+            )
+            return
+        updated = pricing.apply(queryset, change)
+        messages.success(request, f"{change.label}: обновлено {updated} товаров")
+
+    def _pricing_value(self, request):
+        return request.POST.get('pricing_value') or None
+
     def apply_discount_10(self, request, queryset):
-        count = 0
-        for p in queryset:
-            try:
-                old = float(p.price)
-                p.old_price = p.old_price or old
-                p.price = old * 0.9
-                p.save(update_fields=['price','old_price'])
-                count += 1
-            except Exception:
-                pass
-        messages.info(request, f"Скидка 10% применена к {count} товарам")
+        self._reprice(request, queryset, 'percent_discount', 10)
     apply_discount_10.short_description = 'Применить скидку 10%%'
 
+    def apply_percent_discount(self, request, queryset):
+        self._reprice(request, queryset, 'percent_discount', self._pricing_value(request))
+    apply_percent_discount.short_description = 'Скидка в процентах (значение — %%)'
+
+    def apply_fixed_discount(self, request, queryset):
+        self._reprice(request, queryset, 'fixed_discount', self._pricing_value(request))
+    apply_fixed_discount.short_description = 'Скидка в рублях (значение — сумма)'
+
+    def revert_discount(self, request, queryset):
+        self._reprice(request, queryset, 'revert_discount')
+    revert_discount.short_description = 'Отменить скидку'
+
+    def round_prices(self, request, queryset):
+        self._reprice(request, queryset, 'round', self._pricing_value(request) or 10)
+    round_prices.short_description = 'Округлить цены (значение — шаг, по умолчанию 10)'
+
     def get_urls(self):
         from django.urls import path
         urls = super().get_urls()
@@ -124,23 +169,14 @@ class ProductAdmin(admin.ModelAdmin):
         try:
             raw = request.POST.get('percent', '0')
             percent = max(0, min(99, int(float(raw))))
-            old_price = float(product.old_price) if product.old_price else None
-            if percent > 0:
-                if old_price is None or old_price <= 0:
-                    old_price = float(product.price)
-                new_price = old_price * (100.0 - percent) / 100.0
-                product.old_price = old_price
-                product.price = max(0.0, new_price)
-            else:
-                if old_price is not None:
-                    product.price = old_price
-                product.old_price = None
-            product.save(update_fields=['price','old_price'])
+            operation = 'percent_discount' if percent > 0 else 'revert_discount'
+            pricing.apply(Product.objects.filter(pk=product.pk), pricing.build_change(operation, percent))
+            product.refresh_from_db(fields=['price', 'old_price'])
             data = {
                 'success': True,
                 'percent': percent,
-                'price': f"{float(product.price):.2f}",
-                'old_price': f"{float(product.old_price):.2f}" if product.old_price else None,
+                'price': f"{product.price:.2f}",
+                'old_price': f"{product.old_price:.2f}" if product.old_price else None,
             }
             return JsonResponse(data)
         except Exception as e:
@@ -153,7 +189,10 @@ class ProductAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         try:
             if obj.image:
-                return mark_safe(f'<img src="{obj.image.url}" alt="{obj.name}" style="max-width:200px; height:auto; border:1px solid #e2e8f0; border-radius:6px;" />')
+                # Превью 200px: браузер возьмёт ближайшую копию из srcset
+                sets = thumbnails.srcsets(obj.image, obj.image_variants)
+                srcset = f' srcset="{sets[0]}" sizes="200px"' if sets else ''
+                return mark_safe(f'<img src="{obj.image.url}"{srcset} alt="{obj.name}" style="max-width:200px; height:auto; border:1px solid #e2e8f0; border-radius:6px;" />')
             return mark_safe('<span class="label">Нет изображения</span>')
         except Exception:
             return mark_safe('<span class="label">Нет изображения</span>')
@@ -178,6 +217,9 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ('product', 'quantity_edit', 'price', 'item_sum', 'delete_action')
     fields = ('product', 'quantity_edit', 'price', 'item_sum', 'delete_action')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('order', 'product')
+
     def quantity_edit(self, obj):
         try:
             if obj.order.status in [Order.Status.NEW, Order.Status.PROCESSING]:
@@ -193,8 +235,7 @@ class OrderItemInline(admin.TabularInline):
 
     def item_sum(self, obj):
         try:
-            total = float(obj.price) * int(obj.quantity)
-            return mark_safe(f'<span class="item-sum" data-item-id="{obj.id}">{total:.2f}</span>')
+            return mark_safe(f'<span class="item-sum" data-item-id="{obj.id}">{obj.amount:.2f}</span>')
         except Exception:
             return mark_safe('<span class="item-sum">-</span>')
     item_sum.short_description = 'Сумма'
@@ -211,14 +252,15 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['code', 'status', 'created', 'items_count', 'order_total']
+    list_display = ['code', 'status', 'created', 'items_count', 'total']
     list_filter = ['status', 'created']
     inlines = [OrderItemInline]
-    readonly_fields = ('created',)
+    readonly_fields = ('created', 'items_count', 'total_amount')
     change_form_template = 'admin/catalog/order/change_form.html'
+    show_full_result_count = False
     fieldsets = (
         (None, {
-            'fields': ('code', 'status', 'created')
+            'fields': ('code', 'status', 'created', 'items_count', 'total_amount')
         }),
     )
 
@@ -263,11 +305,10 @@ class OrderAdmin(admin.ModelAdmin):
                 return JsonResponse({'error': 'invalid_quantity'}, status=400)
             old_qty = item.quantity
             item.quantity = qty
-            item.save()
+            item.save(update_fields=['quantity'])
             self.log_change(request, item, f'Изменение количества {old_qty} → {qty} для товара {item.product} в заказе {order.code}')
-            item_sum = float(item.price) * item.quantity
-            order_total = sum(float(i.price) * i.quantity for i in order.items.all())
-            return JsonResponse({'success': True, 'item_sum': f'{item_sum:.2f}', 'order_total': f'{order_total:.2f}'})
+            order.refresh_from_db(fields=['total'])
+            return JsonResponse({'success': True, 'item_sum': f'{item.amount:.2f}', 'order_total': f'{order.total:.2f}'})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -296,8 +337,8 @@ class OrderAdmin(admin.ModelAdmin):
         products = Product.objects.published()
         if q:
             products = products.filter(
-                models.Q(name__icontains=q) |
-                models.Q(details__sku__icontains=q)
+                Q(name__icontains=q) |
+                Q(details__sku__icontains=q)
             )
         products = products.select_related('brand', 'category')[:50]
         extra = extra_context or {}
@@ -306,18 +347,9 @@ class OrderAdmin(admin.ModelAdmin):
         return super().changeform_view(request, object_id, form_url, extra)
 
     def total_amount(self, obj):
-        total = sum(float(i.price) * i.quantity for i in obj.items.all())
-        return mark_safe(f'<div id="order-total-amount">{total:.2f}</div>')
+        return mark_safe(f'<div id="order-total-amount">{obj.total:.2f}</div>')
     total_amount.short_description = 'Итоговая сумма'
 
-    def items_count(self, obj):
-        return obj.items.count()
-    items_count.short_description = 'Позиции'
-
-    def order_total(self, obj):
-        return f'{sum(float(i.price) * i.quantity for i in obj.items.all()):.2f}'
-    order_total.short_description = 'Итог'
-
     class Media:
         js = ('catalog/admin_order.js',)
         css = {'all': ('catalog/admin_order.css',)}
@@ -5,3 +5,10 @@ class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
     verbose_name = 'Каталог'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from . import checks, signals  # noqa: F401
+        from .suggest import warm_on_first_request
+
+        request_started.connect(warm_on_first_request, dispatch_uid='catalog_suggest_warmup')
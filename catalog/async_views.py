@@ -0,0 +1,130 @@
+"""Асинхронные (ASGI) варианты JSON API каталога.
+
+Поведение и формат ответов совпадают с ``product_list_api``,
+``product_detail_api``, ``suggest_api`` и ``search_api`` из ``catalog.views``;
+поиск по индексу (FTS5 или индекс в памяти) синхронный и выполняется
+в потоке через ``sync_to_async``, остальные запросы к БД
+идут через асинхронный ORM (``aaggregate``, ``aget``, ``async for`` по срезу
+queryset). Выгрузка отдаётся асинхронным итератором и читает товары порциями
+по диапазонам id, отдельным запросом на порцию (``catalog.streaming``),
+а не через ``aiterator()``. Под WSGI эти представления тоже работают,
+но выигрыш есть только под ASGI-сервером (uvicorn, daphne).
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .conditional import alist_validators, aobject_validators, conditional
+from .facets import get_facet_index
+from . import listing
+from .models import Product, ProductListing
+from .pagination import InvalidCursor, akeyset_paginate
+from .search import search_ids
+from .streaming import STREAM_FORMATS, astream_products
+from .suggest import get_suggest_index, suggestion_url
+from . import views
+
+
+@csrf_exempt
+async def product_list_api(request):
+    """Список товаров; POST (создание) выполняется синхронным представлением"""
+    if request.method != 'GET':
+        return await sync_to_async(views.product_list_api)(request)
+    etag, last_modified, count = await alist_validators(ProductListing.objects.all(), count=views._needs_count(request))
+
+    async def respond(request):
+        return await _product_list(request, count)
+
+    return await conditional(respond, lambda: (etag, last_modified))(request)
+
+
+async def _product_list(request, count):
+    export_format = request.GET.get('format')
+    if export_format:
+        if export_format not in STREAM_FORMATS:
+            return JsonResponse({'error': 'invalid_format'}, status=400)
+        return astream_products(ProductListing.objects.order_by('id'), export_format)
+
+    products = listing.api_values(ProductListing.objects.all())
+    try:
+        page_size = int(request.GET.get('page_size', 10))
+    except Exception:
+        page_size = 10
+    if views._is_cursor(request):
+        try:
+            cursor_page = await akeyset_paginate(
+                listing.api_values(ProductListing.objects.all(), 'created'),
+                request.GET.get('sort', '-created'),
+                request.GET.get('after'),
+                max(1, page_size),
+                count=(await sync_to_async(get_facet_index)()).size,
+            )
+        except InvalidCursor:
+            return JsonResponse({'error': 'invalid_cursor'}, status=400)
+        return JsonResponse({
+            'results': cursor_page.object_list,
+            'next': cursor_page.next_cursor,
+            'count': cursor_page.count,
+        })
+    paginator = Paginator(products, page_size)
+    paginator.count = count
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    return JsonResponse({
+        'results': [row async for row in page_obj.object_list],
+        'page': page_obj.number,
+        'pages': paginator.num_pages,
+        'count': paginator.count
+    })
+
+
+@csrf_exempt
+async def product_detail_api(request, product_id):
+    """Товар по id; PUT/DELETE выполняются синхронным представлением"""
+    if request.method != 'GET':
+        return await sync_to_async(views.product_detail_api)(request, product_id)
+    try:
+        product = await Product.objects.select_related('brand', 'category').aget(id=product_id)
+    except Product.DoesNotExist:
+        raise Http404('Товар не найден')
+    data = {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'description': product.description,
+        'brand': product.brand.name,
+        'category': product.category.name,
+    }
+    validators = await aobject_validators(product.updated)
+
+    async def respond(request):
+        return JsonResponse(data)
+
+    return await conditional(respond, lambda: validators)(request)
+
+
+async def suggest_api(request):
+    """Подсказки по префиксу; индекс в памяти, первая загрузка — в потоке"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(20, int(request.GET.get('limit', 10))))
+    except Exception:
+        limit = 10
+    index = await sync_to_async(get_suggest_index)()
+    results = [
+        {'type': kind, 'name': name, 'url': suggestion_url(kind, slug)}
+        for kind, name, slug in index.suggest(query, limit)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
+
+async def search_api(request):
+    """Полнотекстовый поиск; ранжирование — в потоке, строки витрины — асинхронным ORM"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(50, int(request.GET.get('limit', 20))))
+    except Exception:
+        limit = 20
+    ids = await sync_to_async(search_ids)(query, limit, ProductListing.objects.all())
+    rows = {row['id']: row async for row in listing.api_values(ProductListing.objects.filter(pk__in=ids))}
+    return JsonResponse({'query': query, 'results': [rows[pk] for pk in ids if pk in rows]})
@@ -0,0 +1,190 @@
+"""Пакетные операции над товарами для ``/catalog/api/products/batch/``.
+
+Пакет обрабатывается в три шага:
+
+1. разбор и проверка каждой операции; все упомянутые слаги категорий и
+   брендов, существующие слаги товаров и обновляемые/удаляемые товары
+   читаются одним запросом на вид данных;
+2. запись в одной транзакции: ``bulk_create``, ``bulk_update`` и одно
+   ``DELETE`` на все удаления;
+3. обновление производных индексов (поиск, фасеты, подсказки, кэш
+   фрагментов) один раз на пакет — ``bulk_*`` не шлют сигналов.
+
+Ошибка в одной операции не мешает остальным; с ``atomic=True`` пакет
+с любой ошибкой не применяется целиком.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Brand, Category, OrderItem, Product
+from .search import get_search_backend
+from .signals import invalidate_bulk_changes
+
+OPERATIONS = ('create', 'update', 'delete')
+TEXT_FIELDS = ('name', 'description')
+DECIMAL_FIELDS = ('price', 'old_price')
+# Слаг занят товаром, который создаётся в этом же пакете
+_NEW = object()
+
+
+class BatchError(ValueError):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def _decimal(value, field):
+    try:
+        value = Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        raise BatchError(f'invalid_{field}')
+    if not value.is_finite() or value <= 0:
+        raise BatchError(f'invalid_{field}')
+    return value.quantize(Decimal('0.01'))
+
+
+def _fields(item, categories, brands):
+    """Проверенные значения полей товара из операции create/update."""
+    values = {}
+    for field in TEXT_FIELDS:
+        if field in item:
+            if not isinstance(item[field], str):
+                raise BatchError(f'invalid_{field}')
+            values[field] = item[field]
+    if 'name' in values and not values['name'].strip():
+        raise BatchError('invalid_name')
+    for field in DECIMAL_FIELDS:
+        if field in item:
+            values[field] = None if item[field] is None and field == 'old_price' else _decimal(item[field], field)
+    if 'quantity' in item:
+        if not isinstance(item['quantity'], int) or item['quantity'] < 0:
+            raise BatchError('invalid_quantity')
+        values['quantity'] = item['quantity']
+    if 'is_available' in item:
+        values['is_available'] = bool(item['is_available'])
+    if 'category_slug' in item:
+        if item['category_slug'] not in categories:
+            raise BatchError('invalid_category')
+        values['category'] = categories[item['category_slug']]
+    if 'brand_slug' in item:
+        if item['brand_slug'] not in brands:
+            raise BatchError('invalid_brand')
+        values['brand'] = brands[item['brand_slug']]
+    return values
+
+
+def _pk(item):
+    pk = item.get('id')
+    if not isinstance(pk, int) or isinstance(pk, bool):
+        raise BatchError('invalid_id')
+    return pk
+
+
+def apply_batch(operations, atomic=False):
+    """Применяет список операций; возвращает (results, applied)."""
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+
+    def slugs(key):
+        return {item[key] for item in operations if isinstance(item, dict) and isinstance(item.get(key), str)}
+
+    def ids(op):
+        return {
+            item['id'] for item in operations
+            if isinstance(item, dict) and item.get('op') == op and isinstance(item.get('id'), int)
+        }
+
+    categories = Category.objects.in_bulk(slugs('category_slug'), field_name='slug')
+    brands = Brand.objects.in_bulk(slugs('brand_slug'), field_name='slug')
+    delete_ids = ids('delete')
+    targets = Product.objects.in_bulk(ids('update') | delete_ids)
+    protected = set(
+        OrderItem.objects.filter(product_id__in=delete_ids).values_list('product_id', flat=True).distinct()
+    ) if delete_ids else set()
+    new_slugs = {
+        item.get('slug') or slugify(item.get('name') or '')
+        for item in operations
+        if isinstance(item, dict) and item.get('op') in ('create', 'update') and (item.get('slug') or item.get('op') == 'create')
+    }
+    taken = dict(Product.objects.filter(slug__in=new_slugs).values_list('slug', 'pk'))
+
+    for index, item in enumerate(operations):
+        op = item.get('op') if isinstance(item, dict) else None
+        try:
+            if op not in OPERATIONS:
+                raise BatchError('invalid_operation')
+            if op == 'delete':
+                pk = _pk(item)
+                if pk not in targets:
+                    raise BatchError('not_found')
+                if pk in protected:
+                    raise BatchError('protected')
+                deletes.append((index, pk))
+                continue
+            values = _fields(item, categories, brands)
+            if op == 'create':
+                if not all(values.get(f) for f in ('name', 'price', 'category', 'brand')):
+                    raise BatchError('missing_fields')
+                slug = item.get('slug') or slugify(values['name'])
+            else:
+                pk = _pk(item)
+                product = targets.get(pk)
+                if product is None:
+                    raise BatchError('not_found')
+                slug = item.get('slug')
+            if slug is not None:
+                if not slug or slugify(slug) != slug:
+                    raise BatchError('invalid_slug')
+                owner = taken.get(slug)
+                if owner is not None and (op == 'create' or owner is _NEW or owner != pk):
+                    raise BatchError('duplicate_slug')
+                values['slug'] = slug
+            if op == 'create':
+                product = Product(**values)
+                taken[slug] = _NEW
+                creates.append((index, product))
+            else:
+                if 'slug' in values:
+                    taken[slug] = pk
+                for field, value in values.items():
+                    setattr(product, field, value)
+                updates.append((index, product, values.keys()))
+        except BatchError as e:
+            results[index] = {'index': index, 'op': op, 'status': 'error', 'error': e.code}
+
+    has_errors = any(result is not None for result in results)
+    if atomic and has_errors:
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {'index': index, 'op': operations[index]['op'], 'status': 'skipped'}
+        return results, False
+
+    now = timezone.now()
+    with transaction.atomic():
+        if creates:
+            Product.objects.bulk_create([product for _, product in creates], batch_size=500)
+        if updates:
+            # bulk_update не вызывает auto_now
+            fields = {'updated'}
+            for _, product, changed in updates:
+                product.updated = now
+                fields.update(changed)
+            Product.objects.bulk_update([product for _, product, _ in updates], sorted(fields), batch_size=500)
+        if deletes:
+            Product.objects.filter(pk__in=[pk for _, pk in deletes]).delete()
+
+    for index, product in creates:
+        results[index] = {'index': index, 'op': 'create', 'status': 'created', 'id': product.pk, 'slug': product.slug}
+    for index, product, _ in updates:
+        results[index] = {'index': index, 'op': 'update', 'status': 'updated', 'id': product.pk}
+    for index, pk in deletes:
+        results[index] = {'index': index, 'op': 'delete', 'status': 'deleted', 'id': pk}
+
+    changed_ids = [product.pk for _, product in creates] + [product.pk for _, product, _ in updates]
+    if changed_ids:
+        get_search_backend().index(Product.objects.filter(pk__in=changed_ids))
+        invalidate_bulk_changes(changed_ids)
+    return results, True
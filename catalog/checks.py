@@ -0,0 +1,24 @@
+"""Проверки настроек каталога (``manage.py check``)."""
+from django.core.checks import Tags, Warning, register
+
+from . import fragments
+
+# Кэши, у которых каждый процесс видит только свои записи
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_version_cache(app_configs, **kwargs):
+    cache = fragments.get_version_cache()
+    backend = f'{type(cache).__module__}.{type(cache).__qualname__}'
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'Версии кэша каталога хранятся в {backend}: инвалидация фрагментов, меню, фасетов, подсказок и ETag '
+        'не дойдёт до других процессов.',
+        hint='Укажите в CATALOG_VERSION_CACHE общий кэш: файловый, Redis или DatabaseCache.',
+        id='catalog.W001',
+    )]
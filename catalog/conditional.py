@@ -0,0 +1,110 @@
+"""Условные GET-запросы (ETag / Last-Modified) для страниц каталога и API.
+
+Валидаторы считаются без рендеринга ответа:
+
+* список — ``MAX(updated)`` и ``COUNT(*)`` отфильтрованного queryset
+  одним запросом; COUNT можно не считать (``count=False``), если он не
+  нужен ответу — например, при курсорной пагинации;
+* товар — его ``updated``.
+
+В ETag также входят версии из ``catalog.fragments``: они меняются при
+правке брендов, категорий и тегов, которые не трогают ``Product.updated``,
+но видны в ответе, а также при любой записи товаров (в том числе удалении),
+поэтому без COUNT ETag остаётся верным. Совпавший валидатор даёт 304 через
+``django.views.decorators.http.condition``; ``Cache-Control`` берётся из
+настройки ``CATALOG_CACHE_CONTROL``.
+"""
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import fragments
+
+DEFAULT_CACHE_CONTROL = {'public': True, 'max_age': 0, 's_maxage': 30, 'stale_while_revalidate': 30}
+
+
+def _etag(versions, *parts):
+    raw = ':'.join(str(part) for part in (*parts, versions['card'], versions['sidebar']))
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _list_etag(versions, stats):
+    last_modified = stats['last_modified']
+    count = stats.get('count')
+    etag = _etag(versions, '' if count is None else count, last_modified.isoformat() if last_modified else '')
+    return etag, last_modified, count
+
+
+def _list_aggregates(count):
+    aggregates = {'last_modified': Max('updated')}
+    if count:
+        aggregates['count'] = Count('pk')
+    return aggregates
+
+
+def list_validators(queryset, count=True):
+    """(etag, last_modified, count); при ``count=False`` count — None."""
+    stats = queryset.order_by().aggregate(**_list_aggregates(count))
+    return _list_etag(fragments.get_versions(), stats)
+
+
+def object_validators(updated, *parts):
+    """``parts`` — дополнительные части ETag (например, версия рекомендаций)."""
+    return _etag(fragments.get_versions(), updated.isoformat(), *parts), updated
+
+
+async def alist_validators(queryset, count=True):
+    stats = await queryset.order_by().aaggregate(**_list_aggregates(count))
+    return _list_etag(await sync_to_async(fragments.get_versions)(), stats)
+
+
+async def aobject_validators(updated):
+    return _etag(await sync_to_async(fragments.get_versions)(), updated.isoformat()), updated
+
+
+def conditional(view_func, validators):
+    """Оборачивает view в ``condition``; ``validators()`` вызывается не больше одного раза.
+
+    Для асинхронного ``view_func`` валидаторы должны быть уже посчитаны
+    (``alist_validators``/``aobject_validators``): ``condition`` вызывает
+    их синхронно.
+    """
+    computed = []
+
+    def get():
+        if not computed:
+            computed.append(validators())
+        return computed[0]
+
+    wrapped = condition(
+        etag_func=lambda request, *args, **kwargs: get()[0],
+        last_modified_func=lambda request, *args, **kwargs: get()[1],
+    )(view_func)
+
+    if iscoroutinefunction(view_func):
+        async def view(request, *args, **kwargs):
+            return _patch(await wrapped(request, *args, **kwargs))
+    else:
+        def view(request, *args, **kwargs):
+            return _patch(wrapped(request, *args, **kwargs))
+    return view
+
+
+def _patch(response):
+    if response.status_code in (200, 304):
+        patch_cache_control(response, **getattr(settings, 'CATALOG_CACHE_CONTROL', DEFAULT_CACHE_CONTROL))
+    return response
+
+
+class ConditionalGetMixin:
+    """Примесь к CBV: ``get_validators()`` возвращает (etag, last_modified)."""
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return conditional(super().get, self.get_validators)(request, *args, **kwargs)
@@ -0,0 +1,113 @@
+"""Типовые запросы витрины и их планы выполнения.
+
+``canonical_queries()`` повторяет запросы представлений каталога (списки
+с сортировками и фильтрами по проекции витрины ``ProductListing``, страница
+категории, похожие товары из ``ProductRecommendation``, ETag). SQL каждого запроса перехватывается при выполнении и передаётся
+в ``EXPLAIN`` (``EXPLAIN QUERY PLAN`` на SQLite) — так план строится
+для того же текста и параметров, что отправляют представления.
+
+Используется командами ``explain_catalog`` и ``bench_catalog_indexes``.
+"""
+import statistics
+import time
+
+from django.db import connection
+from django.db.models import Count, Max
+
+from .models import Product, ProductListing, Tag
+
+
+def canonical_queries(product=None):
+    """``[(имя, функция)]``; функции выполняют запрос. Пустой список, если товаров нет.
+
+    Категория, бренд и цена для фильтров берутся у ``product`` (по умолчанию —
+    первый опубликованный товар).
+    """
+    if product is None:
+        product = Product.objects.published().select_related('category', 'brand').order_by('id').first()
+    if product is None:
+        return []
+    category, brand = product.category, product.brand
+    tag = Tag.objects.filter(products__isnull=False).order_by('id').first()
+    published = Product.objects.published
+    listing = ProductListing.objects.all
+
+    queries = [
+        ('list_created', lambda: list(listing().order_by('-created')[:10])),
+        ('list_created_cursor', lambda: list(listing().order_by('-created', '-id')[:11])),
+        ('list_price_cursor', lambda: list(listing().order_by('price', 'id')[:11])),
+        ('list_name_cursor', lambda: list(listing().order_by('name', 'id')[:11])),
+        ('list_price_range', lambda: list(
+            listing().filter(price__gte=product.price, price__lte=product.price * 2).order_by('price')[:10]
+        )),
+        ('category_price', lambda: list(
+            listing().filter(category_slug__in=[category.slug]).order_by('price')[:10]
+        )),
+        ('brand_created', lambda: list(
+            listing().filter(brand_slug__in=[brand.slug]).order_by('-created')[:10]
+        )),
+        ('category_page', lambda: list(published().filter(category=category).select_related('brand'))),
+        ('similar_products', lambda: list(
+            published().filter(recommended_for__product=product).select_related('brand')
+            .order_by('recommended_for__rank')[:4]
+        )),
+        ('list_validators', lambda: listing().order_by().aggregate(
+            last_modified=Max('updated'), count=Count('pk'),
+        )),
+    ]
+    if tag is not None:
+        tagged = Product.tags.through.objects.filter(tag__slug__in=[tag.slug]).values('product_id')
+        queries.append(('tag_created', lambda: list(
+            listing().filter(id__in=tagged).order_by('-created')[:10]
+        )))
+    return queries
+
+
+def capture_sql(func):
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        func()
+    return statements
+
+
+def explain(sql, params, **options):
+    """План запроса строками; ``options`` — как у ``QuerySet.explain()``."""
+    prefix = connection.ops.explain_query_prefix(**options)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    if connection.vendor != 'sqlite':
+        return [str(row[0]) for row in rows]
+    # (id, parent, notused, detail) — дерево по parent
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def plan_warnings(lines):
+    """Признаки плохого плана SQLite: просмотр таблицы без индекса и сортировка во временном B-дереве."""
+    if connection.vendor != 'sqlite':
+        return []
+    warnings = []
+    if any(line.strip().startswith('SCAN ') and ' USING ' not in line for line in lines):
+        warnings.append('полный просмотр')
+    if any('TEMP B-TREE' in line for line in lines):
+        warnings.append('сортировка без индекса')
+    return warnings
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
@@ -0,0 +1,145 @@
+"""Фасетный движок каталога.
+
+Все опубликованные товары один раз загружаются в память из проекции
+витрины (``catalog.listing``) — одним запросом без JOIN с тегами. Каждое значение
+фасета (категория, бренд, тег) хранится как битовая маска над позициями
+товаров (обычный ``int`` Python). Счётчики «без учёта собственного измерения»
+считаются за один проход побитовыми AND и ``int.bit_count()`` без обращений
+к базе данных.
+
+Индекс хранится в памяти процесса вместе с версией, под которой построен;
+версия лежит в общем кэше версий (``catalog.fragments``), как у навигации
+(``catalog.navigation``). Сигналы (см. ``catalog.signals``) увеличивают её,
+и каждый процесс лениво строит индекс заново при следующем обращении.
+"""
+import threading
+
+from techmarket.routers import primary
+
+from . import fragments
+from .models import Brand, Category, ProductListing, Tag
+
+
+class FacetIndex:
+    def __init__(self, size, categories, brands, tags):
+        # categories/brands/tags: списки (slug, name, bitmap), отсортированные по name
+        self.size = size
+        self.full_mask = (1 << size) - 1
+        self.categories = categories
+        self.brands = brands
+        self.tags = tags
+        self._by_slug = {
+            'categories': {slug: bitmap for slug, _, bitmap in categories},
+            'brands': {slug: bitmap for slug, _, bitmap in brands},
+            'tags': {slug: bitmap for slug, _, bitmap in tags},
+        }
+
+    @classmethod
+    def build(cls):
+        rows = ProductListing.objects.order_by('id').values_list('category_slug', 'brand_slug', 'tag_slugs')
+        size = 0
+        category_positions = {}
+        brand_positions = {}
+        tag_positions = {}
+        for i, (category_slug, brand_slug, tag_slugs) in enumerate(rows.iterator(chunk_size=10000)):
+            category_positions.setdefault(category_slug, []).append(i)
+            brand_positions.setdefault(brand_slug, []).append(i)
+            for slug in tag_slugs:
+                tag_positions.setdefault(slug, []).append(i)
+            size = i + 1
+
+        def dimension(model, positions):
+            result = []
+            for slug, name in model.objects.order_by('name').values_list('slug', 'name'):
+                if slug in positions:
+                    result.append((slug, name, _bitmap(positions[slug], size)))
+            return result
+
+        return cls(
+            size,
+            dimension(Category, category_positions),
+            dimension(Brand, brand_positions),
+            dimension(Tag, tag_positions),
+        )
+
+    def _mask(self, dimension, active_slugs):
+        if not active_slugs:
+            return self.full_mask
+        bitmaps = self._by_slug[dimension]
+        mask = 0
+        for slug in active_slugs:
+            mask |= bitmaps.get(slug, 0)
+        return mask
+
+    def count(self, active_category_slugs, active_brand_slugs, active_tag_slugs):
+        """Точное число опубликованных товаров под фильтрами по измерениям."""
+        mask = (
+            self._mask('categories', active_category_slugs)
+            & self._mask('brands', active_brand_slugs)
+            & self._mask('tags', active_tag_slugs)
+        )
+        return mask.bit_count()
+
+    def facets(self, active_category_slugs, active_brand_slugs, active_tag_slugs):
+        """Счётчики для боковой панели фильтров.
+
+        Каждое измерение считается с учётом фильтров двух других измерений,
+        но не своего собственного — так же, как это делали GROUP BY запросы.
+        """
+        category_mask = self._mask('categories', active_category_slugs)
+        brand_mask = self._mask('brands', active_brand_slugs)
+        tag_mask = self._mask('tags', active_tag_slugs)
+
+        def counts(values, mask, active):
+            result = []
+            for slug, name, bitmap in values:
+                count = (bitmap & mask).bit_count()
+                if count > 0:
+                    result.append({
+                        'slug': slug,
+                        'name': name,
+                        'count': count,
+                        'active': slug in active,
+                    })
+            return result
+
+        return {
+            'facet_categories': counts(self.categories, brand_mask & tag_mask, active_category_slugs),
+            'facet_brands': counts(self.brands, category_mask & tag_mask, active_brand_slugs),
+            'facet_tags': counts(self.tags, category_mask & brand_mask, active_tag_slugs),
+        }
+
+
+def _bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+KIND = 'facets'
+
+_lock = threading.Lock()
+_cached = None
+
+
+def get_facet_index():
+    global _cached
+    version = fragments.get_version(KIND)
+    cached = _cached
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        if _cached is not None and _cached[0] == version:
+            return _cached[1]
+        # Индекс живёт до следующей инвалидации — строим по основной базе.
+        # Версия прочитана до построения: запись во время построения сменит
+        # её, и следующий запрос построит индекс заново.
+        with primary():
+            index = FacetIndex.build()
+        _cached = (version, index)
+        return index
+
+
+def invalidate():
+    fragments.bump(KIND)
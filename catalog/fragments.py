@@ -0,0 +1,161 @@
+"""Кэш отрендеренных фрагментов шаблонов каталога.
+
+* карточка товара — ключ ``card:<id>:<updated>:<версия карточек>``;
+* боковая панель фильтров — ключ ``sidebar:<версия панели>:<hash набора фильтров>``.
+
+Фрагменты хранятся в кэше ``CATALOG_FRAGMENT_CACHE`` (алиас из ``CACHES``):
+locmem вытесняет давно не читанные записи (LRU) по ``MAX_ENTRIES``, так же
+ведёт себя Redis с ``maxmemory-policy allkeys-lru``; файловый кэш тоже
+поддерживается. ``None`` отключает кэширование.
+
+Старые фрагменты не удаляются, а перестают читаться: сигналы (см.
+``catalog.signals``) увеличивают версию, и записи прежней версии уходят по
+LRU. Версии лежат в кэше ``CATALOG_VERSION_CACHE``: инвалидация видна всем
+процессам, только если он общий (файловый, Redis, БД) — locmem у каждого
+процесса свой, и ``check --deploy`` о нём предупреждает (``catalog.checks``).
+По версиям же строятся ETag страниц каталога (``catalog.conditional``).
+"""
+import datetime
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+KINDS = ('card', 'sidebar')
+
+
+class FragmentStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, kind, hit):
+        with self._lock:
+            (self.hits if hit else self.misses)[kind] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for kind in KINDS:
+                hits, misses = self.hits[kind], self.misses[kind]
+                total = hits + misses
+                result[kind] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': round(hits / total, 4) if total else None,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+stats = FragmentStats()
+
+
+def get_cache():
+    alias = getattr(settings, 'CATALOG_FRAGMENT_CACHE', 'fragments')
+    return caches[alias] if alias else None
+
+
+def get_version_cache():
+    alias = getattr(settings, 'CATALOG_VERSION_CACHE', None)
+    if alias:
+        return caches[alias]
+    return get_cache() or caches['default']
+
+
+def _version_key(kind):
+    return f'catalog:fragments:version:{kind}'
+
+
+def _new_version():
+    # Версия могла быть вытеснена из кэша; новая не должна совпасть со старой
+    return time.time_ns()
+
+
+def version_time(version):
+    """Момент смены версии — для Last-Modified."""
+    return datetime.datetime.fromtimestamp(version / 1e9, tz=datetime.timezone.utc)
+
+
+def get_versions(cache=None):
+    if cache is None:
+        cache = get_version_cache()
+    keys = {kind: _version_key(kind) for kind in KINDS}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for kind, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[kind] = version
+    return versions
+
+
+def get_version(kind, cache=None):
+    """Версия одного вида, в том числе вне ``KINDS`` (см. ``catalog.navigation``)."""
+    if cache is None:
+        cache = get_version_cache()
+    key = _version_key(kind)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump(kind):
+    version = _new_version()
+    get_version_cache().set(_version_key(kind), version, timeout=None)
+    return version
+
+
+def invalidate_cards():
+    bump('card')
+
+
+def invalidate_sidebars():
+    bump('sidebar')
+
+
+def card_key(version, pk, updated):
+    return f'catalog:card:{pk}:{updated.timestamp() if updated else 0}:{version}'
+
+
+def sidebar_key(version, categories, brands, tags):
+    normalized = '|'.join(','.join(sorted(values)) for values in (categories, brands, tags))
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    return f'catalog:sidebar:{version}:{digest}'
+
+
+def make_key(kind, version, parts):
+    if kind == 'card':
+        return card_key(version, *parts)
+    return sidebar_key(version, *parts)
+
+
+def get_or_render(kind, parts, render, versions=None):
+    """Возвращает фрагмент из кэша или рендерит его через ``render()`` и сохраняет."""
+    cache = get_cache()
+    if cache is None:
+        return render()
+    versions = versions or get_versions()
+    key = make_key(kind, versions[kind], parts)
+    content = cache.get(key)
+    if content is not None:
+        stats.record(kind, True)
+        return content
+    stats.record(kind, False)
+    content = render()
+    cache.set(key, content)
+    return content
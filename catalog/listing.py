@@ -0,0 +1,131 @@
+"""Плоская проекция витрины ``ProductListing``.
+
+Одна строка на опубликованный товар: названия и slug категории и бренда,
+посчитанная скидка и список slug тегов. Список товаров, фасеты и
+``product_list_api`` читают только эту таблицу — без JOIN с брендами,
+категориями и тегами и без вычисления скидки в каждом запросе.
+
+Строки обновляются сигналами (``catalog.signals``) и кодом массовых
+изменений через ``refresh(ids)``; команда ``rebuild_listing`` собирает
+таблицу заново.
+"""
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, FloatField, Value, When
+from django.db.models.lookups import GreaterThan
+
+from .models import Product, ProductListing
+
+BATCH_SIZE = 1000
+
+SOURCE_FIELDS = (
+    'id', 'name', 'slug', 'price', 'old_price', 'quantity',
+    'category_id', 'category__name', 'category__slug', 'brand_id', 'brand__name', 'brand__slug',
+    'image', 'image_variants', 'created', 'updated',
+)
+UPDATE_FIELDS = [field.name for field in ProductListing._meta.concrete_fields if not field.primary_key]
+
+# Ключи ответа product_list_api остаются прежними (как у values() по Product)
+API_FIELDS = ('id', 'name', 'slug', 'price', 'old_price')
+API_EXPRESSIONS = {
+    'brand__name': F('brand_name'),
+    'category__name': F('category_name'),
+    'is_available': Value(True, output_field=BooleanField()),
+}
+
+
+def api_values(queryset, *fields):
+    return queryset.values(*API_FIELDS, *fields, **API_EXPRESSIONS)
+
+
+def discount_expression(price=F('price'), old_price=F('old_price')):
+    """``discount_percent`` в SQL — для UPDATE, который меняет цены прямо в таблице."""
+    return Case(
+        When(GreaterThan(old_price, price), then=(old_price - price) * 100.0 / old_price),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def discount_percent(price, old_price):
+    if old_price is None or old_price <= price:
+        return 0.0
+    return float((old_price - price) * 100 / old_price)
+
+
+def _tag_slugs(ids):
+    result = {}
+    through = Product.tags.through.objects.filter(product_id__in=ids).order_by('tag__slug')
+    for product_id, slug in through.values_list('product_id', 'tag__slug'):
+        result.setdefault(product_id, []).append(slug)
+    return result
+
+
+def _rows(queryset):
+    products = list(queryset.values(*SOURCE_FIELDS))
+    tags = _tag_slugs([product['id'] for product in products])
+    return [
+        ProductListing(
+            id=product['id'],
+            name=product['name'],
+            slug=product['slug'],
+            price=product['price'],
+            old_price=product['old_price'],
+            discount_percent=discount_percent(product['price'], product['old_price']),
+            quantity=product['quantity'],
+            category_id=product['category_id'],
+            category_name=product['category__name'],
+            category_slug=product['category__slug'],
+            brand_id=product['brand_id'],
+            brand_name=product['brand__name'],
+            brand_slug=product['brand__slug'],
+            tag_slugs=tags.get(product['id'], []),
+            image=product['image'] or None,
+            image_variants=product['image_variants'],
+            created=product['created'],
+            updated=product['updated'],
+        )
+        for product in products
+    ]
+
+
+def refresh(ids):
+    """Пересобирает строки товаров ``ids``: опубликованные обновляются, остальные удаляются."""
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        rows = _rows(Product.objects.published().filter(pk__in=chunk).order_by())
+        with transaction.atomic():
+            ProductListing.objects.filter(pk__in=chunk).exclude(pk__in=[row.pk for row in rows]).delete()
+            if rows:
+                ProductListing.objects.bulk_create(
+                    rows, update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS,
+                )
+
+
+def remove(pk):
+    ProductListing.objects.filter(pk=pk).delete()
+
+
+def rename(field, instance):
+    """Новые название и slug категории или бренда (``field`` — 'category' или 'brand')."""
+    ProductListing.objects.filter(**{f'{field}_id': instance.pk}).update(**{
+        f'{field}_name': instance.name,
+        f'{field}_slug': instance.slug,
+    })
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Заполняет таблицу заново по опубликованным товарам; возвращает число строк."""
+    products = Product.objects.published().order_by('pk')
+    total = 0
+    last = 0
+    with transaction.atomic():
+        ProductListing.objects.all().delete()
+        while True:
+            rows = _rows(products.filter(pk__gt=last)[:batch_size])
+            if not rows:
+                break
+            ProductListing.objects.bulk_create(rows)
+            total += len(rows)
+            last = rows[-1].pk
+    return total
@@ -0,0 +1,275 @@
+"""Прогон запросов к приложению для нагрузочных тестов и бенчмарков.
+
+Раннеры (``WSGIRunner``, ``ASGIRunner``, ``HTTPRunner``) выполняют список
+``(path, query)`` с заданным числом параллельных клиентов и возвращают
+``(времена, ошибки, общее время)``. ``serve`` поднимает WSGI-сервер Django
+на свободном порту для замеров по HTTP, ``regressions`` сравнивает
+результаты ``bench_endpoints`` с сохранённым JSON. ``spawn_worker`` и
+``in_worker_database`` запускают замер в отдельном процессе со своей
+временной базой. Используются командами ``loadtest_api``,
+``bench_endpoints`` и ``bench_db_profiles``.
+"""
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Реплики не нужны: воркер бенчмарка пишет и читает одну временную базу
+REPLICA_ENV = ('DATABASE_REPLICA_URLS', 'SQLITE_REPLICA_PATHS')
+
+
+def wsgi_environ(path, query, headers=None):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+class WSGIRunner:
+    """WSGI-приложение в пуле потоков — как gunicorn с ``--threads``."""
+
+    def __init__(self, headers=None):
+        from techmarket.wsgi import application
+        self.application = application
+        self.headers = headers
+
+    def request(self, path, query):
+        status = []
+        result = self.application(wsgi_environ(path, query, self.headers), lambda s, h, exc_info=None: status.append(s))
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(status[0].split()[0])
+
+    def run(self, urls, concurrency):
+        return run_threads(lambda url: self.request(*url), urls, concurrency)
+
+
+class ASGIRunner:
+    """ASGI-приложение в одном цикле событий — как uvicorn с одним воркером."""
+
+    def __init__(self):
+        from techmarket.asgi import application
+        self.application = application
+
+    async def request(self, path, query):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        sent = []
+        status = []
+
+        async def receive():
+            # Django ждёт http.disconnect, пока формирует ответ
+            if not sent:
+                sent.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                done.set()
+
+        await self.application(scope, receive, send)
+        return status[0]
+
+    def run(self, urls, concurrency):
+        async def main():
+            queue = list(reversed(urls))
+            timings, errors = [], 0
+
+            async def worker():
+                nonlocal errors
+                while queue:
+                    url = queue.pop()
+                    started = time.perf_counter()
+                    try:
+                        ok = await self.request(*url) < 400
+                    except Exception:
+                        ok = False
+                    timings.append(time.perf_counter() - started)
+                    errors += not ok
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return timings, errors, time.perf_counter() - started
+
+        return asyncio.run(main())
+
+
+class HTTPRunner:
+    """Сервер по HTTP: внешний (gunicorn, uvicorn) или ``serve()``."""
+
+    def __init__(self, base_url, headers=None):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+
+    def request(self, path, query):
+        url = f'{self.base_url}{path}' + (f'?{query}' if query else '')
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=self.headers), timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def run(self, urls, concurrency):
+        return run_threads(lambda url: self.request(*url), urls, concurrency)
+
+
+def run_threads(call, urls, concurrency):
+    lock = threading.Lock()
+    timings, errors = [], 0
+
+    def one(url):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = call(url) < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            timings.append(elapsed)
+            errors += not ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, urls))
+    return timings, errors, time.perf_counter() - started
+
+
+@contextmanager
+def serve():
+    """WSGI-сервер Django на 127.0.0.1 и свободном порту; отдаёт базовый URL."""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def spawn_worker(label, command, args, env=None):
+    """Запускает ``manage.py <command> --worker`` в отдельном процессе и возвращает его JSON.
+
+    Воркер получает свою SQLite-базу во временном каталоге (``SQLITE_PATH``),
+    которая удаляется после него; ``env`` дополняет окружение (например, ``DB_PROFILE``).
+    """
+    from django.conf import settings
+    from django.core.management.base import CommandError
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worker_env = {**os.environ, **(env or {}), 'SQLITE_PATH': os.path.join(tmp, 'bench.sqlite3')}
+        for name in REPLICA_ENV:
+            worker_env.pop(name, None)
+        proc = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), command, '--worker', *args],
+            env=worker_env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        raise CommandError(f"{label}: {proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def in_worker_database(measure):
+    """Выполняет ``measure()`` в воркере ``spawn_worker`` на пустой базе с DEBUG=False.
+
+    SQLite-база воркера временная, её достаточно смигрировать; на PostgreSQL
+    рабочая база не трогается — создаётся test_<имя> и удаляется в конце.
+    """
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import override_settings
+
+    is_postgres = connection.vendor == 'postgresql'
+    if is_postgres:
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    else:
+        call_command('migrate', verbosity=0)
+    try:
+        with override_settings(DEBUG=False):
+            return measure()
+    finally:
+        if is_postgres:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+# Метрики результата bench_endpoints: (ключ, больше — лучше)
+TIMING_METRICS = (('rps', True), ('p50_ms', False), ('p99_ms', False))
+
+
+def regressions(baseline, results, threshold):
+    """Отличия ``results`` от ``baseline`` (формат ``bench_endpoints --output``) хуже порога.
+
+    Времена и пиковая память сравниваются с допуском ``threshold`` (доля),
+    число SQL-запросов — точно: оно не зависит от машины.
+    """
+    found = []
+    for size, endpoints in baseline['sizes'].items():
+        for label, base in endpoints.items():
+            current = results['sizes'].get(size, {}).get(label)
+            if current is None:
+                continue
+            name = f'{size}/{label}'
+            if current['queries'] > base['queries']:
+                found.append(f"{name}: SQL-запросов {base['queries']} → {current['queries']}")
+            if current['peak_kb'] > base['peak_kb'] * (1 + threshold):
+                found.append(f"{name}: пик памяти {base['peak_kb']:.0f} → {current['peak_kb']:.0f} КБ")
+            for mode in ('inprocess', 'http'):
+                if mode not in base or mode not in current:
+                    continue
+                for metric, higher_is_better in TIMING_METRICS:
+                    old, new = base[mode][metric], current[mode][metric]
+                    worse = new < old * (1 - threshold) if higher_is_better else new > old * (1 + threshold)
+                    if worse:
+                        found.append(f'{name} {mode}: {metric} {old:.2f} → {new:.2f}')
+    return found
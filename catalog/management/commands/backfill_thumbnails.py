@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from catalog import thumbnails
+from catalog.models import Product
+
+
+def _init_worker():
+    # При запуске процессов через spawn Django в них ещё не настроен
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Создание уменьшенных копий и WebP для уже загруженных изображений товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--threads', action='store_true', help="Пул потоков вместо пула процессов")
+        parser.add_argument('--force', action='store_true', help="Пересоздать копии и для обработанных изображений")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        todo = [
+            (pk, name) for pk, name, variants in products.values_list('pk', 'image', 'image_variants').iterator()
+            if options['force'] or (variants or {}).get('source') != name
+        ]
+        if not todo:
+            self.stdout.write("Все изображения уже обработаны")
+            return
+        if options['threads']:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+        else:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+        started = time.perf_counter()
+        done = failed = 0
+        # Картинки обрабатывают воркеры, в БД пишет только основной процесс
+        with pool:
+            futures = {pool.submit(thumbnails.render_variants, name): (pk, name) for pk, name in todo}
+            for future in as_completed(futures):
+                pk, name = futures[future]
+                try:
+                    thumbnails.save_variants(pk, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"  {name}: {e}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {done}, ошибок: {failed}, {elapsed:.1f} с"
+        ))
@@ -0,0 +1,73 @@
+import json
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from catalog.models import Product
+from catalog.querybudget import capture_queries
+from catalog.synthetic import seed_catalog
+from catalog.views import product_batch_api, product_detail_api, product_list_api
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк пакетного API: по одному запросу на товар против /api/products/batch/ (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=1000, help="Число операций каждого вида")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        rng = random.Random(options['seed'])
+        n = options['operations']
+        for label, run in (('по одному', self._single), ('пакетом', self._batch)):
+            with transaction.atomic():
+                seed_catalog(rng, n * 3)
+                ops = self._operations(n)
+                started = time.perf_counter()
+                with capture_queries() as log:
+                    requests = run(factory, ops, options['batch_size'])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{label:<10} операций: {len(ops):>6}   HTTP-запросов: {requests:>6}   SQL: {log.count:>7}   "
+                    f"{elapsed * 1000:9.1f} мс   {len(ops) / elapsed:>9,.0f} операций/с"
+                )
+                transaction.set_rollback(True)
+
+    def _operations(self, n):
+        ids = list(Product.objects.filter(slug__startswith='bench-product-').order_by('id').values_list('id', flat=True))
+        creates = [
+            {'op': 'create', 'name': f'Batch product {i}', 'slug': f'batch-product-{i}', 'price': '1999.00',
+             'category_slug': 'bench-cat-1', 'brand_slug': 'bench-brand-1'}
+            for i in range(n)
+        ]
+        updates = [{'op': 'update', 'id': pk, 'price': '2999.00', 'name': f'Renamed {pk}'} for pk in ids[:n]]
+        deletes = [{'op': 'delete', 'id': pk} for pk in ids[n:2 * n]]
+        return creates + updates + deletes
+
+    def _single(self, factory, ops, batch_size):
+        for op in ops:
+            if op['op'] == 'create':
+                body = {key: value for key, value in op.items() if key != 'op'}
+                product_list_api(factory.post('/', json.dumps(body), content_type='application/json'))
+            elif op['op'] == 'update':
+                body = {'price': op['price'], 'name': op['name']}
+                product_detail_api(factory.put('/', json.dumps(body), content_type='application/json'), op['id'])
+            else:
+                product_detail_api(factory.delete('/'), op['id'])
+        return len(ops)
+
+    def _batch(self, factory, ops, batch_size):
+        requests = 0
+        for start in range(0, len(ops), batch_size):
+            body = {'operations': ops[start:start + batch_size]}
+            request = factory.post('/', json.dumps(body), content_type='application/json')
+            request.user = User(is_staff=True)
+            product_batch_api(request)
+            requests += 1
+        return requests
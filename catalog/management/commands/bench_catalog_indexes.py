@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from catalog.explain import canonical_queries, capture_sql, explain, median_ms
+from catalog import listing
+from catalog.models import Product, ProductListing
+from catalog.synthetic import seed_catalog
+
+# Индекс промежуточной таблицы тегов из миграции 0010
+TAGS_INDEX = 'catalog_product_tags_tag_product_idx'
+TAGS_INDEX_SQL = f'CREATE INDEX {TAGS_INDEX} ON catalog_product_tags (tag_id, product_id)'
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк индексов витрины: типовые запросы (catalog.explain) и их планы без "
+        "составных/частичных индексов товаров и индексов проекции витрины и с ними "
+        "на большом каталоге (данные откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--hidden', type=float, default=0.2,
+                            help="Доля черновиков и снятых с продажи (не попадают в частичные индексы)")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        indexes = [
+            (model, index) for model, prefix in ((Product, 'product_pub_'), (ProductListing, 'listing_'))
+            for index in model._meta.indexes if index.name.startswith(prefix)
+        ]
+        with transaction.atomic():
+            started = time.perf_counter()
+            seed_catalog(rng, options['products'])
+            self.hide(options['hidden'])
+            listing.rebuild()
+            self.stdout.write(f"Заполнение: {options['products']:,} товаров за {time.perf_counter() - started:.1f} с")
+            queries = canonical_queries(Product.objects.published().filter(slug__startswith='bench-product-').first())
+
+            self.drop_indexes(indexes)
+            before = self.measure(queries, options['repeat'])
+            started = time.perf_counter()
+            self.create_indexes(indexes)
+            self.stdout.write(f"Построение индексов: {time.perf_counter() - started:.1f} с")
+            after = self.measure(queries, options['repeat'])
+
+            self.stdout.write(f"\n{'запрос':<22} {'без индексов':>14} {'с индексами':>13} {'ускорение':>10}")
+            for name, _ in queries:
+                (ms_before, _), (ms_after, _) = before[name], after[name]
+                self.stdout.write(
+                    f"{name:<22} {ms_before:>11.2f} мс {ms_after:>10.2f} мс {ms_before / max(ms_after, 1e-3):>9.1f}×"
+                )
+            self.stdout.write('\nИзменения планов:')
+            for name, _ in queries:
+                plan_before, plan_after = before[name][1], after[name][1]
+                if plan_before == plan_after:
+                    continue
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, plan in (('было', plan_before), ('стало', plan_after)):
+                    self.stdout.write(f"  {label}:")
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+            transaction.set_rollback(True)
+
+    def hide(self, fraction):
+        # Каждый десятый по id — черновик, следующий — снят с продажи, пока не наберётся доля
+        step = round(fraction * 10)
+        if step <= 0:
+            return
+        remainder = F('id') % 10
+        Product.objects.alias(r=remainder).filter(r__lt=(step + 1) // 2).update(status=Product.Status.DRAFT)
+        Product.objects.alias(r=remainder).filter(r__gte=(step + 1) // 2, r__lt=step).update(is_available=False)
+
+    def drop_indexes(self, indexes):
+        with connection.cursor() as cursor:
+            for _, index in indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+            cursor.execute(f'DROP INDEX {TAGS_INDEX}')
+            cursor.execute('ANALYZE')
+
+    def create_indexes(self, indexes):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, index in indexes:
+                cursor.execute(str(index.create_sql(model, editor)))
+            cursor.execute(TAGS_INDEX_SQL)
+            cursor.execute('ANALYZE')
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, func in queries:
+            plan = [line for sql, params in capture_sql(func) for line in explain(sql, params)]
+            results[name] = (median_ms(func, repeat), plan)
+        return results
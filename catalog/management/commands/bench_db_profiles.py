@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.urls import reverse
+
+from catalog import listing
+from catalog.loadtest import in_worker_database, spawn_worker
+from catalog.perf import percentile
+from catalog.models import Product
+from catalog.synthetic import seed_catalog
+from techmarket.db import PROFILES
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк профилей БД (techmarket/db.py): параллельные чтения страниц каталога и API "
+        "с долей записей, по отдельному процессу на профиль. Для postgres нужен DATABASE_URL "
+        "или POSTGRES_*; данные пишутся в тестовую базу, которая затем удаляется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=PROFILES,
+                            help="По умолчанию sqlite и sqlite-wal, плюс postgres, если он настроен")
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help="Секунд на профиль")
+        parser.add_argument('--write-ratio', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options)))
+            return
+        profiles = options['profile'] or ['sqlite', 'sqlite-wal'] + (
+            ['postgres'] if os.environ.get('DATABASE_URL') or os.environ.get('POSTGRES_HOST') else []
+        )
+        self.stdout.write(
+            f"{'профиль':<12} {'чтений/с':>9} {'записей/с':>10} {'p50 чт.':>8} {'p95 чт.':>8} "
+            f"{'p99 чт.':>8} {'p95 зап.':>9} {'ошибок':>7}"
+        )
+        for profile in profiles:
+            result = self.run_profile(profile, options)
+            self.stdout.write(
+                f"{profile:<12} {result['reads_per_s']:>9,.0f} {result['writes_per_s']:>10,.0f} "
+                + ' '.join(f"{result[key] * 1000:>8.1f}" for key in ('read_p50', 'read_p95', 'read_p99'))
+                + f" {result['write_p95'] * 1000:>9.1f} {result['errors']:>7}"
+            )
+
+    def run_profile(self, profile, options):
+        args = [
+            f"--products={options['products']}", f"--threads={options['threads']}",
+            f"--duration={options['duration']}", f"--write-ratio={options['write_ratio']}",
+            f"--seed={options['seed']}",
+        ]
+        return spawn_worker(profile, 'bench_db_profiles', args, env={'DB_PROFILE': profile})
+
+    def run_worker(self, options):
+        return in_worker_database(lambda: self.measure(options))
+
+    def measure(self, options):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            listing.rebuild()
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        slugs = dict(Product.objects.values_list('id', 'slug'))
+        connection.close()
+
+        application = WSGIHandler()
+        factory = RequestFactory(HTTP_HOST='localhost')
+        deadline = time.perf_counter() + options['duration']
+        lock = threading.Lock()
+        reads, writes, errors = [], [], [0]
+
+        def request(environ):
+            status = []
+            response = application(environ, lambda s, h, exc_info=None: status.append(s))
+            for _ in response:
+                pass
+            response.close()
+            return int(status[0].split()[0])
+
+        def worker(seed):
+            local_rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                pk = local_rng.choice(product_ids)
+                is_write = local_rng.random() < options['write_ratio']
+                if is_write:
+                    body = json.dumps({'price': local_rng.randint(1000, 200000)})
+                    environ = factory.put(reverse('product_detail_api', args=[pk]), body,
+                                          content_type='application/json').environ
+                else:
+                    url = local_rng.choice((
+                        reverse('product_list') + f'?page={local_rng.randint(1, 5)}',
+                        reverse('product_list_api') + f'?page={local_rng.randint(1, 5)}',
+                        reverse('product_detail', args=[slugs[pk]]),
+                    ))
+                    path, _, query = url.partition('?')
+                    environ = factory.get(path, QUERY_STRING=query).environ
+                started = time.perf_counter()
+                try:
+                    ok = request(environ) < 400
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    (writes if is_write else reads).append(elapsed)
+                    errors[0] += not ok
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(options['seed'] + i,)) for i in range(options['threads'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        reads.sort()
+        writes.sort()
+        return {
+            'reads_per_s': len(reads) / elapsed,
+            'writes_per_s': len(writes) / elapsed,
+            'read_p50': percentile(reads, 0.50, 0.0),
+            'read_p95': percentile(reads, 0.95, 0.0),
+            'read_p99': percentile(reads, 0.99, 0.0),
+            'write_p95': percentile(writes, 0.95, 0.0),
+            'errors': errors[0],
+        }
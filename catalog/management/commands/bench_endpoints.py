@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import tracemalloc
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from catalog import listing, recommendations
+from catalog.loadtest import HTTPRunner, WSGIRunner, in_worker_database, regressions, serve, spawn_worker
+from catalog.perf import percentile
+from catalog.models import Order, OrderItem, Product
+from catalog.orders import recalculate_orders
+from catalog.querybudget import capture_queries
+from catalog.synthetic import seed_catalog
+
+ENDPOINTS = ('list', 'list_filtered', 'list_api', 'detail', 'admin_orders', 'admin_order')
+MODES = ('inprocess', 'http')
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк страниц и API каталога на синтетических данных нескольких размеров: "
+        "запросов в секунду, p50/p99 в процессе (WSGI) и через локальный HTTP-сервер, SQL-запросы "
+        "и пик памяти на запрос. --output сохраняет результат в JSON, --baseline сравнивает с ним "
+        "и завершается ошибкой при регрессии больше --threshold. Каждый размер — отдельный процесс "
+        "со своей временной базой."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help="Размеры каталога через запятую")
+        parser.add_argument('--requests', type=int, default=300, help="Запросов на эндпоинт и режим")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--profile-requests', type=int, default=20,
+                            help="Последовательных запросов для подсчёта SQL и пика памяти")
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS)
+        parser.add_argument('--mode', action='append', choices=MODES)
+        parser.add_argument('--output', help="Куда записать результат (JSON), например новый baseline")
+        parser.add_argument('--baseline', help="JSON прежнего прогона для сравнения")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Допустимое ухудшение времени и памяти (доля)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options)))
+            return
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        results = {
+            'settings': {key: options[key] for key in ('requests', 'concurrency', 'seed')},
+            'sizes': {},
+        }
+        self.stdout.write(
+            f"{'товаров':>8} {'эндпоинт':<14} {'режим':<10} {'запр/с':>8} {'p50, мс':>8} {'p99, мс':>8} "
+            f"{'SQL':>4} {'пик, КБ':>8} {'ошибок':>7}"
+        )
+        for size in sizes:
+            endpoints = self.run_size(size, options)
+            results['sizes'][str(size)] = endpoints
+            for label, result in endpoints.items():
+                for mode in MODES:
+                    if mode in result:
+                        timing = result[mode]
+                        self.stdout.write(
+                            f"{size:>8} {label:<14} {mode:<10} {timing['rps']:>8,.0f} {timing['p50_ms']:>8.2f} "
+                            f"{timing['p99_ms']:>8.2f} {result['queries']:>4} {result['peak_kb']:>8.0f} "
+                            f"{timing['errors']:>7}"
+                        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результат записан в {options['output']}")
+        if baseline is not None:
+            found = regressions(baseline, results, options['threshold'])
+            if found:
+                raise CommandError("Регрессии относительно baseline:\n" + '\n'.join(found))
+            self.stdout.write("Регрессий относительно baseline нет")
+
+    def run_size(self, size, options):
+        args = [
+            f'--size={size}', f"--requests={options['requests']}", f"--concurrency={options['concurrency']}",
+            f"--profile-requests={options['profile_requests']}", f"--seed={options['seed']}",
+        ]
+        args += [f'--endpoint={label}' for label in options['endpoint'] or ()]
+        args += [f'--mode={mode}' for mode in options['mode'] or ()]
+        return spawn_worker(size, 'bench_endpoints', args, env={'DB_PROFILE': os.environ.get('DB_PROFILE', 'sqlite-wal')})
+
+    def run_worker(self, options):
+        return in_worker_database(lambda: self.measure(options))
+
+    def measure(self, options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            categories, brands, tags = seed_catalog(rng, options['size'])
+            ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+            orders = self.seed_orders(rng, ids, max(10, options['size'] // 10))
+            recalculate_orders()
+        listing.rebuild()
+        recommendations.build()
+        slugs = list(Product.objects.order_by('?').values_list('slug', flat=True)[:200])
+
+        admin = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+        client = Client()
+        client.force_login(admin)
+        cookie = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'}
+        connection.close()
+
+        filtered = urlencode({
+            'category': categories[0].slug, 'tag': tags[0].slug,
+            'min_price': 10000, 'max_price': 150000, 'sort': 'price',
+        })
+        builders = {
+            'list': lambda i: (reverse('product_list'), f'page={i % 5 + 1}'),
+            'list_filtered': lambda i: (reverse('product_list'), filtered),
+            'list_api': lambda i: (reverse('product_list_api'), f'page={i % 5 + 1}&page_size=20'),
+            'detail': lambda i: (reverse('product_detail', args=[slugs[i % len(slugs)]]), ''),
+            'admin_orders': lambda i: (reverse('admin:catalog_order_changelist'), f'p={i % 5 + 1}'),
+            'admin_order': lambda i: (reverse('admin:catalog_order_change', args=[orders[i % len(orders)]]), ''),
+        }
+        modes = options['mode'] or MODES
+        results = {}
+        with ExitStack() as stack:
+            base_url = stack.enter_context(serve()) if 'http' in modes else None
+            for label in options['endpoint'] or ENDPOINTS:
+                headers = cookie if label.startswith('admin') else None
+                urls = [builders[label](i) for i in range(options['requests'])]
+                result = self.profile(WSGIRunner(headers), urls[:options['profile_requests']])
+                for mode in modes:
+                    runner = WSGIRunner(headers) if mode == 'inprocess' else HTTPRunner(base_url, headers)
+                    runner.run(urls[:options['concurrency']], options['concurrency'])  # прогрев
+                    timings, errors, elapsed = runner.run(urls, options['concurrency'])
+                    timings.sort()
+                    result[mode] = {
+                        'rps': round(len(timings) / elapsed, 1),
+                        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+                        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+                        'errors': errors,
+                    }
+                results[label] = result
+        return results
+
+    def profile(self, runner, urls):
+        """SQL-запросы (медиана) и пик памяти Python (максимум) на запрос, после прогрева."""
+        runner.request(*urls[0])
+        queries, peak = [], 0
+        tracemalloc.start()
+        try:
+            for url in urls:
+                tracemalloc.reset_peak()
+                with capture_queries() as log:
+                    runner.request(*url)
+                queries.append(log.count)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        return {'queries': int(statistics.median(queries)), 'peak_kb': round(peak / 1024, 1)}
+
+    def seed_orders(self, rng, ids, count):
+        orders = Order.objects.bulk_create(Order(code=f'BENCH-{i}') for i in range(count))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=pk, quantity=rng.randint(1, 3), price=rng.randint(1000, 200000))
+            for order in orders
+            for pk in rng.sample(ids, min(len(ids), rng.randint(1, 5)))
+        )
+        return [order.pk for order in orders]
@@ -0,0 +1,70 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from catalog import listing
+from catalog.models import Product
+from catalog.synthetic import seed_catalog
+from catalog.views import product_list_api
+
+
+def legacy_export(request):
+    """Прежний путь: весь каталог в список, затем один JsonResponse."""
+    products = Product.objects.published().values(
+        'id', 'name', 'slug', 'price', 'old_price',
+        'brand__name', 'category__name', 'is_available'
+    )
+    return JsonResponse({'results': list(products)})
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк выгрузки каталога: JsonResponse против потоковых форматов (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help="Размеры каталога через запятую, например 10000,100000,1000000")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        rng = random.Random(options['seed'])
+        paths = [
+            ('JsonResponse', lambda: legacy_export(factory.get('/'))),
+            ('ndjson', lambda: product_list_api(factory.get('/', {'format': 'ndjson'}))),
+            ('json-stream', lambda: product_list_api(factory.get('/', {'format': 'json-stream'}))),
+        ]
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            with transaction.atomic():
+                seed_catalog(rng, size)
+                listing.rebuild()
+                self.stdout.write(f"--- {size} товаров")
+                for label, call in paths:
+                    ttfb, total, peak, length = self._measure(call)
+                    self.stdout.write(
+                        f"{label:<13} TTFB: {ttfb:8.1f} мс   всего: {total:8.1f} мс   "
+                        f"пик памяти: {peak / 2 ** 20:8.1f} МБ   ответ: {length / 2 ** 20:7.1f} МБ"
+                    )
+                transaction.set_rollback(True)
+
+    def _measure(self, call):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = call()
+        length = 0
+        ttfb = None
+        if response.streaming:
+            for chunk in response.streaming_content:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                length += len(chunk)
+        else:
+            ttfb = time.perf_counter() - started
+            length = len(response.content)
+        total = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return ttfb * 1000, total * 1000, peak, length
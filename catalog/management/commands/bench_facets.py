@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from catalog import facets, listing
+from catalog.models import Product
+from catalog.synthetic import seed_catalog
+
+
+def legacy_facet_counts(active_category_slugs, active_brand_slugs, active_tag_slugs):
+    """Прежняя реализация: три GROUP BY запроса на каждую страницу."""
+    base_products = Product.objects.published()
+    categories_qs = base_products
+    if active_brand_slugs:
+        categories_qs = categories_qs.filter(brand__slug__in=list(active_brand_slugs))
+    if active_tag_slugs:
+        categories_qs = categories_qs.filter(tags__slug__in=list(active_tag_slugs)).distinct()
+    brands_qs = base_products
+    if active_category_slugs:
+        brands_qs = brands_qs.filter(category__slug__in=list(active_category_slugs))
+    if active_tag_slugs:
+        brands_qs = brands_qs.filter(tags__slug__in=list(active_tag_slugs)).distinct()
+    tags_qs = base_products
+    if active_category_slugs:
+        tags_qs = tags_qs.filter(category__slug__in=list(active_category_slugs))
+    if active_brand_slugs:
+        tags_qs = tags_qs.filter(brand__slug__in=list(active_brand_slugs))
+    return (
+        list(categories_qs.values('category__slug', 'category__name').annotate(count=Count('id')).order_by('category__name')),
+        list(brands_qs.values('brand__slug', 'brand__name').annotate(count=Count('id')).order_by('brand__name')),
+        list(tags_qs.values('tags__slug', 'tags__name').exclude(tags__slug__isnull=True).annotate(count=Count('id')).order_by('tags__name')),
+    )
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк фасетов: GROUP BY запросы против битовых масок (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            listing.rebuild()
+            scenarios = [
+                ('без фильтров', set(), set(), set()),
+                ('категория', {'bench-cat-1'}, set(), set()),
+                ('категория+бренд+тег', {'bench-cat-1', 'bench-cat-2'}, {'bench-brand-3'}, {'bench-tag-4'}),
+            ]
+            facets.invalidate()
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                facets.get_facet_index()
+            self.stdout.write(
+                f"Построение индекса: {(time.perf_counter() - started) * 1000:.1f} мс, запросов: {len(ctx.captured_queries)}"
+            )
+            for label, cats, brands, tags in scenarios:
+                legacy_ms, legacy_queries = self._measure(
+                    lambda: legacy_facet_counts(cats, brands, tags), options['repeat']
+                )
+                engine_ms, engine_queries = self._measure(
+                    lambda: facets.get_facet_index().facets(cats, brands, tags), options['repeat']
+                )
+                self.stdout.write(
+                    f"{label:<22} GROUP BY: {legacy_ms:8.2f} мс / {legacy_queries} запр.   "
+                    f"битовые маски: {engine_ms:8.3f} мс / {engine_queries} запр."
+                )
+            transaction.set_rollback(True)
+        facets.invalidate()
+
+    def _measure(self, func, repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        queries = len(ctx.captured_queries)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat, queries
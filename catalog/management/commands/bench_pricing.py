@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from catalog import pricing
+from catalog.models import Product
+from catalog.synthetic import seed_catalog
+
+
+def legacy_discount_10(queryset):
+    """Прежний apply_discount_10: float и save() на каждый товар."""
+    count = 0
+    for p in queryset:
+        old = float(p.price)
+        p.old_price = p.old_price or old
+        p.price = old * 0.9
+        p.save(update_fields=['price', 'old_price'])
+        count += 1
+    return count
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк массовой скидки: save() по одному товару против одного UPDATE (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--legacy-limit', type=int, default=10000, help="Сколько товаров прогонять старым способом")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            products = Product.objects.filter(slug__startswith='bench-product-')
+            legacy_ids = products.order_by('id').values_list('id', flat=True)[:options['legacy_limit']]
+            legacy_qs = Product.objects.filter(pk__in=list(legacy_ids))
+            change = pricing.build_change('percent_discount', 10)
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                legacy = legacy_discount_10(legacy_qs)
+            self._report('save() в цикле', legacy, time.perf_counter() - started, len(ctx.captured_queries))
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                stats = pricing.preview(products, change)
+            self._report('preview (dry-run)', stats['affected'], time.perf_counter() - started, len(ctx.captured_queries))
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                updated = pricing.apply(products, change)
+            self._report('один UPDATE', updated, time.perf_counter() - started, len(ctx.captured_queries))
+            transaction.set_rollback(True)
+
+    def _report(self, label, rows, elapsed, queries):
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{label:<18} товаров: {rows:>7}   {elapsed * 1000:9.1f} мс   "
+            f"{rate:>10,.0f} товаров/с   запросов: {queries}"
+        )
@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Now
+
+from catalog import recommendations
+from catalog.models import Order, OrderItem, Product
+from catalog.synthetic import seed_catalog
+
+
+def legacy_similar(product):
+    """Прежний выбор: первые четыре товара той же категории."""
+    return list(Product.objects.published().filter(category=product.category).exclude(id=product.id)[:4])
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк похожих товаров: полный и инкрементальный расчёт (NumPy и чистый Python "
+        "на выборке) и выборка на странице товара (данные откатываются)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--changed', type=float, default=0.01, help="Доля изменённых товаров для инкрементального расчёта")
+        parser.add_argument('--python-sample', type=int, default=500, help="Товаров для замера расчёта на чистом Python")
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            ids = list(Product.objects.filter(slug__startswith='bench-product-').values_list('id', flat=True))
+            self.seed_orders(rng, ids, options['orders'])
+
+            started = time.perf_counter()
+            data = recommendations.CatalogData()
+            self.stdout.write(f"Загрузка признаков: {time.perf_counter() - started:.2f} с")
+
+            sample = rng.sample(range(len(data.ids)), min(options['python_sample'], len(data.ids)))
+            started = time.perf_counter()
+            python_rows = dict(recommendations.compute(data, sample, use_numpy=False))
+            per_product = (time.perf_counter() - started) / max(len(sample), 1)
+            self.stdout.write(
+                f"Чистый Python: {per_product * 1000:.2f} мс на товар, "
+                f"весь каталог ≈ {per_product * len(data.ids):.0f} с"
+            )
+            if recommendations.numpy is not None:
+                started = time.perf_counter()
+                numpy_rows = dict(recommendations.compute(data, sample, use_numpy=True))
+                self.stdout.write(f"NumPy, та же выборка: {(time.perf_counter() - started) * 1000:.0f} мс, "
+                                  f"совпадает с Python: {'да' if numpy_rows == python_rows else 'нет'}")
+            else:
+                self.stdout.write("NumPy не установлен — полный расчёт на чистом Python")
+
+            started = time.perf_counter()
+            count = recommendations.build()
+            self.stdout.write(f"Полный расчёт: {count} товаров за {time.perf_counter() - started:.1f} с")
+
+            changed = rng.sample(ids, max(1, int(len(ids) * options['changed'])))
+            Product.objects.filter(pk__in=changed).update(updated=Now())
+            started = time.perf_counter()
+            stale = recommendations.stale_ids()
+            count = recommendations.build(stale)
+            self.stdout.write(
+                f"Инкрементальный расчёт: изменено {len(changed)}, пересчитано {count} товаров "
+                f"за {time.perf_counter() - started:.1f} с"
+            )
+
+            products = list(Product.objects.filter(pk__in=rng.sample(ids, min(options['repeat'], len(ids)))))
+            for label, func in (('первые 4 в категории', legacy_similar),
+                                ('рекомендации', recommendations.similar_products)):
+                timings = []
+                for product in products:
+                    started = time.perf_counter()
+                    func(product)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(f"Страница товара, {label}: медиана {statistics.median(timings):.3f} мс")
+            transaction.set_rollback(True)
+
+    def seed_orders(self, rng, ids, count):
+        # Заказы по 2–4 товара, с перекосом к «популярной» десятой части каталога
+        popular = ids[:max(1, len(ids) // 10)]
+        orders = Order.objects.bulk_create(Order(code=f'BENCH-REC-{i}') for i in range(count))
+        items = []
+        for order in orders:
+            for pk in set(rng.choice(popular if rng.random() < 0.5 else ids) for _ in range(rng.randint(2, 4))):
+                items.append(OrderItem(order=order, product_id=pk, quantity=1, price=1000))
+        OrderItem.objects.bulk_create(items, batch_size=5000)
@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from catalog.models import Product
+from catalog.search import InvertedIndexBackend, SqliteFTSBackend
+from catalog.synthetic import seed_catalog
+
+QUERIES = ['смартфон', 'беспроводные наушники', 'игровой ноутбук', 'шумоподавлением', 'Brand7', 'быстрой зарядкой', 'камер']
+
+
+def icontains_search(query):
+    return list(
+        Product.objects.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__name__icontains=query) |
+            Q(category__name__icontains=query)
+        ).values_list('id', flat=True)[:500]
+    )
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк поиска: icontains против FTS5 и индекса в памяти (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            memory = InvertedIndexBackend()
+            paths = [('icontains', icontains_search)]
+            if SqliteFTSBackend.is_available():
+                fts = SqliteFTSBackend()
+                started = time.perf_counter()
+                fts.rebuild()
+                self.stdout.write(f"Построение FTS5: {time.perf_counter() - started:.2f} с")
+                paths.append(('fts5', lambda q: fts.search(q, 500)))
+            started = time.perf_counter()
+            memory.rebuild()
+            self.stdout.write(f"Построение индекса в памяти: {time.perf_counter() - started:.2f} с")
+            paths.append(('memory', lambda q: memory.search(q, 500)))
+
+            for label, func in paths:
+                timings = []
+                for _ in range(options['repeat']):
+                    for query in QUERIES:
+                        started = time.perf_counter()
+                        func(query)
+                        timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(
+                    f"{label:<10} медиана: {statistics.median(timings):8.2f} мс   p95: {p95:8.2f} мс"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,39 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import suggest
+from catalog.synthetic import ADJECTIVES, NOUNS, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк подсказок: задержка SuggestIndex.suggest по префиксам (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            seed_catalog(rng, options['products'])
+            suggest.reset()
+            started = time.perf_counter()
+            index = suggest.get_suggest_index()
+            self.stdout.write(f"Построение индекса: {time.perf_counter() - started:.2f} с, записей: {len(index)}")
+            words = NOUNS + ADJECTIVES + ['brand1', 'brand', '12', 'xyz']
+            timings = []
+            for _ in range(options['requests']):
+                word = rng.choice(words)
+                prefix = word[:rng.randint(1, len(word))]
+                started = time.perf_counter()
+                index.suggest(prefix, 10)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            for label, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+                self.stdout.write(f"{label}: {timings[int(len(timings) * q) - 1]:.4f} мс")
+            transaction.set_rollback(True)
+        suggest.reset()
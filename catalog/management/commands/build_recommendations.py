@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчёт похожих товаров (catalog.recommendations): по всему каталогу или, с --changed, "
+        "только для изменившихся товаров и тех, кто их рекомендует"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changed', action='store_true', help="Только товары, изменённые после прошлого расчёта")
+        parser.add_argument('--top', type=int, default=recommendations.TOP_N, help="Соседей на товар")
+        parser.add_argument('--no-numpy', action='store_true', help="Расчёт на чистом Python")
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError("--top должен быть положительным")
+        if not options['no_numpy'] and recommendations.numpy is None:
+            self.stderr.write("NumPy не установлен — расчёт на чистом Python")
+        started = time.perf_counter()
+        ids = recommendations.stale_ids() if options['changed'] else None
+        count = recommendations.build(ids, options['top'], use_numpy=False if options['no_numpy'] else None)
+        self.stdout.write(
+            self.style.SUCCESS(f"Рекомендации пересчитаны: {count} товаров за {time.perf_counter() - started:.2f} с")
+        )
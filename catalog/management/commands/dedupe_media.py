@@ -0,0 +1,43 @@
+import os
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from techmarket.storage import CAS_DIR, ContentAddressedStorage, file_digest
+
+
+class Command(BaseCommand):
+    help = "Дедупликация MEDIA_ROOT: одинаковые файлы заменяются жёсткими ссылками на общий блоб"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, сколько места освободится")
+
+    def handle(self, *args, **options):
+        if not options['dry_run'] and not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("STORAGES['default'] — не ContentAddressedStorage")
+        root = default_storage.location
+        names = []
+        for directory, subdirs, files in os.walk(root):
+            if directory == root:
+                subdirs[:] = [d for d in subdirs if d != CAS_DIR]
+            # Незавершённые загрузки interface ещё дописываются
+            subdirs[:] = [d for d in subdirs if d != '.partial']
+            names.extend(os.path.relpath(os.path.join(directory, f), root) for f in files)
+
+        if options['dry_run']:
+            inodes = defaultdict(dict)
+            for name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                inodes[file_digest(path)][stat.st_ino] = stat.st_size
+            saved = sum(sum(sizes.values()) - max(sizes.values()) for sizes in inodes.values())
+            self.stdout.write(f"Файлов: {len(names)}, разного содержимого: {len(inodes)}, "
+                              f"освободится: {filesizeformat(saved)}")
+            return
+
+        saved = 0
+        for name in names:
+            saved += default_storage.adopt(name)
+        self.stdout.write(self.style.SUCCESS(f"Файлов: {len(names)}, освобождено: {filesizeformat(saved)}"))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog.explain import canonical_queries, capture_sql, explain, median_ms, plan_warnings
+
+
+class Command(BaseCommand):
+    help = "Планы выполнения (EXPLAIN) и время типовых запросов витрины на текущей базе"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Только эти запросы")
+        parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE (PostgreSQL)")
+        parser.add_argument('--sql', action='store_true', help="Показать текст запросов")
+        parser.add_argument('--repeat', type=int, default=5, help="Повторов для замера времени")
+
+    def handle(self, *args, **options):
+        queries = canonical_queries()
+        if not queries:
+            raise CommandError("В каталоге нет опубликованных товаров")
+        if options['names']:
+            unknown = set(options['names']) - {name for name, _ in queries}
+            if unknown:
+                raise CommandError(f"Неизвестные запросы: {', '.join(sorted(unknown))}")
+            queries = [(name, func) for name, func in queries if name in options['names']]
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+
+        problems = 0
+        for name, func in queries:
+            elapsed = median_ms(func, options['repeat'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}  ({elapsed:.2f} мс)"))
+            for sql, params in capture_sql(func):
+                if options['sql']:
+                    self.stdout.write(f"  {sql}")
+                lines = explain(sql, params, **explain_options)
+                for line in lines:
+                    self.stdout.write(f"    {line}")
+                warnings = plan_warnings(lines)
+                if warnings:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(f"    ! {', '.join(warnings)}"))
+        self.stdout.write(f"Запросов: {len(queries)}, с предупреждениями: {problems}")
@@ -1,4 +1,10 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils.text import slugify
 from catalog.models import (
     Brand,
@@ -9,227 +15,337 @@ from catalog.models import (
     ProductDetail,
     Tag,
 )
+from catalog.orders import recalculate_orders
+from catalog.search import get_search_backend
+from catalog.signals import invalidate_bulk_changes
+
+CATEGORIES = [
+    {"name": "Смартфоны", "slug": "smartphones", "description": "Мобильные телефоны и смартфоны"},
+    {"name": "Ноутбуки", "slug": "laptops", "description": "Портативные компьютеры"},
+    {"name": "Планшеты", "slug": "tablets", "description": "Планшетные компьютеры"},
+    {"name": "Наушники", "slug": "headphones", "description": "Беспроводные и проводные наушники"},
+    {"name": "Умные часы", "slug": "smartwatches", "description": "Наручные умные часы и трекеры"},
+]
+
+BRANDS = [
+    {"name": "Apple", "description": "Американская корпорация"},
+    {"name": "Samsung", "description": "Южнокорейская компания"},
+    {"name": "Xiaomi", "description": "Китайская компания"},
+    {"name": "Asus", "description": "Тайваньская компания"},
+    {"name": "Sony", "description": "Японская компания"},
+    {"name": "Google", "description": "Американская компания"},
+    {"name": "Lenovo", "description": "Китайская компания"},
+    {"name": "Dell", "description": "Американская компания"},
+    {"name": "HP", "description": "Американская компания"},
+    {"name": "Microsoft", "description": "Американская компания"},
+    {"name": "Acer", "description": "Тайваньская компания"},
+    {"name": "MSI", "description": "Тайваньская компания"},
+    {"name": "Huawei", "description": "Китайская компания"},
+    {"name": "Amazon", "description": "Американская компания"},
+    {"name": "Beats", "description": "Американский бренд аудиотехники"},
+    {"name": "JBL", "description": "Американский бренд аудиотехники"},
+    {"name": "Sennheiser", "description": "Немецкая компания"},
+    {"name": "Razer", "description": "Американская компания"},
+    {"name": "Garmin", "description": "Американская компания"},
+    {"name": "Amazfit", "description": "Китайская компания"},
+    {"name": "Suunto", "description": "Финская компания"},
+    {"name": "Polar", "description": "Финская компания"},
+    {"name": "Bose", "description": "Американская компания"},
+    {"name": "OnePlus", "description": "Китайская компания"},
+]
+
+PRODUCTS = [
+    {"name": "iPhone 15 Pro 128GB", "description": "Флагманский смартфон Apple с процессором A17 Pro", "price": 99990, "old_price": 109990, "quantity": 45, "category_slug": "smartphones", "brand_slug": "apple"},
+    {"name": "iPhone 15 Pro 256GB", "description": "Флагманский смартфон Apple с процессором A17 Pro", "price": 109990, "old_price": 119990, "quantity": 35, "category_slug": "smartphones", "brand_slug": "apple"},
+    {"name": "iPhone 15 128GB", "description": "Современный смартфон Apple", "price": 79990, "old_price": 84990, "quantity": 40, "category_slug": "smartphones", "brand_slug": "apple"},
+    {"name": "Samsung Galaxy S24 256GB", "description": "Мощный Android-смартфон с камерой 200 МП", "price": 89990, "quantity": 38, "category_slug": "smartphones", "brand_slug": "samsung"},
+    {"name": "Samsung Galaxy S24 Ultra 512GB", "description": "Флагман Samsung с продвинутой камерой", "price": 129990, "quantity": 22, "category_slug": "smartphones", "brand_slug": "samsung"},
+    {"name": "Google Pixel 9 128GB", "description": "Чистый Android и топовая камера", "price": 89990, "quantity": 30, "category_slug": "smartphones", "brand_slug": "google"},
+    {"name": "Xiaomi 14 256GB", "description": "Флагман Xiaomi", "price": 69990, "quantity": 50, "category_slug": "smartphones", "brand_slug": "xiaomi"},
+    {"name": "Redmi Note 13 Pro 8/256", "description": "Доступный смартфон с отличной камерой", "price": 34990, "quantity": 50, "category_slug": "smartphones", "brand_slug": "xiaomi"},
+    {"name": "OnePlus 12 256GB", "description": "Флагман OnePlus с быстрой зарядкой", "price": 89990, "quantity": 28, "category_slug": "smartphones", "brand_slug": "oneplus"},
+    {"name": "Sony Xperia 1 VI 256GB", "description": "Премиальный смартфон с OLED-экраном", "price": 109990, "quantity": 15, "category_slug": "smartphones", "brand_slug": "sony"},
+
+    {"name": "MacBook Air 13 M2 256GB", "description": "Легкий и мощный ноутбук от Apple", "price": 129990, "old_price": 139990, "quantity": 42, "category_slug": "laptops", "brand_slug": "apple"},
+    {"name": "MacBook Pro 14 M3 Pro 512GB", "description": "Профессиональный ноутбук Apple", "price": 229990, "quantity": 18, "category_slug": "laptops", "brand_slug": "apple"},
+    {"name": "Asus ROG Zephyrus G16", "description": "Игровой ноутбук для требовательных пользователей", "price": 189990, "quantity": 25, "category_slug": "laptops", "brand_slug": "asus"},
+    {"name": "Dell XPS 13 9320", "description": "Компактный премиальный ультрабук", "price": 149990, "quantity": 20, "category_slug": "laptops", "brand_slug": "dell"},
+    {"name": "Lenovo ThinkPad X1 Carbon Gen11", "description": "Бизнес-ноутбук с прочным корпусом", "price": 179990, "quantity": 12, "category_slug": "laptops", "brand_slug": "lenovo"},
+    {"name": "HP Spectre x360 14", "description": "Трансформер с OLED-экраном", "price": 139990, "quantity": 27, "category_slug": "laptops", "brand_slug": "hp"},
+    {"name": "Microsoft Surface Laptop 7", "description": "Тонкий ноутбук на платформе ARM", "price": 159990, "quantity": 16, "category_slug": "laptops", "brand_slug": "microsoft"},
+    {"name": "Acer Predator Helios 16", "description": "Игровой ноутбук с мощной графикой", "price": 169990, "quantity": 9, "category_slug": "laptops", "brand_slug": "acer"},
+    {"name": "MSI Stealth 15", "description": "Тонкий игровой ноутбук", "price": 159990, "quantity": 11, "category_slug": "laptops", "brand_slug": "msi"},
+    {"name": "Huawei MateBook X Pro", "description": "Премиальный ноутбук Huawei", "price": 129990, "quantity": 13, "category_slug": "laptops", "brand_slug": "huawei"},
+
+    {"name": "iPad Pro 11 M4 256GB", "description": "Профессиональный планшет Apple", "price": 119990, "quantity": 26, "category_slug": "tablets", "brand_slug": "apple"},
+    {"name": "iPad Air M2 128GB", "description": "Легкий планшет Apple", "price": 94990, "quantity": 30, "category_slug": "tablets", "brand_slug": "apple"},
+    {"name": "Samsung Galaxy Tab S9 256GB", "description": "Планшет Samsung с AMOLED", "price": 99990, "quantity": 22, "category_slug": "tablets", "brand_slug": "samsung"},
+    {"name": "Samsung Galaxy Tab S9 FE 128GB", "description": "Доступный планшет Samsung", "price": 54990, "quantity": 35, "category_slug": "tablets", "brand_slug": "samsung"},
+    {"name": "Xiaomi Pad 6 128GB", "description": "Планшет с высоким разрешением экрана", "price": 34990, "quantity": 45, "category_slug": "tablets", "brand_slug": "xiaomi"},
+    {"name": "Lenovo Tab P12 256GB", "description": "Большой планшет Lenovo", "price": 44990, "quantity": 33, "category_slug": "tablets", "brand_slug": "lenovo"},
+    {"name": "Huawei MatePad 11.5", "description": "Планшет Huawei для работы и учебы", "price": 39990, "quantity": 28, "category_slug": "tablets", "brand_slug": "huawei"},
+    {"name": "Microsoft Surface Pro 10", "description": "Планшет 2-в-1", "price": 189990, "quantity": 10, "category_slug": "tablets", "brand_slug": "microsoft"},
+    {"name": "Amazon Fire HD 10 (2023)", "description": "Доступный планшет для мультимедиа", "price": 14990, "quantity": 50, "category_slug": "tablets", "brand_slug": "amazon"},
+    {"name": "Google Pixel Tablet 128GB", "description": "Планшет Google с док-станцией", "price": 69990, "quantity": 20, "category_slug": "tablets", "brand_slug": "google"},
+
+    {"name": "AirPods Pro 2", "description": "Наушники с активным шумоподавлением", "price": 29990, "quantity": 50, "category_slug": "headphones", "brand_slug": "apple"},
+    {"name": "Sony WH-1000XM5", "description": "Флагманские накладные наушники", "price": 39990, "quantity": 40, "category_slug": "headphones", "brand_slug": "sony"},
+    {"name": "Bose QuietComfort Ultra", "description": "Премиальные наушники с ANC", "price": 34990, "quantity": 35, "category_slug": "headphones", "brand_slug": "bose"},
+    {"name": "Beats Studio Pro", "description": "Стильные накладные наушники", "price": 32990, "quantity": 25, "category_slug": "headphones", "brand_slug": "beats"},
+    {"name": "Samsung Galaxy Buds3 Pro", "description": "Компактные TWS-наушники", "price": 22990, "quantity": 45, "category_slug": "headphones", "brand_slug": "samsung"},
+    {"name": "JBL Tune 760NC", "description": "Бюджетные наушники с ANC", "price": 11990, "quantity": 50, "category_slug": "headphones", "brand_slug": "jbl"},
+    {"name": "Sennheiser Momentum 4", "description": "Премиальные наушники с высоким качеством звука", "price": 39990, "quantity": 18, "category_slug": "headphones", "brand_slug": "sennheiser"},
+    {"name": "Xiaomi Buds 4 Pro", "description": "Флагманские TWS-наушники Xiaomi", "price": 15990, "quantity": 40, "category_slug": "headphones", "brand_slug": "xiaomi"},
+    {"name": "Huawei FreeBuds Pro 3", "description": "TWS-наушники с хорошим ANC", "price": 21990, "quantity": 38, "category_slug": "headphones", "brand_slug": "huawei"},
+    {"name": "Razer BlackShark V2 Pro", "description": "Игровая гарнитура", "price": 19990, "quantity": 16, "category_slug": "headphones", "brand_slug": "razer"},
+
+    {"name": "Apple Watch Series 10 GPS 45mm", "description": "Умные часы Apple", "price": 49990, "quantity": 50, "category_slug": "smartwatches", "brand_slug": "apple"},
+    {"name": "Apple Watch Ultra 2", "description": "Премиальные часы Apple для спорта", "price": 99990, "quantity": 14, "category_slug": "smartwatches", "brand_slug": "apple"},
+    {"name": "Samsung Galaxy Watch7 44mm", "description": "Умные часы на Wear OS", "price": 29990, "quantity": 40, "category_slug": "smartwatches", "brand_slug": "samsung"},
+    {"name": "Garmin Fenix 8 Sapphire", "description": "Профессиональные часы для спорта", "price": 89990, "quantity": 12, "category_slug": "smartwatches", "brand_slug": "garmin"},
+    {"name": "Huawei Watch GT 5", "description": "Автономные смарт-часы Huawei", "price": 24990, "quantity": 33, "category_slug": "smartwatches", "brand_slug": "huawei"},
+    {"name": "Google Pixel Watch 3", "description": "Часы Google на Wear OS", "price": 34990, "quantity": 28, "category_slug": "smartwatches", "brand_slug": "google"},
+    {"name": "Amazfit GTR 4", "description": "Легкие фитнес-часы", "price": 19990, "quantity": 37, "category_slug": "smartwatches", "brand_slug": "amazfit"},
+    {"name": "Xiaomi Watch 2 Pro", "description": "Смарт-часы Xiaomi", "price": 22990, "quantity": 34, "category_slug": "smartwatches", "brand_slug": "xiaomi"},
+    {"name": "Suunto Race", "description": "Часы для бега и триатлона", "price": 54990, "quantity": 9, "category_slug": "smartwatches", "brand_slug": "suunto"},
+    {"name": "Polar Vantage V3", "description": "Профессиональные спортивные часы", "price": 69990, "quantity": 7, "category_slug": "smartwatches", "brand_slug": "polar"},
+]
+
+TAGS = [("Хит", "hit"), ("Новинка", "new"), ("Распродажа", "sale"), ("Игровой", "gaming"), ("Премиум", "premium")]
+
+MODEL_WORDS = ["Pro", "Max", "Lite", "Ultra", "Air", "Neo", "Plus", "Mini", "X", "S", "Edge", "Prime"]
+ORDER_STATUSES = [
+    (Order.Status.NEW, 20),
+    (Order.Status.PROCESSING, 20),
+    (Order.Status.COMPLETED, 50),
+    (Order.Status.CANCELLED, 10),
+]
 
 
 class Command(BaseCommand):
     help = "Заполнение базы данных тестовыми данными"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0, help="Сгенерировать дополнительно N синтетических товаров")
+        parser.add_argument('--seed', type=int, default=42, help="Зерно генератора: одинаковое зерно даёт одинаковые данные")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--orders-per-product', type=float, default=0.1, help="Число заказов на один синтетический товар")
+
+    def handle(self, *args, **options):
         self.stdout.write("Начало заполнения базы данных...")
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
 
-        categories_data = [
-            {"name": "Смартфоны", "slug": "smartphones", "description": "Мобильные телефоны и смартфоны"},
-            {"name": "Ноутбуки", "slug": "laptops", "description": "Портативные компьютеры"},
-            {"name": "Планшеты", "slug": "tablets", "description": "Планшетные компьютеры"},
-            {"name": "Наушники", "slug": "headphones", "description": "Беспроводные и проводные наушники"},
-            {"name": "Умные часы", "slug": "smartwatches", "description": "Наручные умные часы и трекеры"},
-        ]
+        with transaction.atomic():
+            categories = self._ensure_by_name(Category, [
+                Category(name=c["name"], slug=c["slug"], description=c["description"]) for c in CATEGORIES
+            ])
+            brands = self._ensure_by_name(Brand, [
+                Brand(name=b["name"], slug=slugify(b["name"]), description=b["description"]) for b in BRANDS
+            ])
+            tags = self._ensure_tags()
+            self._ensure_base_products(categories, brands)
+            self._ensure_product_tags(rng, tags)
+            self._ensure_details()
+            self._ensure_base_orders()
+            if options['scale']:
+                self._generate(rng, options['scale'], options['seed'], categories, brands, tags, options['orders_per_product'])
 
-        for cat_data in categories_data:
-            name = cat_data["name"]
-            category, created = Category.objects.get_or_create(
-                name=name,
-                defaults={
-                    "slug": cat_data["slug"],
-                    "description": cat_data["description"],
-                }
-            )
-            if created:
-                self.stdout.write(f"Создана категория: {name}")
-
-        brands_data = [
-            {"name": "Apple", "description": "Американская корпорация"},
-            {"name": "Samsung", "description": "Южнокорейская компания"},
-            {"name": "Xiaomi", "description": "Китайская компания"},
-            {"name": "Asus", "description": "Тайваньская компания"},
-            {"name": "Sony", "description": "Японская компания"},
-            {"name": "Google", "description": "Американская компания"},
-            {"name": "Lenovo", "description": "Китайская компания"},
-            {"name": "Dell", "description": "Американская компания"},
-            {"name": "HP", "description": "Американская компания"},
-            {"name": "Microsoft", "description": "Американская компания"},
-            {"name": "Acer", "description": "Тайваньская компания"},
-            {"name": "MSI", "description": "Тайваньская компания"},
-            {"name": "Huawei", "description": "Китайская компания"},
-            {"name": "Amazon", "description": "Американская компания"},
-            {"name": "Beats", "description": "Американский бренд аудиотехники"},
-            {"name": "JBL", "description": "Американский бренд аудиотехники"},
-            {"name": "Sennheiser", "description": "Немецкая компания"},
-            {"name": "Razer", "description": "Американская компания"},
-            {"name": "Garmin", "description": "Американская компания"},
-            {"name": "Amazfit", "description": "Китайская компания"},
-            {"name": "Suunto", "description": "Финская компания"},
-            {"name": "Polar", "description": "Финская компания"},
-            {"name": "Bose", "description": "Американская компания"},
-            {"name": "OnePlus", "description": "Китайская компания"},
-        ]
+        invalidate_bulk_changes()
+        backend = get_search_backend()
+        if backend.persistent:
+            self.stdout.write(f"Перестройка поискового индекса '{backend.name}'...")
+            backend.rebuild()
 
-        for brand_data in brands_data:
-            name = brand_data["name"]
-            slug = slugify(name)
-            brand, created = Brand.objects.get_or_create(
-                name=name,
-                defaults={
-                    "slug": slug,
-                    "description": brand_data["description"],
-                }
+        self.stdout.write(
+            self.style.SUCCESS(
+                "База данных успешно заполнена: категории, бренды, товары, теги, характеристики, заказы "
+                f"({time.perf_counter() - started:.1f} с)"
             )
-            if created:
-                self.stdout.write(f"Создан бренд: {name}")
-
-        products_data = [
-            {"name": "iPhone 15 Pro 128GB", "description": "Флагманский смартфон Apple с процессором A17 Pro", "price": 99990, "old_price": 109990, "quantity": 45, "category_slug": "smartphones", "brand_slug": "apple"},
-            {"name": "iPhone 15 Pro 256GB", "description": "Флагманский смартфон Apple с процессором A17 Pro", "price": 109990, "old_price": 119990, "quantity": 35, "category_slug": "smartphones", "brand_slug": "apple"},
-            {"name": "iPhone 15 128GB", "description": "Современный смартфон Apple", "price": 79990, "old_price": 84990, "quantity": 40, "category_slug": "smartphones", "brand_slug": "apple"},
-            {"name": "Samsung Galaxy S24 256GB", "description": "Мощный Android-смартфон с камерой 200 МП", "price": 89990, "quantity": 38, "category_slug": "smartphones", "brand_slug": "samsung"},
-            {"name": "Samsung Galaxy S24 Ultra 512GB", "description": "Флагман Samsung с продвинутой камерой", "price": 129990, "quantity": 22, "category_slug": "smartphones", "brand_slug": "samsung"},
-            {"name": "Google Pixel 9 128GB", "description": "Чистый Android и топовая камера", "price": 89990, "quantity": 30, "category_slug": "smartphones", "brand_slug": "google"},
-            {"name": "Xiaomi 14 256GB", "description": "Флагман Xiaomi", "price": 69990, "quantity": 50, "category_slug": "smartphones", "brand_slug": "xiaomi"},
-            {"name": "Redmi Note 13 Pro 8/256", "description": "Доступный смартфон с отличной камерой", "price": 34990, "quantity": 50, "category_slug": "smartphones", "brand_slug": "xiaomi"},
-            {"name": "OnePlus 12 256GB", "description": "Флагман OnePlus с быстрой зарядкой", "price": 89990, "quantity": 28, "category_slug": "smartphones", "brand_slug": "oneplus"},
-            {"name": "Sony Xperia 1 VI 256GB", "description": "Премиальный смартфон с OLED-экраном", "price": 109990, "quantity": 15, "category_slug": "smartphones", "brand_slug": "sony"},
-
-            {"name": "MacBook Air 13 M2 256GB", "description": "Легкий и мощный ноутбук от Apple", "price": 129990, "old_price": 139990, "quantity": 42, "category_slug": "laptops", "brand_slug": "apple"},
-            {"name": "MacBook Pro 14 M3 Pro 512GB", "description": "Профессиональный ноутбук Apple", "price": 229990, "quantity": 18, "category_slug": "laptops", "brand_slug": "apple"},
-            {"name": "Asus ROG Zephyrus G16", "description": "Игровой ноутбук для требовательных пользователей", "price": 189990, "quantity": 25, "category_slug": "laptops", "brand_slug": "asus"},
-            {"name": "Dell XPS 13 9320", "description": "Компактный премиальный ультрабук", "price": 149990, "quantity": 20, "category_slug": "laptops", "brand_slug": "dell"},
-            {"name": "Lenovo ThinkPad X1 Carbon Gen11", "description": "Бизнес-ноутбук с прочным корпусом", "price": 179990, "quantity": 12, "category_slug": "laptops", "brand_slug": "lenovo"},
-            {"name": "HP Spectre x360 14", "description": "Трансформер с OLED-экраном", "price": 139990, "quantity": 27, "category_slug": "laptops", "brand_slug": "hp"},
-            {"name": "Microsoft Surface Laptop 7", "description": "Тонкий ноутбук на платформе ARM", "price": 159990, "quantity": 16, "category_slug": "laptops", "brand_slug": "microsoft"},
-            {"name": "Acer Predator Helios 16", "description": "Игровой ноутбук с мощной графикой", "price": 169990, "quantity": 9, "category_slug": "laptops", "brand_slug": "acer"},
-            {"name": "MSI Stealth 15", "description": "Тонкий игровой ноутбук", "price": 159990, "quantity": 11, "category_slug": "laptops", "brand_slug": "msi"},
-            {"name": "Huawei MateBook X Pro", "description": "Премиальный ноутбук Huawei", "price": 129990, "quantity": 13, "category_slug": "laptops", "brand_slug": "huawei"},
-
-            {"name": "iPad Pro 11 M4 256GB", "description": "Профессиональный планшет Apple", "price": 119990, "quantity": 26, "category_slug": "tablets", "brand_slug": "apple"},
-            {"name": "iPad Air M2 128GB", "description": "Легкий планшет Apple", "price": 94990, "quantity": 30, "category_slug": "tablets", "brand_slug": "apple"},
-            {"name": "Samsung Galaxy Tab S9 256GB", "description": "Планшет Samsung с AMOLED", "price": 99990, "quantity": 22, "category_slug": "tablets", "brand_slug": "samsung"},
-            {"name": "Samsung Galaxy Tab S9 FE 128GB", "description": "Доступный планшет Samsung", "price": 54990, "quantity": 35, "category_slug": "tablets", "brand_slug": "samsung"},
-            {"name": "Xiaomi Pad 6 128GB", "description": "Планшет с высоким разрешением экрана", "price": 34990, "quantity": 45, "category_slug": "tablets", "brand_slug": "xiaomi"},
-            {"name": "Lenovo Tab P12 256GB", "description": "Большой планшет Lenovo", "price": 44990, "quantity": 33, "category_slug": "tablets", "brand_slug": "lenovo"},
-            {"name": "Huawei MatePad 11.5", "description": "Планшет Huawei для работы и учебы", "price": 39990, "quantity": 28, "category_slug": "tablets", "brand_slug": "huawei"},
-            {"name": "Microsoft Surface Pro 10", "description": "Планшет 2-в-1", "price": 189990, "quantity": 10, "category_slug": "tablets", "brand_slug": "microsoft"},
-            {"name": "Amazon Fire HD 10 (2023)", "description": "Доступный планшет для мультимедиа", "price": 14990, "quantity": 50, "category_slug": "tablets", "brand_slug": "amazon"},
-            {"name": "Google Pixel Tablet 128GB", "description": "Планшет Google с док-станцией", "price": 69990, "quantity": 20, "category_slug": "tablets", "brand_slug": "google"},
-
-            {"name": "AirPods Pro 2", "description": "Наушники с активным шумоподавлением", "price": 29990, "quantity": 50, "category_slug": "headphones", "brand_slug": "apple"},
-            {"name": "Sony WH-1000XM5", "description": "Флагманские накладные наушники", "price": 39990, "quantity": 40, "category_slug": "headphones", "brand_slug": "sony"},
-            {"name": "Bose QuietComfort Ultra", "description": "Премиальные наушники с ANC", "price": 34990, "quantity": 35, "category_slug": "headphones", "brand_slug": "bose"},
-            {"name": "Beats Studio Pro", "description": "Стильные накладные наушники", "price": 32990, "quantity": 25, "category_slug": "headphones", "brand_slug": "beats"},
-            {"name": "Samsung Galaxy Buds3 Pro", "description": "Компактные TWS-наушники", "price": 22990, "quantity": 45, "category_slug": "headphones", "brand_slug": "samsung"},
-            {"name": "JBL Tune 760NC", "description": "Бюджетные наушники с ANC", "price": 11990, "quantity": 50, "category_slug": "headphones", "brand_slug": "jbl"},
-            {"name": "Sennheiser Momentum 4", "description": "Премиальные наушники с высоким качеством звука", "price": 39990, "quantity": 18, "category_slug": "headphones", "brand_slug": "sennheiser"},
-            {"name": "Xiaomi Buds 4 Pro", "description": "Флагманские TWS-наушники Xiaomi", "price": 15990, "quantity": 40, "category_slug": "headphones", "brand_slug": "xiaomi"},
-            {"name": "Huawei FreeBuds Pro 3", "description": "TWS-наушники с хорошим ANC", "price": 21990, "quantity": 38, "category_slug": "headphones", "brand_slug": "huawei"},
-            {"name": "Razer BlackShark V2 Pro", "description": "Игровая гарнитура", "price": 19990, "quantity": 16, "category_slug": "headphones", "brand_slug": "razer"},
-
-            {"name": "Apple Watch Series 10 GPS 45mm", "description": "Умные часы Apple", "price": 49990, "quantity": 50, "category_slug": "smartwatches", "brand_slug": "apple"},
-            {"name": "Apple Watch Ultra 2", "description": "Премиальные часы Apple для спорта", "price": 99990, "quantity": 14, "category_slug": "smartwatches", "brand_slug": "apple"},
-            {"name": "Samsung Galaxy Watch7 44mm", "description": "Умные часы на Wear OS", "price": 29990, "quantity": 40, "category_slug": "smartwatches", "brand_slug": "samsung"},
-            {"name": "Garmin Fenix 8 Sapphire", "description": "Профессиональные часы для спорта", "price": 89990, "quantity": 12, "category_slug": "smartwatches", "brand_slug": "garmin"},
-            {"name": "Huawei Watch GT 5", "description": "Автономные смарт-часы Huawei", "price": 24990, "quantity": 33, "category_slug": "smartwatches", "brand_slug": "huawei"},
-            {"name": "Google Pixel Watch 3", "description": "Часы Google на Wear OS", "price": 34990, "quantity": 28, "category_slug": "smartwatches", "brand_slug": "google"},
-            {"name": "Amazfit GTR 4", "description": "Легкие фитнес-часы", "price": 19990, "quantity": 37, "category_slug": "smartwatches", "brand_slug": "amazfit"},
-            {"name": "Xiaomi Watch 2 Pro", "description": "Смарт-часы Xiaomi", "price": 22990, "quantity": 34, "category_slug": "smartwatches", "brand_slug": "xiaomi"},
-            {"name": "Suunto Race", "description": "Часы для бега и триатлона", "price": 54990, "quantity": 9, "category_slug": "smartwatches", "brand_slug": "suunto"},
-            {"name": "Polar Vantage V3", "description": "Профессиональные спортивные часы", "price": 69990, "quantity": 7, "category_slug": "smartwatches", "brand_slug": "polar"},
-        ]
+        )
+
+    def _ensure_by_name(self, model, objects):
+        existing = set(model.objects.filter(name__in=[o.name for o in objects]).values_list('name', flat=True))
+        missing = [o for o in objects if o.name not in existing]
+        model.objects.bulk_create(missing)
+        for o in missing:
+            self.stdout.write(f"Создан(а) {model._meta.verbose_name.lower()}: {o.name}")
+        return {o.slug: o for o in model.objects.filter(name__in=[o.name for o in objects])}
 
-        for product_data in products_data:
+    def _ensure_tags(self):
+        slugs = [slug for _, slug in TAGS]
+        existing = set(Tag.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        Tag.objects.bulk_create([Tag(name=name, slug=slug) for name, slug in TAGS if slug not in existing])
+        by_slug = Tag.objects.in_bulk(slugs, field_name='slug')
+        return [by_slug[s] for s in slugs]
+
+    def _ensure_base_products(self, categories, brands):
+        existing = set(Product.objects.filter(name__in=[p["name"] for p in PRODUCTS]).values_list('name', flat=True))
+        missing = []
+        for product_data in PRODUCTS:
             name = product_data["name"]
-            slug = slugify(name)
+            if name in existing:
+                self.stdout.write(f"Товар уже существует: {name}")
+                continue
+            category = categories.get(product_data["category_slug"])
+            brand = brands.get(product_data["brand_slug"])
+            if category is None:
+                self.stdout.write(self.style.ERROR(f"Категория не найдена: {product_data['category_slug']}"))
+                continue
+            if brand is None:
+                self.stdout.write(self.style.ERROR(f"Бренд не найден: {product_data['brand_slug']}"))
+                continue
+            missing.append(Product(
+                name=name,
+                slug=slugify(name),
+                description=product_data["description"],
+                price=product_data["price"],
+                old_price=product_data.get("old_price"),
+                quantity=product_data["quantity"],
+                category=category,
+                brand=brand,
+                is_available=product_data["quantity"] > 0,
+            ))
+        Product.objects.bulk_create(missing)
+        for product in missing:
+            self.stdout.write(f"Создан товар: {product.name}")
 
-            try:
-                category = Category.objects.get(slug=product_data["category_slug"])\
-                
-                brand = Brand.objects.get(slug=product_data["brand_slug"])
+    def _ensure_product_tags(self, rng, tags):
+        # Каждому товару без тегов — два случайных тега и «Хит»
+        through = Product.tags.through
+        hit_tag = tags[0]
+        untagged = Product.objects.filter(tags__isnull=True).values_list('id', flat=True)
+        rows = []
+        for product_id in untagged:
+            chosen = {tag.id for tag in rng.sample(tags, 2)} | {hit_tag.id}
+            rows.extend(through(product_id=product_id, tag_id=tag_id) for tag_id in sorted(chosen))
+        through.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
 
-                product, created = Product.objects.get_or_create(
-                    name=name,
-                    defaults={
-                        "slug": slug,
-                        "description": product_data["description"],
-                        "price": product_data["price"],
-                        "old_price": product_data.get("old_price"),
-                        "quantity": product_data["quantity"],
-                        "category": category,
-                        "brand": brand,
-                        "is_available": product_data["quantity"] > 0,
-                    }
-                )
-
-                if created:
-                    self.stdout.write(f"Создан товар: {name}")
-                else:
-                    self.stdout.write(f"Товар уже существует: {name}")
-
-            except Category.DoesNotExist:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"Категория не найдена: {product_data['category_slug']}"
-                    )
-                )
-            except Brand.DoesNotExist:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"Бренд не найден: {product_data['brand_slug']}"
-                    )
-                )
-
-        tags_data = ["Хит", "Новинка", "Распродажа", "Игровой", "Премиум"]
-        for t in tags_data:
-            slug = slugify(t)
-            Tag.objects.get_or_create(slug=slug, defaults={"name": t})
-
-        for product in Product.objects.all():
-            ProductDetail.objects.get_or_create(
-                product=product,
-                defaults={
-                    "sku": f"SKU-{product.id:05d}",
-                    "warranty_months": 12,
-                    "specs": "Стандартные характеристики",
-                }
-            )
-            for tag in Tag.objects.order_by('?')[:2]:
-                product.tags.add(tag)
-        try:
-            hit_tag = Tag.objects.get(slug=slugify("Хит"))
-            for product in Product.objects.all():
-                product.tags.add(hit_tag)
-        except Tag.DoesNotExist:
-            pass
-
-        order1 = Order.objects.get_or_create(
-            code="ORD-0001", defaults={"status": Order.Status.NEW}
-        )[0]
-        for product in Product.objects.all()[:5]:
-            OrderItem.objects.get_or_create(
-                order=order1,
-                product=product,
-                defaults={"quantity": 1, "price": product.price},
-            )
+    def _ensure_details(self):
+        missing = Product.objects.filter(details__isnull=True).values_list('id', flat=True)
+        ProductDetail.objects.bulk_create(
+            (
+                ProductDetail(product_id=pk, sku=f"SKU-{pk:05d}", warranty_months=12, specs="Стандартные характеристики")
+                for pk in missing
+            ),
+            batch_size=self.batch_size,
+        )
 
-        order2 = Order.objects.get_or_create(
-            code="ORD-0002", defaults={"status": Order.Status.PROCESSING}
-        )[0]
-        for product in Product.objects.all()[5:10]:
-            OrderItem.objects.get_or_create(
-                order=order2,
-                product=product,
-                defaults={"quantity": 2, "price": product.price},
-            )
+    def _ensure_base_orders(self):
+        specs = [
+            ("ORD-0001", Order.Status.NEW, slice(0, 5), 1),
+            ("ORD-0002", Order.Status.PROCESSING, slice(5, 10), 2),
+            ("ORD-0003", Order.Status.COMPLETED, slice(10, 15), 1),
+        ]
+        codes = [code for code, *_ in specs]
+        existing = set(Order.objects.filter(code__in=codes).values_list('code', flat=True))
+        Order.objects.bulk_create([Order(code=code, status=status) for code, status, *_ in specs if code not in existing])
+        orders = Order.objects.in_bulk(codes, field_name='code')
+        products = list(Product.objects.values_list('id', 'price')[:15])
+        existing_items = set(OrderItem.objects.filter(order__code__in=codes).values_list('order_id', 'product_id'))
+        items = [
+            OrderItem(order=orders[code], product_id=product_id, quantity=quantity, price=price)
+            for code, _, window, quantity in specs
+            for product_id, price in products[window]
+            if (orders[code].id, product_id) not in existing_items
+        ]
+        OrderItem.objects.bulk_create(items)
+        recalculate_orders(Order.objects.filter(code__in=codes))
 
-        order3 = Order.objects.get_or_create(
-            code="ORD-0003", defaults={"status": Order.Status.COMPLETED}
-        )[0]
-        for product in Product.objects.all()[10:15]:
-            OrderItem.objects.get_or_create(
-                order=order3,
-                product=product,
-                defaults={"quantity": 1, "price": product.price},
-            )
+    def _progress(self, label, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f"  {label}: {done}/{total} ({rate:,.0f} строк/с)")
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                "База данных успешно заполнена: категории, бренды, товары, теги, характеристики, заказы"
-            )
-        )
+    def _generate(self, rng, count, seed, categories, brands, tags, orders_per_product):
+        prefix = f"gen-s{seed}"
+        if Product.objects.filter(slug__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Синтетические товары с зерном {seed} уже созданы; укажите другое --seed")
+
+        self.stdout.write(f"Генерация {count} товаров...")
+        # Бренды и ценовой уровень категорий берём из эталонного набора
+        category_brands = {}
+        category_prices = {}
+        for p in PRODUCTS:
+            category_brands.setdefault(p["category_slug"], set()).add(p["brand_slug"])
+            category_prices.setdefault(p["category_slug"], []).append(p["price"])
+        category_slugs = sorted(s for s in category_brands if s in categories)
+        category_brands = {s: sorted(b for b in category_brands[s] if b in brands) for s in category_slugs}
+        median_price = {s: sorted(v)[len(v) // 2] for s, v in category_prices.items()}
+        # Популярность тегов по закону Ципфа
+        tag_weights = [1 / (rank + 1) for rank in range(len(tags))]
+        tag_counts = [0, 1, 2, 3]
+        tag_count_weights = [30, 40, 20, 10]
+
+        product_ids = array('q')
+        product_prices = array('q')
+        through = Product.tags.through
+        started = time.perf_counter()
+        for batch_start in range(0, count, self.batch_size):
+            batch = []
+            for i in range(batch_start, min(count, batch_start + self.batch_size)):
+                category_slug = rng.choice(category_slugs)
+                brand_slug = rng.choice(category_brands[category_slug])
+                brand = brands[brand_slug]
+                price = max(990, int(rng.lognormvariate(0, 0.4) * median_price[category_slug]) // 10 * 10 - 10)
+                old_price = price + price * rng.randint(5, 30) // 100 if rng.random() < 0.2 else None
+                quantity = 0 if rng.random() < 0.05 else rng.randint(1, 100)
+                name = f"{brand.name} {rng.choice(MODEL_WORDS)} {rng.randint(1, 99)} #{i}"
+                batch.append(Product(
+                    name=name,
+                    slug=f"{prefix}-{i}",
+                    description=f"{categories[category_slug].name}: {name}",
+                    price=price,
+                    old_price=old_price,
+                    quantity=quantity,
+                    category=categories[category_slug],
+                    brand=brand,
+                    is_available=quantity > 0,
+                    status=Product.Status.PUBLISHED if rng.random() < 0.95 else Product.Status.DRAFT,
+                ))
+            Product.objects.bulk_create(batch)
+            details = []
+            tag_rows = []
+            for product in batch:
+                product_ids.append(product.id)
+                product_prices.append(int(product.price))
+                details.append(ProductDetail(product_id=product.id, sku=f"SKU-{product.id:07d}", warranty_months=rng.choice((12, 12, 24, 36))))
+                k = rng.choices(tag_counts, tag_count_weights)[0]
+                chosen = set()
+                while len(chosen) < k:
+                    chosen.add(rng.choices(tags, tag_weights)[0].id)
+                tag_rows.extend(through(product_id=product.id, tag_id=tag_id) for tag_id in sorted(chosen))
+            ProductDetail.objects.bulk_create(details)
+            through.objects.bulk_create(tag_rows)
+            self._progress("товары", len(product_ids), count, started)
+
+        order_count = max(1, int(count * orders_per_product))
+        self.stdout.write(f"Генерация {order_count} заказов...")
+        statuses = [status for status, _ in ORDER_STATUSES]
+        status_weights = [weight for _, weight in ORDER_STATUSES]
+        started = time.perf_counter()
+        for batch_start in range(0, order_count, self.batch_size):
+            orders = []
+            items = []
+            for i in range(batch_start, min(order_count, batch_start + self.batch_size)):
+                order = Order(code=f"G{seed}-{i:08d}", status=rng.choices(statuses, status_weights)[0])
+                # 1–6 позиций, популярные (первые) товары выбираются чаще
+                positions = {int(len(product_ids) * rng.random() ** 3) for _ in range(min(6, 1 + int(rng.expovariate(0.7))))}
+                order_items = [
+                    OrderItem(
+                        order=order,
+                        product_id=product_ids[position],
+                        quantity=rng.choices((1, 2, 3), (70, 20, 10))[0],
+                        price=Decimal(product_prices[position]),
+                    )
+                    for position in sorted(positions)
+                ]
+                # bulk_create не шлёт сигналов: итоги заказа заполняем сразу
+                order.items_count = len(order_items)
+                order.total = sum((item.amount for item in order_items), Decimal('0.00'))
+                orders.append(order)
+                items.extend(order_items)
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            self._progress("заказы", min(order_count, batch_start + self.batch_size), order_count, started)
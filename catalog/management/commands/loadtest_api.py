@@ -0,0 +1,68 @@
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from catalog.loadtest import ASGIRunner, HTTPRunner, WSGIRunner
+from catalog.perf import percentile
+from catalog.models import Product
+
+ENDPOINTS = (
+    ('list', 'product_list_api', 'product_list_api_async', '?page_size=20'),
+    ('cursor', 'product_list_api', 'product_list_api_async', '?pagination=cursor&page_size=20'),
+    ('detail', 'product_detail_api', 'product_detail_api_async', ''),
+    ('suggest', 'suggest_api', 'suggest_api_async', '?q=sm'),
+    ('search', 'search_api', 'search_api_async', '?' + urlencode({'q': 'ноутбук'})),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест JSON API: синхронные и асинхронные представления под WSGI и ASGI "
+        "(запросов в секунду и хвостовые задержки). Нужны данные в БД — см. fill_database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Запросов на каждую комбинацию")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--endpoint', action='append', choices=[e[0] for e in ENDPOINTS],
+                            help="Какие эндпоинты проверять (по умолчанию все)")
+        parser.add_argument('--server', action='append', choices=('wsgi', 'asgi'),
+                            help="Какой обработчик запускать в процессе (по умолчанию оба)")
+        parser.add_argument('--base-url', action='append', default=[],
+                            help="Вместо обработчиков в процессе — внешний сервер, например "
+                                 "http://127.0.0.1:8000 (gunicorn) и http://127.0.0.1:8001 (uvicorn)")
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.published().values_list('id', flat=True)[:200])
+        if not product_ids:
+            raise CommandError("В каталоге нет товаров: сначала выполните fill_database")
+        if options['base_url']:
+            runners = [(urlsplit(url).netloc, HTTPRunner(url)) for url in options['base_url']]
+        else:
+            runners = [
+                (name, runner()) for name, runner in (('wsgi', WSGIRunner), ('asgi', ASGIRunner))
+                if name in (options['server'] or ('wsgi', 'asgi'))
+            ]
+        endpoints = [e for e in ENDPOINTS if e[0] in (options['endpoint'] or [e[0] for e in ENDPOINTS])]
+        n, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(
+            f"{'сервер':<16} {'эндпоинт':<8} {'view':<6} {'запр/с':>9} {'p50, мс':>9} {'p95, мс':>9} "
+            f"{'p99, мс':>9} {'ошибок':>7}"
+        )
+        for server, runner in runners:
+            for label, sync_name, async_name, query in endpoints:
+                for kind, url_name in (('sync', sync_name), ('async', async_name)):
+                    urls = []
+                    for i in range(n):
+                        args = [product_ids[i % len(product_ids)]] if label == 'detail' else []
+                        urls.append((reverse(url_name, args=args), query.lstrip('?')))
+                    runner.run(urls[:concurrency], concurrency)  # прогрев
+                    timings, errors, elapsed = runner.run(urls, concurrency)
+                    timings.sort()
+                    self.stdout.write(
+                        f"{server:<16} {label:<8} {kind:<6} {len(timings) / elapsed:>9,.0f} "
+                        + ' '.join(f"{percentile(timings, q) * 1000:>9.2f}" for q in (0.50, 0.95, 0.99))
+                        + f" {errors:>7}"
+                    )
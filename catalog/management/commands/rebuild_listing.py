@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import facets, listing
+
+
+class Command(BaseCommand):
+    help = "Полная перестройка проекции витрины (ProductListing) по опубликованным товарам"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=listing.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = listing.rebuild(options['batch_size'])
+        facets.invalidate()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проекция витрины перестроена: {total} товаров за {time.perf_counter() - started:.2f} с"
+            )
+        )
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Полная перестройка поискового индекса товаров"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.perf_counter()
+        backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Индекс '{backend.name}' перестроен за {time.perf_counter() - started:.2f} с"
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import Order
+from catalog.orders import drifted_orders, recalculate_orders
+
+
+class Command(BaseCommand):
+    help = "Сверка Order.items_count/Order.total с позициями заказов и исправление расхождений"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать расхождения")
+        parser.add_argument('--all', action='store_true', help="Пересчитать все заказы, а не только расходящиеся")
+
+    def handle(self, *args, **options):
+        if options['all'] and not options['dry_run']:
+            updated = recalculate_orders()
+            self.stdout.write(self.style.SUCCESS(f"Пересчитано заказов: {updated}"))
+            return
+        with transaction.atomic():
+            drifted = list(drifted_orders().values_list('pk', 'code', 'items_count', 'actual_items', 'total', 'actual_total'))
+            for _, code, items_count, actual_items, total, actual_total in drifted[:20]:
+                self.stdout.write(f"  {code}: позиций {items_count} → {actual_items}, сумма {total} → {actual_total}")
+            if len(drifted) > 20:
+                self.stdout.write(f"  ... и ещё {len(drifted) - 20}")
+            if options['dry_run'] or not drifted:
+                self.stdout.write(f"Расхождений: {len(drifted)}")
+                return
+            recalculate_orders(Order.objects.filter(pk__in=[row[0] for row in drifted]))
+        self.stdout.write(self.style.SUCCESS(f"Исправлено заказов: {len(drifted)}"))
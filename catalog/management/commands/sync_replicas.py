@@ -0,0 +1,38 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в реплики из SQLITE_REPLICA_PATHS (online backup) — "
+        "замена репликации для локальной проверки чтения с реплик. С --interval повторяет "
+        "копирование, и реплики отстают на этот интервал"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="Секунд между копированиями; 0 — один раз")
+
+    def handle(self, *args, **options):
+        replicas = list(settings.DATABASE_REPLICAS)
+        if not replicas:
+            raise CommandError("Реплики не настроены (SQLITE_REPLICA_PATHS)")
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in replicas):
+            raise CommandError("Команда только для SQLite; реплики Postgres обновляет потоковая репликация")
+        while True:
+            started = time.perf_counter()
+            source.ensure_connection()
+            for alias in replicas:
+                # Своё соединение с файлом реплики закрываем: backup перезаписывает его целиком
+                connections[alias].close()
+                with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as target:
+                    source.connection.backup(target)
+            self.stdout.write(f"Реплик обновлено: {len(replicas)} за {time.perf_counter() - started:.2f} с")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
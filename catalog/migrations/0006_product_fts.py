@@ -0,0 +1,42 @@
+from django.db import DatabaseError, migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_product_fts "
+            "USING fts5(name, description, brand, category, tokenize = 'unicode61')"
+        )
+    except DatabaseError:
+        # SQLite собран без FTS5 — поиск будет работать через индекс в памяти
+        return
+    from catalog.search import tokenize
+
+    Product = apps.get_model('catalog', 'Product')
+    rows = [
+        (pk, *(' '.join(tokenize(value)) for value in fields))
+        for pk, *fields in Product.objects.order_by('id').values_list('id', 'name', 'description', 'brand__name', 'category__name')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO catalog_product_fts (rowid, name, description, brand, category) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
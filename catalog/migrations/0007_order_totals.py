@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:59
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('catalog', 'Order')
+    OrderItem = apps.get_model('catalog', 'OrderItem')
+    amount_field = DecimalField(max_digits=12, decimal_places=2)
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        items_count=Coalesce(Subquery(items.annotate(n=Count('pk')).values('n')), 0),
+        total=Coalesce(
+            Subquery(items.annotate(s=Sum(F('price') * F('quantity'), output_field=amount_field)).values('s')),
+            Value(Decimal('0.00')),
+            output_field=amount_field,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_product_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Позиций'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12, verbose_name='Сумма'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='catalog_pro_slug_2b1eb6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['-created', '-id'], name='product_pub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['price', 'id'], name='product_pub_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['name', 'id'], name='product_pub_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['category', 'price'], name='product_pub_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['category', '-created'], name='product_pub_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['brand', '-created'], name='product_pub_brand_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 1)), fields=['updated'], name='product_pub_updated_idx'),
+        ),
+    ]
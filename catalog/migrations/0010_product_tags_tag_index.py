@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalog_indexes'),
+    ]
+
+    # Уникальный индекс (product_id, tag_id) обслуживает product.tags, а фильтр
+    # по тегу (tags__slug) идёт от tag_id к product_id: с индексом в обратном
+    # порядке он читает только индекс. Таблицу создаёт ManyToManyField, поэтому
+    # индекс добавляется SQL.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX catalog_product_tags_tag_product_idx ON catalog_product_tags (tag_id, product_id)',
+            'DROP INDEX catalog_product_tags_tag_product_idx',
+        ),
+    ]
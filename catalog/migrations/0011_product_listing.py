@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:40
+
+import catalog.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_listing(apps, schema_editor):
+    # То же, что catalog.listing.rebuild(), на исторических моделях
+    Product = apps.get_model('catalog', 'Product')
+    ProductListing = apps.get_model('catalog', 'ProductListing')
+    products = (
+        Product.objects.filter(status=1, is_available=True)
+        .select_related('category', 'brand').prefetch_related('tags').order_by('pk')
+    )
+    last = 0
+    while True:
+        batch = list(products.filter(pk__gt=last)[:1000])
+        if not batch:
+            break
+        ProductListing.objects.bulk_create([
+            ProductListing(
+                id=p.pk, name=p.name, slug=p.slug, price=p.price, old_price=p.old_price,
+                discount_percent=(
+                    float((p.old_price - p.price) * 100 / p.old_price)
+                    if p.old_price is not None and p.old_price > p.price else 0.0
+                ),
+                quantity=p.quantity,
+                category_id=p.category_id, category_name=p.category.name, category_slug=p.category.slug,
+                brand_id=p.brand_id, brand_name=p.brand.name, brand_slug=p.brand.slug,
+                tag_slugs=sorted(tag.slug for tag in p.tags.all()),
+                image=p.image.name or None, image_variants=p.image_variants,
+                created=p.created, updated=p.updated,
+            )
+            for p in batch
+        ])
+        last = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_product_tags_tag_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('id', catalog.models.ProductIdField(primary_key=True, serialize=False, verbose_name='Товар')),
+                ('name', models.CharField(max_length=200, verbose_name='Название')),
+                ('slug', models.SlugField(db_index=False, max_length=200, verbose_name='URL')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Старая цена')),
+                ('discount_percent', models.FloatField(default=0.0, verbose_name='Скидка, %')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Количество на складе')),
+                ('category_name', models.CharField(max_length=100, verbose_name='Категория')),
+                ('category_slug', models.SlugField(db_index=False, max_length=100, verbose_name='URL категории')),
+                ('brand_name', models.CharField(max_length=100, verbose_name='Бренд')),
+                ('brand_slug', models.SlugField(db_index=False, max_length=100, verbose_name='URL бренда')),
+                ('tag_slugs', models.JSONField(default=list, verbose_name='Теги')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='', verbose_name='Изображение')),
+                ('image_variants', models.JSONField(blank=True, default=dict, verbose_name='Копии изображения')),
+                ('created', models.DateTimeField(verbose_name='Создан')),
+                ('updated', models.DateTimeField(verbose_name='Обновлен')),
+                ('brand', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.brand', verbose_name='Бренд')),
+                ('category', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Товар на витрине',
+                'verbose_name_plural': 'Товары на витрине',
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['-created', '-id'], name='listing_created_idx'), models.Index(fields=['price', 'id'], name='listing_price_idx'), models.Index(fields=['name', 'id'], name='listing_name_idx'), models.Index(fields=['category_slug', 'price'], name='listing_cat_price_idx'), models.Index(fields=['category_slug', '-created'], name='listing_cat_created_idx'), models.Index(fields=['brand_slug', '-created'], name='listing_brand_created_idx'), models.Index(fields=['updated'], name='listing_updated_idx')],
+            },
+        ),
+        migrations.RunPython(fill_listing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_product_listing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('computed', models.DateTimeField(verbose_name='Рассчитано')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='catalog.product', verbose_name='Товар')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='catalog.product', verbose_name='Рекомендуемый товар')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+                'ordering': ['product', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='recommendation_product_rank_uniq')],
+            },
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.utils.text import slugify
 from django.http import QueryDict
-from .models import Category, Tag
+from . import navigation
 
 class DataMixin:
     title = ''
@@ -11,16 +11,17 @@ class DataMixin:
 
     def get_querystring(self):
         qs = self.request.GET.copy()
-        if 'page' in qs:
-            del qs['page']
+        for key in ('page', 'after'):
+            if key in qs:
+                del qs[key]
         return qs.urlencode()
 
     def get_common_context(self):
         return {
             'title': self.get_title(),
             'querystring': self.get_querystring(),
-            'all_categories': Category.objects.all(),
-            'all_tags': Tag.objects.all(),
+            'all_categories': navigation.get_categories(),
+            'all_tags': navigation.get_tags(),
         }
 
     def get_user_context(self, **kwargs):
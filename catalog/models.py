@@ -1,5 +1,6 @@
-from django.db import models
-from django.db.models import Q
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import DEFERRED
 from django.urls import reverse
 import os
 import uuid
@@ -70,12 +71,12 @@ class AdvancedProductManager(models.Manager):
         return self.filter(price__gte=min_price, price__lte=max_price)
     
     def search_products(self, query):
-        return self.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__name__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        from .search import search_queryset
+        return search_queryset(self.get_queryset(), query)
+
+
+# Условие ProductManager.published() для частичных индексов; status — Product.Status.PUBLISHED
+PUBLISHED = models.Q(status=1, is_available=True)
 
 
 class Product(models.Model):
@@ -102,6 +103,8 @@ class Product(models.Model):
         ext = os.path.splitext(filename)[1].lower()
         return f'products/{uuid.uuid4().hex}{ext}'
     image = models.ImageField(upload_to=product_image_upload_to, blank=True, null=True, verbose_name="Изображение")
+    # Уменьшенные копии и WebP, см. catalog.thumbnails
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Копии изображения")
 
     class ProductType(models.TextChoices):
         PHYSICAL = 'physical', 'Физический товар'
@@ -119,9 +122,20 @@ class Product(models.Model):
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ['-created']
+        # Витрина читает только опубликованные и доступные товары (published()),
+        # поэтому индексы под её сортировки частичные: в них нет черновиков и
+        # снятых с продажи, а условие фильтра не нужно проверять по таблице.
+        # Запросы и их планы — команда explain_catalog.
         indexes = [
             models.Index(fields=['-created']),
-            models.Index(fields=['slug']),
+            models.Index(fields=['-created', '-id'], condition=PUBLISHED, name='product_pub_created_idx'),
+            models.Index(fields=['price', 'id'], condition=PUBLISHED, name='product_pub_price_idx'),
+            models.Index(fields=['name', 'id'], condition=PUBLISHED, name='product_pub_name_idx'),
+            models.Index(fields=['category', 'price'], condition=PUBLISHED, name='product_pub_cat_price_idx'),
+            models.Index(fields=['category', '-created'], condition=PUBLISHED, name='product_pub_cat_created_idx'),
+            models.Index(fields=['brand', '-created'], condition=PUBLISHED, name='product_pub_brand_created_idx'),
+            # MAX(updated) и COUNT для ETag списков
+            models.Index(fields=['updated'], condition=PUBLISHED, name='product_pub_updated_idx'),
         ]
 
     def __str__(self):
@@ -149,6 +163,87 @@ class ProductDetail(models.Model):
         return f"Характеристики: {self.product.name}"
 
 
+class ProductRecommendation(models.Model):
+    """Похожий товар для страницы товара, см. catalog.recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations', verbose_name="Товар")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for',
+                                    verbose_name="Рекомендуемый товар")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Оценка")
+    computed = models.DateTimeField(verbose_name="Рассчитано")
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        ordering = ['product', 'rank']
+        constraints = [
+            # Индекс (product, rank) — единственный поиск на странице товара
+            models.UniqueConstraint(fields=['product', 'rank'], name='recommendation_product_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.recommended_id} ({self.rank})"
+
+
+class ProductIdField(models.BigIntegerField):
+    """id товара как первичный ключ копии: на SQLite это INTEGER PRIMARY KEY,
+    то есть сам rowid, без отдельного уникального индекса."""
+
+    def db_type(self, connection):
+        if connection.vendor == 'sqlite':
+            return 'integer'
+        return super().db_type(connection)
+
+
+class ProductListing(models.Model):
+    """Строка витрины: опубликованный товар без JOIN и вычислений (см. catalog.listing)."""
+    id = ProductIdField(primary_key=True, verbose_name="Товар")
+    name = models.CharField(max_length=200, verbose_name="Название")
+    slug = models.SlugField(max_length=200, db_index=False, verbose_name="URL")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Старая цена")
+    discount_percent = models.FloatField(default=0.0, verbose_name="Скидка, %")
+    quantity = models.IntegerField(default=0, verbose_name="Количество на складе")
+    # Только id для фасетов, без внешнего ключа в БД и без индекса
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                 related_name='+', verbose_name="Категория")
+    category_name = models.CharField(max_length=100, verbose_name="Категория")
+    category_slug = models.SlugField(max_length=100, db_index=False, verbose_name="URL категории")
+    brand = models.ForeignKey(Brand, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                              related_name='+', verbose_name="Бренд")
+    brand_name = models.CharField(max_length=100, verbose_name="Бренд")
+    brand_slug = models.SlugField(max_length=100, db_index=False, verbose_name="URL бренда")
+    tag_slugs = models.JSONField(default=list, verbose_name="Теги")
+    image = models.ImageField(blank=True, null=True, verbose_name="Изображение")
+    image_variants = models.JSONField(default=dict, blank=True, verbose_name="Копии изображения")
+    created = models.DateTimeField(verbose_name="Создан")
+    updated = models.DateTimeField(verbose_name="Обновлен")
+
+    class Meta:
+        verbose_name = "Товар на витрине"
+        verbose_name_plural = "Товары на витрине"
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='listing_created_idx'),
+            models.Index(fields=['price', 'id'], name='listing_price_idx'),
+            models.Index(fields=['name', 'id'], name='listing_name_idx'),
+            models.Index(fields=['category_slug', 'price'], name='listing_cat_price_idx'),
+            models.Index(fields=['category_slug', '-created'], name='listing_cat_created_idx'),
+            models.Index(fields=['brand_slug', '-created'], name='listing_brand_created_idx'),
+            models.Index(fields=['updated'], name='listing_updated_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('product_detail', kwargs={'product_slug': self.slug})
+
+    @property
+    def has_discount(self):
+        return self.old_price and self.old_price > self.price
+
+
 class Order(models.Model):
     class Status(models.TextChoices):
         NEW = 'new', 'Новый'
@@ -160,6 +255,9 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.NEW, verbose_name="Статус")
     created = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
     products = models.ManyToManyField(Product, through='OrderItem', related_name='orders', verbose_name="Товары")
+    # Денормализованные итоги, поддерживаются сигналами OrderItem (см. catalog.orders)
+    items_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Позиций")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'), editable=False, verbose_name="Сумма")
 
     class Meta:
         verbose_name = "Заказ"
@@ -183,3 +281,21 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.order.code}: {self.product.name} x{self.quantity}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны сигналам, чтобы применить к заказу разницу
+        loaded = dict(zip(field_names, values))
+        if all(loaded.get(name, DEFERRED) is not DEFERRED for name in ('order_id', 'quantity', 'price')):
+            instance._loaded_totals = (loaded['order_id'], loaded['quantity'] * loaded['price'])
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Позиция и итоги заказа (сигнал post_save) меняются в одной транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    @property
+    def amount(self):
+        return self.price * self.quantity
+
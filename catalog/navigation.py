@@ -0,0 +1,57 @@
+"""Списки категорий и тегов для навигации.
+
+Меню в ``base.html`` (``{% get_categories %}``) и ``DataMixin`` показывают
+их на каждой странице, а меняются они несколько раз в день. Списки
+хранятся в памяти процесса вместе с версией, под которой собраны; версия
+лежит в общем кэше рядом с версиями фрагментов (``catalog.fragments``),
+сигналы (``catalog.signals``) увеличивают её при записи категорий и тегов,
+и каждый процесс пересобирает списки при следующем обращении. На запрос —
+одно чтение версии из кэша вместо запросов к БД.
+"""
+import threading
+
+from techmarket.routers import primary
+
+from . import fragments
+from .models import Category, Tag
+
+KIND = 'navigation'
+
+_lock = threading.Lock()
+_cached = None
+
+
+class Navigation:
+    def __init__(self, version):
+        self.version = version
+        # Списки живут до следующей инвалидации — читаем основную базу
+        with primary():
+            self.categories = list(Category.objects.all())
+            self.tags = list(Tag.objects.all())
+
+
+def get_navigation():
+    global _cached
+    version = fragments.get_version(KIND)
+    cached = _cached
+    if cached is not None and cached.version == version:
+        return cached
+    with _lock:
+        if _cached is not None and _cached.version == version:
+            return _cached
+        # Версия прочитана до сборки: запись во время сборки сменит её,
+        # и следующий запрос соберёт списки заново
+        _cached = Navigation(version)
+        return _cached
+
+
+def get_categories():
+    return get_navigation().categories
+
+
+def get_tags():
+    return get_navigation().tags
+
+
+def invalidate():
+    fragments.bump(KIND)
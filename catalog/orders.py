@@ -0,0 +1,71 @@
+"""Денормализованные итоги заказов: ``Order.items_count`` и ``Order.total``.
+
+Сигналы ``OrderItem`` (см. ``catalog.signals``) применяют к заказу только
+разницу одним ``UPDATE ... SET total = total + %s``, без чтения всех позиций.
+``bulk_create``/``QuerySet.update()`` сигналов не шлют — после них нужен
+``recalculate_orders``; расхождения находит команда ``reconcile_order_totals``.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+
+from .models import Order, OrderItem
+
+ZERO = Decimal('0.00')
+_AMOUNT = DecimalField(max_digits=12, decimal_places=2)
+
+
+def apply_delta(order_id, items, amount):
+    if items or amount:
+        Order.objects.filter(pk=order_id).update(
+            items_count=F('items_count') + items,
+            total=F('total') + amount,
+        )
+
+
+def item_saved(item, created):
+    previous = getattr(item, '_loaded_totals', None)
+    if created:
+        apply_delta(item.order_id, 1, item.amount)
+    elif previous is None:
+        # Позиция загружена без нужных полей: пересчитываем заказ целиком
+        recalculate_orders(Order.objects.filter(pk=item.order_id))
+    elif previous[0] != item.order_id:
+        apply_delta(previous[0], -1, -previous[1])
+        apply_delta(item.order_id, 1, item.amount)
+    else:
+        apply_delta(item.order_id, 0, item.amount - previous[1])
+    item._loaded_totals = (item.order_id, item.amount)
+
+
+def item_deleted(item):
+    previous = getattr(item, '_loaded_totals', None)
+    order_id, amount = previous if previous is not None else (item.order_id, item.amount)
+    apply_delta(order_id, -1, -amount)
+
+
+def _computed():
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    count = items.annotate(n=Count('pk')).values('n')
+    amount = items.annotate(s=Sum(F('price') * F('quantity'), output_field=_AMOUNT)).values('s')
+    return (
+        Coalesce(Subquery(count), 0),
+        Coalesce(Subquery(amount, output_field=_AMOUNT), Value(ZERO), output_field=_AMOUNT),
+    )
+
+
+def recalculate_orders(queryset=None):
+    """Пересчитывает итоги заказов одним UPDATE с подзапросами."""
+    queryset = queryset if queryset is not None else Order.objects.all()
+    items_count, total = _computed()
+    return queryset.order_by().update(items_count=items_count, total=total)
+
+
+def drifted_orders(queryset=None):
+    """Заказы, у которых сохранённые итоги расходятся с позициями."""
+    queryset = queryset if queryset is not None else Order.objects.all()
+    items_count, total = _computed()
+    queryset = queryset.annotate(actual_items=items_count, actual_total=total)
+    queryset = queryset.annotate(total_delta=Abs(F('total') - F('actual_total'), output_field=_AMOUNT))
+    return queryset.exclude(items_count=F('actual_items'), total_delta__lt=Decimal('0.005'))
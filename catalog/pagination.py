@@ -0,0 +1,138 @@
+"""Keyset (cursor) пагинация для каталога.
+
+Вместо OFFSET следующая страница выбирается по паре (ключ сортировки, id)
+последней строки предыдущей страницы, поэтому глубокие страницы стоят столько
+же, сколько первая. Курсор — непрозрачный base64-токен, привязанный к сортировке.
+"""
+import base64
+import datetime
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+SORT_FIELDS = {
+    'price': ('price', False),
+    '-price': ('price', True),
+    'name': ('name', False),
+    '-name': ('name', True),
+    '-created': ('created', True),
+}
+DEFAULT_SORT = '-created'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _load_value(field, raw):
+    if field == 'created':
+        return datetime.datetime.fromisoformat(raw)
+    if field == 'price':
+        return Decimal(raw)
+    return raw
+
+
+def encode_cursor(sort, value, pk):
+    raw = json.dumps([sort, _dump_value(value), pk], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, raw_value, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        field, _ = SORT_FIELDS[cursor_sort]
+        value = _load_value(field, raw_value)
+        pk = int(pk)
+    except (ValueError, TypeError, KeyError, InvalidOperation):
+        raise InvalidCursor(token)
+    if cursor_sort != sort:
+        raise InvalidCursor(token)
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, count, per_page):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.count = count
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+
+def keyset_paginate(queryset, sort, after, per_page, count=None):
+    """Возвращает страницу после курсора ``after`` (или первую, если он пуст).
+
+    ``count`` можно передать заранее посчитанным; иначе берётся
+    ``cached_count`` — кэшированное и потому приблизительное значение.
+    """
+    if count is None:
+        count = cached_count(queryset)
+    sort, field, queryset = _keyset_queryset(queryset, sort, after)
+    return _keyset_page(list(queryset[:per_page + 1]), sort, field, per_page, count)
+
+
+async def akeyset_paginate(queryset, sort, after, per_page, count):
+    """Асинхронный вариант ``keyset_paginate``; ``count`` обязателен."""
+    sort, field, queryset = _keyset_queryset(queryset, sort, after)
+    rows = [row async for row in queryset[:per_page + 1]]
+    return _keyset_page(rows, sort, field, per_page, count)
+
+
+def _keyset_queryset(queryset, sort, after):
+    if sort not in SORT_FIELDS:
+        sort = DEFAULT_SORT
+    field, descending = SORT_FIELDS[sort]
+    if descending:
+        queryset = queryset.order_by(f'-{field}', '-id')
+    else:
+        queryset = queryset.order_by(field, 'id')
+    if after:
+        value, pk = decode_cursor(after, sort)
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+        )
+    return sort, field, queryset
+
+
+def _keyset_page(rows, sort, field, per_page, count):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(sort, last[field], last['id'])
+        else:
+            next_cursor = encode_cursor(sort, getattr(last, field), last.pk)
+    return KeysetPage(rows, next_cursor, count, per_page)
+
+
+def cached_count(queryset):
+    """COUNT(*) с кэшированием на CATALOG_COUNT_CACHE_TIMEOUT секунд.
+
+    Ключ строится по SQL запроса, так что разные фильтры не смешиваются.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'catalog:count:' + hashlib.md5(f'{sql}|{params}'.encode('utf-8')).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, getattr(settings, 'CATALOG_COUNT_CACHE_TIMEOUT', 60))
+    return count
@@ -0,0 +1,139 @@
+"""Замеры каждого HTTP-запроса: время, SQL, шаблоны и размер ответа.
+
+``PerfMiddleware`` стоит первой в ``MIDDLEWARE`` и для каждого запроса
+измеряет:
+
+* полное время обработки (все middleware и представление);
+* время и число SQL-запросов — тем же ``QueryLog``, что и бюджеты запросов;
+* время рендеринга ``TemplateResponse`` (от ``process_template_response``
+  до post-render callback); шаблоны, отрисованные ``render()`` внутри
+  представления, попадают во время представления;
+* размер тела ответа (у потоковых ответов не известен).
+
+Итоги уходят в заголовок ``Server-Timing`` (видны в DevTools браузера), а
+доля запросов ``CATALOG_PERF_SAMPLE_RATE`` записывается в кольцевой буфер
+процесса — последние ``CATALOG_PERF_BUFFER_SIZE`` записей на маршрут — и в
+лог ``catalog.perf`` (уровень DEBUG). Перцентили по буферу отдаёт
+``/catalog/_perf/`` (только для персонала).
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .querybudget import capture_queries, route_name
+
+logger = logging.getLogger('catalog.perf')
+
+METRICS = ('total_ms', 'db_ms', 'queries', 'template_ms', 'bytes')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, q, default=None):
+    """Перцентиль ``q`` (доля, 0.95) по ближайшему рангу; ``values`` отсортированы."""
+    if not values:
+        return default
+    # Поправка на погрешность float: 100 * 0.95 — это 95.00000000000001
+    rank = max(1, math.ceil(len(values) * q - 1e-9))
+    return values[rank - 1]
+
+
+class PerfRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, sample):
+        with self._lock:
+            buffer = self.routes.get(route)
+            if buffer is None:
+                buffer = self.routes[route] = deque(maxlen=getattr(settings, 'CATALOG_PERF_BUFFER_SIZE', 1000))
+            buffer.append(sample)
+
+    def snapshot(self):
+        with self._lock:
+            routes = {route: list(buffer) for route, buffer in self.routes.items()}
+        result = {}
+        for route, samples in sorted(routes.items()):
+            summary = {'count': len(samples)}
+            for metric in METRICS:
+                values = sorted(sample[metric] for sample in samples if sample[metric] is not None)
+                summary[metric] = {f'p{p}': percentile(values, p / 100) for p in PERCENTILES}
+            result[route] = summary
+        return result
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+
+recorder = PerfRecorder()
+
+
+class _Timings:
+    __slots__ = ('template_started', 'template')
+
+    def __init__(self):
+        self.template_started = None
+        self.template = 0.0
+
+
+class PerfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.perf_timings = _Timings()
+        started = time.perf_counter()
+        with capture_queries() as log:
+            response = self.get_response(request)
+        return self.finish(request, response, log, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        request.perf_timings = _Timings()
+        started = time.perf_counter()
+        with capture_queries() as log:
+            response = await self.get_response(request)
+        return self.finish(request, response, log, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        timings = request.perf_timings
+        timings.template_started = time.perf_counter()
+
+        def rendered(response):
+            timings.template += time.perf_counter() - timings.template_started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, log, total):
+        template = request.perf_timings.template
+        response['Server-Timing'] = (
+            f'total;dur={total * 1000:.1f}, '
+            f'db;dur={log.time * 1000:.1f};desc="{log.count} queries", '
+            f'tpl;dur={template * 1000:.1f}'
+        )
+        if random.random() < getattr(settings, 'CATALOG_PERF_SAMPLE_RATE', 1.0):
+            route = route_name(request) or '-'
+            sample = {
+                'total_ms': round(total * 1000, 3),
+                'db_ms': round(log.time * 1000, 3),
+                'queries': log.count,
+                'template_ms': round(template * 1000, 3),
+                'bytes': None if response.streaming else len(response.content),
+            }
+            recorder.record(route, sample)
+            logger.debug('%s %s %s', route, response.status_code, sample)
+        return response
@@ -0,0 +1,157 @@
+"""Массовое изменение цен одним SQL-запросом на таблицу.
+
+Каждая операция — это выражения для ``price`` и ``old_price`` плюс условие,
+каким товарам она применима. ``apply`` выполняет один
+``UPDATE ... SET price = ..., old_price = ...`` по всему набору товаров
+(и такой же по проекции витрины),
+``preview`` — один ``SELECT`` с подсчётом, без изменений. Арифметика идёт в
+``Decimal`` (значения передаются в запрос как ``Decimal``, результат
+округляется до копеек в SQL).
+
+Базой скидки служит ``old_price``, если товар уже со скидкой, иначе
+``price`` — повторная скидка 10% не превращается в 19%.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from . import listing
+from .models import Product, ProductListing
+
+PRICE = DecimalField(max_digits=10, decimal_places=2)
+CENT = Decimal('0.01')
+
+BASE_PRICE = Case(
+    When(old_price__gt=F('price'), then=F('old_price')),
+    default=F('price'),
+    output_field=PRICE,
+)
+
+
+class PriceChange:
+    def __init__(self, label, price, old_price, condition=None):
+        self.label = label
+        self.price = price
+        self.old_price = old_price
+        self.condition = condition if condition is not None else Q()
+
+
+def _decimal(value):
+    try:
+        value = Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f'Некорректное число: {value!r}')
+    if not value.is_finite():
+        raise ValueError(f'Некорректное число: {value!r}')
+    return value
+
+
+def percent_discount(percent):
+    percent = _decimal(percent)
+    if not 0 < percent < 100:
+        raise ValueError('Скидка должна быть больше 0% и меньше 100%')
+    factor = (Decimal(100) - percent) / Decimal(100)
+    return PriceChange(
+        f'Скидка {percent.normalize():f}%',
+        Round(BASE_PRICE * Value(factor, output_field=PRICE), 2, output_field=PRICE),
+        BASE_PRICE,
+    )
+
+
+def fixed_discount(amount):
+    amount = _decimal(amount)
+    if amount <= 0:
+        raise ValueError('Сумма скидки должна быть положительной')
+    return PriceChange(
+        f'Скидка {amount:.2f} руб.',
+        Round(BASE_PRICE - Value(amount, output_field=PRICE), 2, output_field=PRICE),
+        BASE_PRICE,
+        # Товары дешевле скидки не трогаем
+        Q(price__gt=amount) | Q(old_price__gt=amount),
+    )
+
+
+def revert_discount(value=None):
+    return PriceChange(
+        'Отмена скидки',
+        F('old_price'),
+        Value(None, output_field=PRICE),
+        # Скидка — только old_price выше цены, как в админке; иначе отмена снизила бы цену
+        Q(old_price__gt=F('price')),
+    )
+
+
+def round_prices(step):
+    step = _decimal(step)
+    if step <= 0:
+        raise ValueError('Шаг округления должен быть положительным')
+    # Умножение на обратную величину, а не деление: SQLite делит целые нацело
+    inverse = Value(Decimal(1) / step, output_field=DecimalField())
+    return PriceChange(
+        f'Округление до {step.normalize():f}',
+        Round(F('price') * inverse, output_field=PRICE) * Value(step, output_field=PRICE),
+        F('old_price'),
+        Q(price__gt=0),
+    )
+
+
+OPERATIONS = {
+    'percent_discount': percent_discount,
+    'fixed_discount': fixed_discount,
+    'revert_discount': revert_discount,
+    'round': round_prices,
+}
+
+
+def build_change(operation, value=None):
+    try:
+        builder = OPERATIONS[operation]
+    except KeyError:
+        raise ValueError(f'Неизвестная операция: {operation!r}')
+    return builder(value)
+
+
+def _targets(queryset, change):
+    # Подзапрос по pk: update() нельзя вызывать после distinct()/срезов,
+    # которые бывают у querysets списка в админке
+    return Product.objects.filter(pk__in=queryset.values('pk')).filter(change.condition)
+
+
+def preview(queryset, change):
+    """Сколько товаров выбрано, ко скольким применима операция и у скольких
+    изменится цена; один SELECT, данные не меняются."""
+    targets = Product.objects.filter(pk__in=queryset.values('pk')).annotate(new_price=change.price)
+    result = targets.aggregate(
+        matched=Count('pk'),
+        affected=Count('pk', filter=change.condition),
+        changed=Count('pk', filter=change.condition & ~Q(price=F('new_price'))),
+        current_total=Sum('price', filter=change.condition),
+        new_total=Sum('new_price', filter=change.condition, output_field=PRICE),
+    )
+    for key in ('current_total', 'new_total'):
+        result[key] = (result[key] or Decimal(0)).quantize(CENT)
+    return result
+
+
+def apply(queryset, change):
+    """Один UPDATE; ``updated`` ставится вручную — ``update()`` не вызывает auto_now.
+
+    Проекция витрины (``catalog.listing``) обновляется вторым UPDATE с теми же
+    выражениями: её копия цен совпадает с ценами товаров до изменения.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ProductListing.objects.filter(pk__in=queryset.values('pk')).filter(change.condition).update(
+            price=change.price,
+            old_price=change.old_price,
+            discount_percent=listing.discount_expression(change.price, change.old_price),
+            updated=now,
+        )
+        return _targets(queryset, change).update(
+            price=change.price,
+            old_price=change.old_price,
+            updated=now,
+        )
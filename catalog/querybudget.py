@@ -0,0 +1,154 @@
+"""Учёт SQL-запросов по представлениям и бюджеты запросов.
+
+* ``QueryCountMiddleware`` считает запросы каждого HTTP-запроса, группирует
+  их по «форме» SQL (текст с плейсхолдерами, без параметров) и пишет в лог
+  предупреждение, если превышен бюджет URL или одна форма повторяется —
+  типичный признак N+1.
+* ``QueryBudgetTestMixin`` даёт тестам ``assertQueryBudget`` с теми же
+  бюджетами.
+
+Бюджеты задаются по имени URL в ``QUERY_BUDGETS`` и могут быть
+переопределены настройкой ``CATALOG_QUERY_BUDGETS``.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('catalog.querybudget')
+
+# Запросы в установившемся режиме: фасетный индекс и подсказки уже построены,
+# похожие товары посчитаны (build_recommendations), меню навигации в памяти процесса.
+# category_detail включает MAX(updated)/COUNT для ETag — это весь ответ 304.
+QUERY_BUDGETS = {
+    'product_list': 3,
+    'product_detail': 3,
+    'category_detail': 3,
+    'category_list': 0,
+    'product_list_api': 2,
+    'product_detail_api': 1,
+    'suggest_api': 0,
+    'product_list_api_async': 2,
+    'product_detail_api_async': 1,
+    'suggest_api_async': 0,
+    'product_pricing_api': 3,
+    'admin:catalog_order_changelist': 4,
+    'admin:catalog_order_change': 5,
+    'admin:catalog_product_changelist': 7,
+}
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_WS_RE = re.compile(r'\s+')
+
+
+def get_budget(url_name):
+    budgets = {**QUERY_BUDGETS, **getattr(settings, 'CATALOG_QUERY_BUDGETS', {})}
+    return budgets.get(url_name)
+
+
+def sql_shape(sql):
+    """Текст запроса без параметров; списки IN (...) любой длины сводятся к одному."""
+    return _WS_RE.sub(' ', _IN_LIST_RE.sub('IN (...)', sql)).strip()
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.queries.append(sql)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def duplicates(self):
+        shapes = Counter(sql_shape(sql) for sql in self.queries)
+        return {shape: n for shape, n in shapes.items() if n > 1}
+
+
+@contextmanager
+def capture_queries():
+    log = QueryLog()
+    # Все алиасы: чтение каталога может идти с реплик
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(log))
+        yield log
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return None
+    if match.namespace:
+        return f'{match.namespace}:{match.url_name}'
+    return match.url_name
+
+
+class QueryCountMiddleware:
+    """Работает только при DEBUG; в тестах бюджеты проверяет ``QueryBudgetTestMixin``.
+
+    Поддерживает и ASGI: иначе Django переводил бы асинхронные представления
+    в отдельный поток ради этой middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with capture_queries() as log:
+            response = self.get_response(request)
+        return self.report(request, response, log)
+
+    async def __acall__(self, request):
+        with capture_queries() as log:
+            response = await self.get_response(request)
+        return self.report(request, response, log)
+
+    def report(self, request, response, log):
+        name = route_name(request)
+        budget = get_budget(name)
+        if budget is not None and log.count > budget:
+            logger.warning('%s: %d SQL-запросов при бюджете %d', name, log.count, budget)
+        for shape, n in log.duplicates().items():
+            logger.warning('%s: запрос повторяется %d раз: %s', name, n, shape)
+        response['X-Query-Count'] = str(log.count)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Примесь к ``TestCase``: проверка бюджета запросов для URL."""
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, allow_duplicates=False):
+        budget = get_budget(url_name)
+        with capture_queries() as log:
+            yield log
+        problems = []
+        if budget is not None and log.count > budget:
+            problems.append(f'{log.count} запросов при бюджете {budget}')
+        if not allow_duplicates:
+            problems.extend(f'повтор x{n}: {shape}' for shape, n in log.duplicates().items())
+        if problems:
+            self.fail(f'{url_name}: ' + '; '.join(problems) + '\n' + '\n'.join(log.queries))
@@ -0,0 +1,262 @@
+"""Похожие товары, посчитанные заранее.
+
+Оценка пары товаров — взвешенная сумма (веса в ``WEIGHTS``):
+
+* доля общих тегов (коэффициент Жаккара);
+* тот же бренд;
+* близость цен: ``1 - |a - b| / max(a, b)``;
+* совместные покупки: ``c / (c + 1)``, где ``c`` — число заказов с обоими товарами.
+
+Кандидаты — опубликованные товары той же категории и купленные вместе с
+товаром. Лучшие ``TOP_N`` соседей каждого товара хранятся в
+``ProductRecommendation``, и страница товара читает их одним запросом по
+индексу (product, rank).
+
+С NumPy оценки товаров категории считаются матрицами по блокам строк, без
+него — тем же расчётом на чистом Python (медленнее, результат тот же).
+Пересчёт — команда ``build_recommendations``; с ``--changed`` считаются
+только изменившиеся товары (``updated`` новее расчёта), новые и те, кто их
+рекомендует. Изменения тегов и новые заказы учитывает полный пересчёт.
+Каждый расчёт меняет версию ``KIND`` в кэше версий (``catalog.fragments``),
+она входит в ETag и Last-Modified страницы товара.
+"""
+import heapq
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from . import fragments
+from .models import PUBLISHED, OrderItem, Product, ProductRecommendation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TOP_N = 8
+WEIGHTS = {'tags': 0.4, 'brand': 0.2, 'price': 0.2, 'orders': 0.2}
+# Ячеек матрицы оценок в одном блоке (строки × товары категории)
+BLOCK_CELLS = 2_000_000
+BATCH_SIZE = 5000
+KIND = 'recommendations'
+TABLE = ProductRecommendation._meta.db_table
+COLUMNS = ('product_id', 'recommended_id', 'rank', 'score', 'computed')
+
+
+class CatalogData:
+    """Признаки всех опубликованных товаров, по позициям в ``ids``."""
+
+    def __init__(self):
+        rows = list(
+            Product.objects.published().order_by('id').values_list('id', 'category_id', 'brand_id', 'price')
+        )
+        self.ids = [pk for pk, _, _, _ in rows]
+        self.position = {pk: i for i, pk in enumerate(self.ids)}
+        self.categories = [category_id for _, category_id, _, _ in rows]
+        self.brands = [brand_id for _, _, brand_id, _ in rows]
+        self.prices = [float(price) for _, _, _, price in rows]
+
+        tag_ids = {}
+        self.tags = [0] * len(rows)
+        through = Product.tags.through.objects.order_by().values_list('product_id', 'tag_id')
+        for product_id, tag_id in through.iterator(chunk_size=10000):
+            i = self.position.get(product_id)
+            if i is not None:
+                self.tags[i] |= 1 << tag_ids.setdefault(tag_id, len(tag_ids))
+        self.tag_count = len(tag_ids)
+        self.tag_sizes = [mask.bit_count() for mask in self.tags]
+
+        # co[i][j] — в скольких заказах были оба товара
+        self.co = [None] * len(rows)
+        items = OrderItem.objects.order_by('order_id').values_list('order_id', 'product_id')
+        order, positions = None, set()
+        for order_id, product_id in items.iterator(chunk_size=10000):
+            if order_id != order:
+                self._add_order(positions)
+                order, positions = order_id, set()
+            i = self.position.get(product_id)
+            if i is not None:
+                positions.add(i)
+        self._add_order(positions)
+
+        self.groups = {}
+        for i, category_id in enumerate(self.categories):
+            self.groups.setdefault(category_id, []).append(i)
+
+    def _add_order(self, positions):
+        for i in positions:
+            for j in positions:
+                if i != j:
+                    if self.co[i] is None:
+                        self.co[i] = {}
+                    self.co[i][j] = self.co[i].get(j, 0) + 1
+
+    def score(self, a, b):
+        common = (self.tags[a] & self.tags[b]).bit_count()
+        union = self.tag_sizes[a] + self.tag_sizes[b] - common
+        tags = common / union if union else 0.0
+        brand = 1.0 if self.brands[a] == self.brands[b] else 0.0
+        top = max(self.prices[a], self.prices[b])
+        price = 1.0 - abs(self.prices[a] - self.prices[b]) / top if top > 0 else 1.0
+        together = self.co[a].get(b, 0) if self.co[a] else 0
+        return (
+            WEIGHTS['tags'] * tags + WEIGHTS['brand'] * brand
+            + WEIGHTS['price'] * price + WEIGHTS['orders'] * (together / (together + 1))
+        )
+
+    def outside(self, a):
+        """Купленные вместе товары других категорий."""
+        if not self.co[a]:
+            return []
+        return [b for b in self.co[a] if self.categories[b] != self.categories[a]]
+
+
+def _best(data, scored, top_n):
+    # При равной оценке выше товар с меньшим id — одинаково в обоих вариантах расчёта
+    return heapq.nsmallest(top_n, scored, key=lambda item: (-item[1], data.ids[item[0]]))
+
+
+def _python_rows(data, rows, top_n):
+    for a in rows:
+        group = data.groups[data.categories[a]]
+        scored = [(b, data.score(a, b)) for b in group if b != a]
+        scored.extend((b, data.score(a, b)) for b in data.outside(a))
+        yield a, _best(data, scored, top_n)
+
+
+def _numpy_rows(data, rows, top_n):
+    by_group = {}
+    for a in rows:
+        by_group.setdefault(data.categories[a], []).append(a)
+    for category_id, group_rows in by_group.items():
+        group = numpy.array(data.groups[category_id])
+        tags = numpy.zeros((len(group), max(data.tag_count, 1)))
+        for k, i in enumerate(group.tolist()):
+            mask = data.tags[i]
+            while mask:
+                bit = mask & -mask
+                tags[k, bit.bit_length() - 1] = 1.0
+                mask ^= bit
+        column = {i: k for k, i in enumerate(group.tolist())}
+        sizes = tags.sum(axis=1)
+        brands = numpy.array([data.brands[i] for i in group.tolist()])
+        prices = numpy.array([data.prices[i] for i in group.tolist()])
+        step = max(1, BLOCK_CELLS // len(group))
+        for start in range(0, len(group_rows), step):
+            block = group_rows[start:start + step]
+            local = numpy.array([column[a] for a in block])
+            # Слагаемые в том же порядке, что в CatalogData.score, и на месте —
+            # без лишних временных матриц размером с блок
+            common = tags[local] @ tags.T
+            union = sizes[local][:, None] + sizes[None, :] - common
+            scores = numpy.divide(common, union, out=numpy.zeros_like(common), where=union > 0)
+            scores *= WEIGHTS['tags']
+            scores += WEIGHTS['brand'] * (brands[local][:, None] == brands[None, :])
+            top = numpy.maximum(prices[local][:, None], prices[None, :])
+            price = numpy.abs(prices[local][:, None] - prices[None, :])
+            numpy.divide(price, top, out=price, where=top > 0)
+            numpy.subtract(1.0, price, out=price)
+            price *= WEIGHTS['price']
+            scores += price
+            # Совместных покупок мало: прибавляем только ненулевые
+            for r, a in enumerate(block):
+                for b, count in (data.co[a] or {}).items():
+                    if b in column:
+                        scores[r, column[b]] += WEIGHTS['orders'] * (count / (count + 1))
+            scores[numpy.arange(len(block)), local] = -numpy.inf
+            k = min(top_n, len(group) - 1)
+            picked = [[] for _ in block]
+            if k > 0:
+                # Все товары с оценкой не ниже k-й в строке: равные на границе решает id
+                threshold = numpy.partition(scores, len(group) - k, axis=1)[:, len(group) - k]
+                for r, c in zip(*numpy.nonzero(scores >= threshold[:, None])):
+                    picked[r].append((group[c], scores[r, c]))
+            for r, a in enumerate(block):
+                scored = [(int(b), float(score)) for b, score in picked[r]]
+                scored.extend((b, data.score(a, b)) for b in data.outside(a))
+                yield a, _best(data, scored, top_n)
+
+
+def compute(data, rows, top_n=TOP_N, use_numpy=None):
+    """``(позиция, [(позиция соседа, оценка)])`` для позиций ``rows``."""
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy and numpy is None:
+        raise RuntimeError('NumPy не установлен')
+    return (_numpy_rows if use_numpy else _python_rows)(data, rows, top_n)
+
+
+def stale_ids():
+    """Товары без рекомендаций или изменённые после расчёта, снятые с публикации
+    и те, в чьих списках есть такие товары."""
+    computed = ProductRecommendation.objects.filter(product=OuterRef('pk'), rank=1).values('computed')
+    changed = (
+        Product.objects.published().annotate(computed_at=Subquery(computed))
+        .filter(Q(computed_at__isnull=True) | Q(updated__gt=F('computed_at')))
+        .values('pk')
+    )
+    hidden = Product.objects.exclude(PUBLISHED).values('pk')
+    rows = ProductRecommendation.objects.order_by().values_list('product_id', flat=True).distinct()
+    stale = set(changed.values_list('pk', flat=True))
+    stale.update(rows.filter(Q(product__in=hidden) | Q(recommended__in=changed) | Q(recommended__in=hidden)))
+    return stale
+
+
+def build(ids=None, top_n=TOP_N, use_numpy=None):
+    """Пересчитывает рекомендации товаров ``ids`` (всех опубликованных, если None).
+
+    Возвращает число пересчитанных товаров.
+    """
+    if ids is not None and not ids:
+        return 0
+    computed = connection.ops.adapt_datetimefield_value(timezone.now())
+    data = CatalogData()
+    if ids is None:
+        rows = range(len(data.ids))
+    else:
+        ids = set(ids)
+        rows = [data.position[pk] for pk in ids if pk in data.position]
+    with transaction.atomic():
+        if ids is None:
+            ProductRecommendation.objects.all().delete()
+        else:
+            ProductRecommendation.objects.filter(product_id__in=ids).delete()
+        batch = []
+        for a, best in compute(data, rows, top_n, use_numpy):
+            batch.extend((data.ids[a], data.ids[b], rank, score, computed) for rank, (b, score) in enumerate(best, 1))
+            if len(batch) >= BATCH_SIZE:
+                _insert(batch)
+                batch = []
+        _insert(batch)
+    fragments.bump(KIND)
+    return len(rows)
+
+
+def get_version():
+    return fragments.get_version(KIND)
+
+
+def _insert(rows):
+    # Сотни тысяч строк: bulk_create тратил на подготовку значений больше, чем расчёт
+    if rows:
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {quote(TABLE)} ({", ".join(map(quote, COLUMNS))}) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+
+def similar_products(product, limit=4):
+    """Рекомендации товара; пока их не посчитали — товары той же категории."""
+    recommended = list(
+        Product.objects.published().filter(recommended_for__product=product)
+        .select_related('brand').order_by('recommended_for__rank')[:limit]
+    )
+    if recommended:
+        return recommended
+    return list(
+        Product.objects.published().filter(category_id=product.category_id)
+        .exclude(id=product.id).select_related('brand')[:limit]
+    )
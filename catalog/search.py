@@ -0,0 +1,410 @@
+"""Полнотекстовый поиск по каталогу.
+
+Текст товара (название, описание, бренд, категория) нормализуется:
+регистр, ё→е, русский стемминг по алгоритму Snowball. Нормализованные
+термы хранятся в одном из бэкендов:
+
+* ``fts5`` — виртуальная таблица SQLite FTS5 с ранжированием bm25;
+* ``memory`` — инвертированный индекс в памяти процесса (для любой БД).
+
+Бэкенд выбирается настройкой ``CATALOG_SEARCH_BACKEND`` (``auto`` по
+умолчанию: FTS5, если таблица есть, иначе память). Индексы обновляются
+сигналами из ``catalog.signals``.
+"""
+import bisect
+import functools
+import json
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'catalog_product_fts'
+
+# Веса полей: название, описание, бренд, категория
+FIELD_WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Сколько совпадений индекса в памяти проверяется по ``within`` за один запрос
+WITHIN_BATCH_SIZE = 500
+
+# --- Стемминг -------------------------------------------------------------
+
+_VOWELS = set('аеиоуыэюя')
+
+
+def _grouped(first, second):
+    # Окончания первой группы допустимы только после «а»/«я»
+    return tuple(sorted(first + second, key=len, reverse=True)), frozenset(second)
+
+
+_PERFECTIVE_GERUND = _grouped(('вшись', 'вши', 'в'), ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'))
+_ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+    'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE = _grouped(('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_REFLEXIVE = ('ся', 'сь')
+_VERB = _grouped(
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют',
+        'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+_NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей',
+    'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья',
+    'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _strip(word, endings):
+    for ending in endings:
+        if word.endswith(ending):
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_grouped(word, groups):
+    endings, second = groups
+    for ending in endings:
+        if word.endswith(ending):
+            base = word[:-len(ending)]
+            if ending in second or base.endswith(('а', 'я')):
+                return base
+    return None
+
+
+def _regions(word):
+    def after_vc(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+    r1 = after_vc(0)
+    r2 = after_vc(r1)
+    return rv, r2
+
+
+def stem_russian(word):
+    """Русский стеммер Snowball (Porter); слова без кириллицы не меняются."""
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+
+    base = _strip_grouped(tail, _PERFECTIVE_GERUND)
+    if base is not None:
+        tail = base
+    else:
+        base = _strip(tail, _REFLEXIVE)
+        if base is not None:
+            tail = base
+        base = _strip(tail, _ADJECTIVE)
+        if base is not None:
+            participle = _strip_grouped(base, _PARTICIPLE)
+            tail = participle if participle is not None else base
+        else:
+            base = _strip_grouped(tail, _VERB)
+            if base is None:
+                base = _strip(tail, _NOUN)
+            if base is not None:
+                tail = base
+
+    if tail.endswith('и'):
+        tail = tail[:-1]
+
+    r2_in_tail = max(0, r2 - rv)
+    base = _strip(tail[r2_in_tail:], _DERIVATIONAL)
+    if base is not None:
+        tail = tail[:r2_in_tail] + base
+
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    else:
+        base = _strip(tail, _SUPERLATIVE)
+        if base is not None:
+            tail = base[:-1] if base.endswith('нн') else base
+        elif tail.endswith('ь'):
+            tail = tail[:-1]
+    return head + tail
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_token(token):
+    token = token.lower().replace('ё', 'е')
+    if any('а' <= ch <= 'я' for ch in token):
+        return stem_russian(token)
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize_token(t) for t in _TOKEN_RE.findall(text or '')]
+
+
+def _product_fields(name, description, brand, category):
+    return [' '.join(tokenize(value)) for value in (name, description, brand, category)]
+
+
+def _product_rows(queryset=None):
+    from .models import Product
+
+    queryset = queryset if queryset is not None else Product.objects.all()
+    # FTS5 заметно быстрее принимает строки в порядке возрастания rowid
+    rows = queryset.order_by('id').values_list('id', 'name', 'description', 'brand__name', 'category__name')
+    for pk, name, description, brand, category in rows.iterator(chunk_size=2000):
+        yield pk, _product_fields(name, description, brand, category)
+
+
+# --- Бэкенды ---------------------------------------------------------------
+
+class SqliteFTSBackend:
+    name = 'fts5'
+    # Индекс хранится в БД и переживает перезапуск процесса
+    persistent = True
+
+    @staticmethod
+    def is_available():
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def _match(terms):
+        return ' AND '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, limit, within=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [self._match(terms)]
+        if within is not None:
+            # Ранжируем только видимые товары, иначе лимит съедят черновики
+            within_sql, within_params = _pk_sql(within)
+            sql += f' AND rowid IN ({within_sql})'
+            params.extend(within_params)
+        weights = ', '.join(str(w) for w in FIELD_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s', [*params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching(self, query):
+        """Все совпадения без ранжирования — подзапрос для ``pk__in``."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self._match(terms)])
+
+    def index(self, queryset):
+        rows = [(pk, *fields) for pk, fields in _product_rows(queryset)]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description, brand, category) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def rebuild(self):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batch = []
+            for pk, fields in _product_rows():
+                batch.append((pk, *fields))
+                if len(batch) >= 2000:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+
+    def _insert(self, rows):
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, description, brand, category) VALUES (%s, %s, %s, %s, %s)',
+                    rows,
+                )
+
+
+class InvertedIndexBackend:
+    """Инвертированный индекс в памяти: терм → {product_id: взвешенная частота}.
+
+    Последний терм запроса ищется по префиксу через bisect по
+    отсортированному словарю, остальные тоже — чтобы поиск «по мере ввода»
+    вёл себя так же, как FTS5 с ``"term"*``.
+    """
+    name = 'memory'
+    persistent = False
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None
+        self._doc_terms = {}
+        self._vocabulary = []
+
+    def _ensure(self):
+        if self._postings is None:
+            self.rebuild()
+
+    def _add(self, pk, fields):
+        weights = {}
+        for weight, text in zip(FIELD_WEIGHTS, fields):
+            for term in text.split():
+                weights[term] = weights.get(term, 0.0) + weight
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[pk] = weight
+        self._doc_terms[pk] = set(weights)
+
+    def _remove(self, pk):
+        for term in self._doc_terms.pop(pk, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(pk, None)
+                if not postings:
+                    del self._postings[term]
+
+    def rebuild(self):
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            for pk, fields in _product_rows():
+                self._add(pk, fields)
+            self._vocabulary = sorted(self._postings)
+
+    def index(self, queryset):
+        with self._lock:
+            if self._postings is None:
+                return
+            for pk, fields in _product_rows(queryset):
+                self._remove(pk)
+                self._add(pk, fields)
+            self._vocabulary = sorted(self._postings)
+
+    def remove(self, pk):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(pk)
+            self._vocabulary = sorted(self._postings)
+
+    def search(self, query, limit, within=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure()
+            total = max(1, len(self._doc_terms))
+            scores = None
+            for term in terms:
+                term_scores = {}
+                start = bisect.bisect_left(self._vocabulary, term)
+                for vocab_term in self._vocabulary[start:]:
+                    if not vocab_term.startswith(term):
+                        break
+                    postings = self._postings[vocab_term]
+                    idf = math.log(1 + total / len(postings))
+                    for pk, weight in postings.items():
+                        term_scores[pk] = term_scores.get(pk, 0.0) + weight * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: s + term_scores[pk] for pk, s in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+        ranked = [pk for pk, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+        if within is None:
+            return ranked[:limit]
+        # Совпадения проверяются по ``within`` пачками в порядке релевантности,
+        # пока не наберётся ``limit`` видимых товаров
+        found = []
+        for start in range(0, len(ranked), WITHIN_BATCH_SIZE):
+            batch = ranked[start:start + WITHIN_BATCH_SIZE]
+            visible = set(within.filter(pk__in=batch).values_list('pk', flat=True))
+            found.extend(pk for pk in batch if pk in visible)
+            if limit is not None and len(found) >= limit:
+                break
+        return found[:limit]
+
+    def matching(self, query):
+        """Все совпадения без ранжирования — подзапрос для ``pk__in``."""
+        return _id_list(self.search(query, None))
+
+
+def _pk_sql(queryset):
+    return queryset.order_by().values('pk').query.get_compiler(connection=connection).as_sql()
+
+
+def _id_list(ids):
+    """Список id одним параметром запроса: ``pk__in`` со списком упрётся в предел числа параметров."""
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)])
+    if connection.vendor == 'postgresql':
+        return RawSQL('SELECT unnest(%s::bigint[])', [ids])
+    return ids
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, 'CATALOG_SEARCH_BACKEND', 'auto')
+                if choice == 'fts5' or (choice == 'auto' and SqliteFTSBackend.is_available()):
+                    _backend = SqliteFTSBackend()
+                else:
+                    _backend = InvertedIndexBackend()
+    return _backend
+
+
+def search_ids(query, limit=None, within=None):
+    """Id лучших по релевантности товаров; с ``within`` — только из этого QuerySet."""
+    limit = limit or getattr(settings, 'CATALOG_SEARCH_LIMIT', 500)
+    return get_search_backend().search(query, limit, within)
+
+
+def search_queryset(queryset, query, ranked=True):
+    """Фильтрует ``queryset`` по запросу.
+
+    При ``ranked`` — первые ``CATALOG_SEARCH_LIMIT`` товаров ``queryset`` по
+    релевантности (лимит применяется после отбора по ``queryset``, поэтому
+    черновики и снятые с продажи товары его не занимают). Без ранжирования — все совпадения: если к поиску добавляются фильтры,
+    лимит до фильтрации терял бы подходящие товары.
+    """
+    if not ranked:
+        return queryset.filter(pk__in=get_search_backend().matching(query))
+    ids = search_ids(query, within=queryset)
+    queryset = queryset.filter(pk__in=ids)
+    if ids:
+        queryset = queryset.order_by(
+            Case(
+                *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+                output_field=IntegerField(),
+            )
+        )
+    return queryset
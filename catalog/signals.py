@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import facets, fragments, listing, navigation, orders, suggest, thumbnails
+from .search import get_search_backend
+from .models import Brand, Category, OrderItem, Product, Tag
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_facets(sender, **kwargs):
+    facets.invalidate()
+    fragments.invalidate_sidebars()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_navigation(sender, **kwargs):
+    navigation.invalidate()
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_facets_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        facets.invalidate()
+        fragments.invalidate_sidebars()
+
+
+@receiver([post_save, post_delete], sender=Brand)
+def invalidate_product_cards(sender, **kwargs):
+    # Карточка показывает название бренда; изменения самого товара
+    # меняют его ``updated`` и, значит, ключ карточки.
+    fragments.invalidate_cards()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def generate_thumbnails(sender, instance, raw=False, **kwargs):
+    # Файл к этому моменту уже записан FileField.pre_save; копии делаем после
+    # коммита, чтобы пул не прочитал товар до того, как он появится в БД
+    image = instance.image
+    if raw or not image or instance.image_variants.get('source') == image.name:
+        return
+    pk, name = instance.pk, image.name
+    transaction.on_commit(lambda: thumbnails.schedule(pk, name))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def reindex_related_products(sender, instance, created, **kwargs):
+    if not created:
+        field = 'category' if sender is Category else 'brand'
+        get_search_backend().index(Product.objects.filter(**{field: instance}))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def update_suggestions(sender, instance, **kwargs):
+    kind = {Product: 'product', Category: 'category', Brand: 'brand'}[sender]
+    if sender is Product and not (instance.status == Product.Status.PUBLISHED and instance.is_available):
+        suggest.apply_change(lambda index: index.remove(kind, instance.pk))
+    else:
+        suggest.apply_change(lambda index: index.upsert(kind, instance.pk, instance.name, instance.slug))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def remove_suggestion(sender, instance, **kwargs):
+    kind = {Product: 'product', Category: 'category', Brand: 'brand'}[sender]
+    pk = instance.pk
+    suggest.apply_change(lambda index: index.remove(kind, pk))
+
+
+@receiver(post_save, sender=Product)
+def update_listing(sender, instance, raw=False, **kwargs):
+    # При loaddata категорий и брендов может ещё не быть — после загрузки rebuild_listing
+    if not raw:
+        listing.refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_listing(sender, instance, **kwargs):
+    listing.remove(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def rename_listing(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        listing.rename('category' if sender is Category else 'brand', instance)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def update_listing_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки связей у тега уже не узнать, какие товары его имели
+        instance._listing_product_ids = list(instance.products.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        listing.refresh(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        listing.refresh(instance.__dict__.pop('_listing_product_ids', []) if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_products(sender, instance, **kwargs):
+    # Связи удаляются каскадом без m2m_changed
+    instance._listing_product_ids = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def update_listing_tag(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    if '_listing_product_ids' in instance.__dict__:
+        ids = instance.__dict__.pop('_listing_product_ids')
+    else:
+        ids = instance.products.values_list('pk', flat=True)
+    listing.refresh(ids)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_totals(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        orders.item_saved(instance, created)
+
+
+@receiver(post_delete, sender=OrderItem)
+def subtract_order_totals(sender, instance, **kwargs):
+    orders.item_deleted(instance)
+
+
+def invalidate_bulk_changes(ids=None):
+    """Сбрасывает производные индексы после ``QuerySet.update()``, который не шлёт сигналов.
+
+    ``ids`` — изменённые товары; без них проекция витрины собирается заново.
+    """
+    if ids is None:
+        listing.rebuild()
+    else:
+        listing.refresh(ids)
+    facets.invalidate()
+    fragments.invalidate_cards()
+    fragments.invalidate_sidebars()
+    suggest.reset()
@@ -0,0 +1,144 @@
+"""Потоковая выгрузка каталога (``ProductListing``) для ``product_list_api``.
+
+Строки читаются через ``QuerySet.iterator(chunk_size=...)`` (в асинхронных
+представлениях — порциями по id) и сразу кодируются в JSON,
+поэтому память не зависит от размера каталога.
+Цены пишутся JSON-числами из текстового представления ``Decimal``
+(``99990.00``), без преобразования через float.
+"""
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+# Колонки ProductListing; в ней только опубликованные товары, поэтому is_available всегда true
+EXPORT_FIELDS = ('id', 'name', 'slug', 'price', 'old_price', 'brand_name', 'category_name')
+
+# Сколько байт копить перед отдачей очередного куска ответа
+BUFFER_SIZE = 64 * 1024
+
+
+def _encode_decimal(value):
+    return 'null' if value is None else format(value, 'f')
+
+
+def encode_row(row):
+    pk, name, slug, price, old_price, brand, category = row
+    return (
+        f'{{"id": {pk}, "name": {json.dumps(name, ensure_ascii=False)}, '
+        f'"slug": {json.dumps(slug)}, "price": {_encode_decimal(price)}, '
+        f'"old_price": {_encode_decimal(old_price)}, '
+        f'"brand__name": {json.dumps(brand, ensure_ascii=False)}, '
+        f'"category__name": {json.dumps(category, ensure_ascii=False)}, '
+        f'"is_available": true}}'
+    )
+
+
+def _chunk_size():
+    return getattr(settings, 'CATALOG_STREAM_CHUNK_SIZE', 2000)
+
+
+def _rows(queryset):
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=_chunk_size())
+
+
+async def _arows(queryset):
+    # aiterator() у values_list выполняет запрос прямо в цикле событий
+    # (SynchronousOnlyOperation), поэтому читаем порциями по id: каждая
+    # порция — отдельный запрос, курсор не держится открытым между await
+    chunk_size = _chunk_size()
+    rows = queryset.order_by('id').values_list(*EXPORT_FIELDS)
+    last = None
+    while True:
+        chunk = rows if last is None else rows.filter(id__gt=last)
+        chunk = [row async for row in chunk[:chunk_size]]
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            break
+        last = chunk[-1][0]
+
+
+def _buffered(parts):
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+async def _abuffered(parts):
+    buffer = []
+    size = 0
+    async for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _ndjson(queryset):
+    for row in _rows(queryset):
+        yield encode_row(row)
+        yield '\n'
+
+
+def _json_array(queryset):
+    yield '['
+    first = True
+    for row in _rows(queryset):
+        if not first:
+            yield ','
+        first = False
+        yield encode_row(row)
+    yield ']'
+
+
+async def _andjson(queryset):
+    async for row in _arows(queryset):
+        yield encode_row(row)
+        yield '\n'
+
+
+async def _ajson_array(queryset):
+    yield '['
+    first = True
+    async for row in _arows(queryset):
+        if not first:
+            yield ','
+        first = False
+        yield encode_row(row)
+    yield ']'
+
+
+STREAM_FORMATS = {
+    'ndjson': (_ndjson, 'application/x-ndjson; charset=utf-8'),
+    'json-stream': (_json_array, 'application/json; charset=utf-8'),
+}
+
+
+ASYNC_STREAM_FORMATS = {
+    'ndjson': _andjson,
+    'json-stream': _ajson_array,
+}
+
+
+def stream_products(queryset, fmt):
+    generator, content_type = STREAM_FORMATS[fmt]
+    return StreamingHttpResponse(_buffered(generator(queryset)), content_type=content_type)
+
+
+def astream_products(queryset, fmt):
+    """Ответ с асинхронным итератором: под ASGI не занимает поток на время выгрузки."""
+    _, content_type = STREAM_FORMATS[fmt]
+    return StreamingHttpResponse(_abuffered(ASYNC_STREAM_FORMATS[fmt](queryset)), content_type=content_type)
@@ -0,0 +1,186 @@
+"""Подсказки по префиксу для строки поиска.
+
+Индекс — отсортированные массивы ключей (нормализованные названия и
+все их «хвосты» с начала каждого слова), по одному на вид записи, с
+параллельными массивами id. Поиск — ``bisect`` плюс линейный проход по
+диапазону префикса в каждом виде, без обращений к базе данных.
+
+Индекс строится при первом запросе к приложению (см. ``warm_on_first_request``)
+и хранится в памяти процесса вместе с версией из общего кэша версий
+(``catalog.fragments``). Сигналы при сохранении/удалении товаров, брендов и
+категорий правят индекс своего процесса точечно и меняют версию; остальные
+процессы, увидев новую версию, строят индекс заново при следующем запросе.
+Запись, сделанная другим процессом между чтением версии и её сменой (см.
+``apply_change``), может не попасть в индекс этого процесса до следующей
+смены версии.
+"""
+import bisect
+import re
+import threading
+
+from django.urls import reverse
+
+from techmarket.routers import primary
+
+from . import fragments
+from .models import Brand, Category, Product
+
+KIND = 'suggest'
+KINDS = ('category', 'brand', 'product')
+_WORD_START_RE = re.compile(r'(?<!\w)\w', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def _keys(name):
+    normalized = normalize(name)
+    return {normalized[m.start():] for m in _WORD_START_RE.finditer(normalized)}
+
+
+class SuggestIndex:
+    def __init__(self, version=None):
+        self.version = version
+        self._lock = threading.Lock()
+        # Отдельные массивы на каждый вид: короткий префикс не даёт товарам
+        # вытеснить категории и бренды из выдачи
+        self._keys = {kind: [] for kind in KINDS}
+        self._pks = {kind: [] for kind in KINDS}
+        # (kind, pk) -> (name, slug, keys)
+        self._entries = {}
+
+    def _insert(self, kind, pk, name, slug):
+        keys = _keys(name)
+        self._entries[(kind, pk)] = (name, slug, keys)
+        kind_keys, kind_pks = self._keys[kind], self._pks[kind]
+        for key in keys:
+            position = bisect.bisect_left(kind_keys, key)
+            kind_keys.insert(position, key)
+            kind_pks.insert(position, pk)
+
+    def _delete(self, kind, pk):
+        entry = self._entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        kind_keys, kind_pks = self._keys[kind], self._pks[kind]
+        for key in entry[2]:
+            position = bisect.bisect_left(kind_keys, key)
+            while position < len(kind_keys) and kind_keys[position] == key:
+                if kind_pks[position] == pk:
+                    del kind_keys[position]
+                    del kind_pks[position]
+                    break
+                position += 1
+
+    def load(self, rows):
+        """Полная загрузка из итератора (kind, pk, name, slug)."""
+        pairs = {kind: [] for kind in KINDS}
+        entries = {}
+        for kind, pk, name, slug in rows:
+            keys = _keys(name)
+            entries[(kind, pk)] = (name, slug, keys)
+            pairs[kind].extend((key, pk) for key in keys)
+        for kind_pairs in pairs.values():
+            kind_pairs.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys = {kind: [key for key, _ in pairs[kind]] for kind in KINDS}
+            self._pks = {kind: [pk for _, pk in pairs[kind]] for kind in KINDS}
+
+    def upsert(self, kind, pk, name, slug):
+        with self._lock:
+            self._delete(kind, pk)
+            self._insert(kind, pk, name, slug)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._delete(kind, pk)
+
+    def suggest(self, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        # Под блокировкой: upsert/remove из сигналов меняют массивы на месте
+        with self._lock:
+            for kind in KINDS:
+                keys, pks = self._keys[kind], self._pks[kind]
+                seen = set()
+                position = bisect.bisect_left(keys, prefix)
+                # Хвосты одного названия дают дубли — идём до заполнения выдачи
+                while len(results) < limit and position < len(keys) and keys[position].startswith(prefix):
+                    pk = pks[position]
+                    position += 1
+                    if pk in seen:
+                        continue
+                    seen.add(pk)
+                    name, slug, _ = self._entries[(kind, pk)]
+                    results.append((kind, name, slug))
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _all_rows():
+    for pk, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+        yield 'category', pk, name, slug
+    for pk, name, slug in Brand.objects.values_list('id', 'name', 'slug'):
+        yield 'brand', pk, name, slug
+    for pk, name, slug in Product.objects.published().values_list('id', 'name', 'slug').iterator(chunk_size=5000):
+        yield 'product', pk, name, slug
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggest_index():
+    global _index
+    version = fragments.get_version(KIND)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is not None and _index.version == version:
+            return _index
+        # Версия прочитана до загрузки: изменение во время загрузки сменит
+        # её, и следующий запрос построит индекс заново
+        index = SuggestIndex(version)
+        with primary():
+            index.load(_all_rows())
+        _index = index
+        return index
+
+
+def apply_change(change):
+    """Применяет ``change(index)`` к индексу процесса и меняет общую версию.
+
+    Индекс, отставший от версии, не правится — его перестроит следующий запрос.
+    """
+    index = _index
+    if index is not None and index.version == fragments.get_version(KIND):
+        change(index)
+        index.version = fragments.bump(KIND)
+    else:
+        fragments.bump(KIND)
+
+
+def reset():
+    fragments.bump(KIND)
+
+
+def warm_on_first_request(sender, **kwargs):
+    from django.core.signals import request_started
+
+    request_started.disconnect(warm_on_first_request, dispatch_uid='catalog_suggest_warmup')
+    get_suggest_index()
+
+
+def suggestion_url(kind, slug):
+    if kind == 'category':
+        return reverse('category_detail', kwargs={'category_slug': slug})
+    if kind == 'brand':
+        return reverse('product_list') + f'?brand={slug}'
+    return reverse('product_detail', kwargs={'product_slug': slug})
@@ -0,0 +1,56 @@
+"""Синтетический каталог для бенчмарков и нагрузочных тестов."""
+from .models import Brand, Category, Product, Tag
+
+NOUNS = [
+    'смартфон', 'ноутбук', 'планшет', 'наушники', 'часы', 'монитор', 'клавиатура',
+    'мышь', 'колонка', 'роутер', 'камера', 'телевизор', 'приставка', 'зарядка',
+]
+ADJECTIVES = [
+    'беспроводные', 'игровой', 'компактный', 'мощный', 'лёгкий', 'премиальный',
+    'доступный', 'флагманский', 'тонкий', 'защищённый', 'умный', 'быстрый',
+]
+PHRASES = [
+    'с активным шумоподавлением', 'с OLED-экраном', 'с быстрой зарядкой',
+    'для работы и учебы', 'для требовательных пользователей', 'с отличной камерой',
+    'на Android', 'с процессором нового поколения', 'для спорта', 'для путешествий',
+]
+
+
+def seed_catalog(rng, products, categories=20, brands=60, tags=30, batch_size=5000):
+    """Создаёт справочники и ``products`` товаров через bulk_create.
+
+    Сигналы не вызываются — после заполнения вызывающий код сам сбрасывает
+    производные индексы.
+    """
+    category_objs = Category.objects.bulk_create(
+        Category(name=f'{NOUNS[i % len(NOUNS)].capitalize()} {i}', slug=f'bench-cat-{i}') for i in range(categories)
+    )
+    brand_objs = Brand.objects.bulk_create(
+        Brand(name=f'Brand{i}', slug=f'bench-brand-{i}') for i in range(brands)
+    )
+    tag_objs = Tag.objects.bulk_create(
+        Tag(name=f'Bench тег {i}', slug=f'bench-tag-{i}') for i in range(tags)
+    )
+
+    def make(i):
+        noun = rng.choice(NOUNS)
+        return Product(
+            name=f'{rng.choice(ADJECTIVES).capitalize()} {noun} {i}',
+            slug=f'bench-product-{i}',
+            description=f'{noun.capitalize()} {rng.choice(PHRASES)}, {rng.choice(PHRASES)}',
+            price=rng.randint(1000, 200000),
+            quantity=rng.randint(0, 50),
+            category=rng.choice(category_objs),
+            brand=rng.choice(brand_objs),
+        )
+
+    # Пачками, чтобы не держать в памяти все товары (1M+ для бенчмарков)
+    through = Product.tags.through
+    for start in range(0, products, batch_size):
+        product_objs = Product.objects.bulk_create([make(i) for i in range(start, min(start + batch_size, products))])
+        through.objects.bulk_create([
+            through(product_id=p.id, tag_id=tag.id)
+            for p in product_objs
+            for tag in rng.sample(tag_objs, rng.randint(0, 3))
+        ])
+    return category_objs, brand_objs, tag_objs
@@ -1,12 +1,70 @@
 from django import template
-from catalog.models import Category, Tag
+from django.templatetags.static import static
+from django.utils.html import format_html
+from catalog import fragments, navigation, thumbnails
 
 register = template.Library()
 
 @register.simple_tag
 def get_categories():
-    return Category.objects.all()
+    return navigation.get_categories()
 
 @register.simple_tag
 def get_tags():
-    return Tag.objects.all()
+    return navigation.get_tags()
+
+@register.simple_tag
+def product_image(product, sizes, lazy=True):
+    """<picture> с WebP и srcset из уменьшенных копий (см. ``catalog.thumbnails``).
+
+    Пока копий нет, отдаётся исходный файл.
+    """
+    loading = format_html(' loading="lazy" decoding="async"') if lazy else ''
+    image = product.image
+    if not image:
+        return format_html('<img src="{}" alt="{}">', static('catalog/images/no-image.svg'), product.name)
+    variants = product.image_variants
+    sets = thumbnails.srcsets(image, variants)
+    if sets is None:
+        return format_html('<img src="{}" alt="{}"{}>', image.url, product.name, loading)
+    fallback, webp = sets
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        webp, sizes, image.url, fallback, sizes, variants['width'], variants['height'], product.name, loading,
+    )
+
+
+class FragmentNode(template.Node):
+    def __init__(self, kind, parts, nodelist):
+        self.kind = kind
+        self.parts = parts
+        self.nodelist = nodelist
+
+    def render(self, context):
+        cache = fragments.get_cache()
+        if cache is None:
+            return self.nodelist.render(context)
+        # Версии читаются из кэша один раз на рендер страницы
+        versions = context.render_context.get(self)
+        if versions is None:
+            versions = context.render_context[self] = fragments.get_versions()
+        parts = [part.resolve(context) for part in self.parts]
+        return fragments.get_or_render(self.kind, parts, lambda: self.nodelist.render(context), versions)
+
+
+@register.tag
+def fragment(parser, token):
+    """{% fragment "card" product.pk product.updated %}...{% endfragment %}
+
+    Кэширует содержимое блока, см. ``catalog.fragments``.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("'fragment' ожидает вид фрагмента и части ключа")
+    kind = bits[1].strip('"\'')
+    if kind not in fragments.KINDS:
+        raise template.TemplateSyntaxError(f"'fragment': неизвестный вид фрагмента {kind!r}")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(kind, [parser.compile_filter(bit) for bit in bits[2:]], nodelist)
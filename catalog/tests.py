@@ -1,7 +1,13 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
-from .models import Category, Brand, Product, Tag, ProductDetail, Order, OrderItem
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import Category, Brand, Product, ProductListing, Tag, ProductDetail, Order, OrderItem
+from .querybudget import QueryBudgetTestMixin
+from decimal import Decimal
 import json
+import os
 
 
 class CatalogViewTests(TestCase):
@@ -37,6 +43,58 @@ class CatalogViewTests(TestCase):
         resp = self.client.get(reverse('product_list'), {'search': 'Смартфоны'})
         self.assertEqual(resp.status_code, 200)
 
+    def test_search_stemmed_and_ranked(self):
+        Product.objects.create(name='Чехол', slug='case', description='Подходит для iPhone', price=1000, quantity=1, category=self.cat1, brand=self.brand2)
+        resp = self.client.get(reverse('product_list'), {'search': 'iphone'})
+        self.assertEqual([p.slug for p in resp.context['products']], ['iphone', 'case'])
+        resp = self.client.get(reverse('product_list'), {'search': 'смартфонов'})
+        self.assertEqual({p.slug for p in resp.context['products']}, {'iphone', 'galaxy', 'case'})
+
+    @override_settings(CATALOG_SEARCH_LIMIT=3)
+    def test_filtered_search_not_capped(self):
+        from .search import InvertedIndexBackend
+        for i in range(5):
+            # Название весит больше описания: первые по релевантности — ноутбуки
+            Product.objects.create(name=f'Чехол {i}', slug=f'laptop-case-{i}', price=1000, quantity=1, category=self.cat2, brand=self.brand1)
+            Product.objects.create(name=f'Аксессуар {i}', slug=f'phone-case-{i}', description='Чехол', price=1000, quantity=1, category=self.cat1, brand=self.brand1)
+        resp = self.client.get(reverse('product_list'), {'search': 'чехол'})
+        self.assertEqual(resp.context['paginator'].count, 3)
+        resp = self.client.get(reverse('product_list'), {'search': 'чехол', 'category': 'smartphones'})
+        self.assertEqual(resp.context['paginator'].count, 5)
+        self.assertTrue(all(p.category_slug == 'smartphones' for p in resp.context['products']))
+        resp = self.client.get(reverse('product_list'), {'search': 'чехол', 'sort': 'name'})
+        self.assertEqual(resp.context['paginator'].count, 10)
+        self.assertEqual(ProductListing.objects.filter(pk__in=InvertedIndexBackend().matching('чехол')).count(), 10)
+
+    @override_settings(CATALOG_SEARCH_LIMIT=3)
+    def test_ranked_search_skips_unpublished(self):
+        from .search import InvertedIndexBackend
+        for i in range(5):
+            # Черновики релевантнее: слово в названии
+            Product.objects.create(name=f'Чехол {i}', slug=f'draft-case-{i}', price=1000, quantity=1, category=self.cat1, brand=self.brand1, status=Product.Status.DRAFT)
+        for i in range(2):
+            Product.objects.create(name=f'Аксессуар {i}', slug=f'case-{i}', description='Чехол', price=1000, quantity=1, category=self.cat1, brand=self.brand1)
+        resp = self.client.get(reverse('product_list'), {'search': 'чехол'})
+        self.assertEqual(sorted(p.slug for p in resp.context['products']), ['case-0', 'case-1'])
+        ids = InvertedIndexBackend().search('чехол', 3, within=ProductListing.objects.all())
+        self.assertEqual(set(ids), set(ProductListing.objects.filter(slug__startswith='case-').values_list('pk', flat=True)))
+
+    def test_search_index_follows_updates(self):
+        self.p3.name = 'Ультрабук'
+        self.p3.save()
+        self.assertEqual(list(Product.advanced.search_products('ультрабуки')), [self.p3])
+        self.brand1.name = 'Яблоко'
+        self.brand1.save()
+        self.assertEqual(set(Product.advanced.search_products('яблоко')), {self.p1, self.p3})
+
+    def test_memory_search_backend(self):
+        from .search import InvertedIndexBackend
+        backend = InvertedIndexBackend()
+        pk = self.p2.id
+        self.assertEqual(backend.search('gal', 10), [pk])
+        backend.remove(pk)
+        self.assertEqual(backend.search('gal', 10), [])
+
     def test_pagination(self):
         for i in range(20):
             Product.objects.create(name=f'Extra {i}', slug=f'extra-{i}', price=1000+i, quantity=1, category=self.cat1, brand=self.brand2)
@@ -44,10 +102,46 @@ class CatalogViewTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertIn('page_obj', resp.context)
 
+    def test_cursor_pagination(self):
+        for i in range(15):
+            Product.objects.create(name=f'Extra {i}', slug=f'extra-{i}', price=1000+i, quantity=1, category=self.cat1, brand=self.brand2)
+        resp = self.client.get(reverse('product_list'), {'pagination': 'cursor', 'page_size': 10, 'sort': 'price'})
+        page = resp.context['cursor_page']
+        self.assertEqual(page.count, 18)
+        self.assertTrue(page.has_next)
+        resp = self.client.get(reverse('product_list'), {'after': page.next_cursor, 'page_size': 10, 'sort': 'price'})
+        self.assertEqual(len(resp.context['products']), 8)
+        self.assertFalse(resp.context['cursor_page'].has_next)
+
     def test_filter_by_tag(self):
         resp = self.client.get(reverse('product_list'), {'tag': 'hit'})
         products = resp.context['products']
-        self.assertTrue(all(self.tag_hot in p.tags.all() for p in products))
+        self.assertTrue(products)
+        self.assertTrue(all('hit' in p.tag_slugs for p in products))
+
+    def test_facet_counts_exclude_own_dimension(self):
+        resp = self.client.get(reverse('product_list'), {'categories': 'smartphones', 'brand': 'apple'})
+        categories = {f['slug']: f['count'] for f in resp.context['facet_categories']}
+        brands = {f['slug']: f['count'] for f in resp.context['facet_brands']}
+        self.assertEqual(categories, {'smartphones': 1, 'laptops': 1})
+        self.assertEqual(brands, {'apple': 1, 'samsung': 1})
+        self.assertEqual([f['slug'] for f in resp.context['facet_tags']], ['hit'])
+
+    def test_facets_invalidated_on_tag_change(self):
+        self.client.get(reverse('product_list'))
+        self.p2.tags.add(self.tag_hot)
+        resp = self.client.get(reverse('product_list'))
+        tags = {f['slug']: f['count'] for f in resp.context['facet_tags']}
+        self.assertEqual(tags['hit'], 2)
+
+    def test_facet_index_follows_shared_version(self):
+        from . import facets, fragments
+        index = facets.get_facet_index()
+        with self.assertNumQueries(0):
+            self.assertIs(facets.get_facet_index(), index)
+        # Так инвалидацию видит процесс, в котором сигналы не сработали
+        fragments.bump(facets.KIND)
+        self.assertIsNot(facets.get_facet_index(), index)
 
     def test_product_details_presence(self):
         resp = self.client.get(reverse('product_detail', args=['iphone']))
@@ -69,6 +163,56 @@ class CatalogApiTests(TestCase):
         self.assertIn('results', body)
         self.assertEqual(body['page'], 1)
 
+    def test_list_api_cursor_skips_count(self):
+        url = reverse('product_list_api')
+        for params in ({'pagination': 'cursor'}, {'format': 'ndjson'}):
+            self.client.get(url, params)
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url, params)
+                body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+            self.assertTrue(body)
+            self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql']], params)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len([q for q in queries if 'COUNT(' in q['sql']]), 1)
+
+    def test_list_api_cursor_walks_every_sort(self):
+        for i in range(6):
+            Product.objects.create(name=f'Phone {i % 3}', slug=f'phone-{i}', price=1000 * (i % 2 + 1), quantity=1, category=self.cat, brand=self.brand)
+        expected = set(Product.objects.published().values_list('id', flat=True))
+        for sort in ['price', '-price', 'name', '-name', '-created']:
+            seen = []
+            params = {'pagination': 'cursor', 'page_size': 2, 'sort': sort}
+            while True:
+                body = json.loads(self.client.get(reverse('product_list_api'), params).content)
+                self.assertEqual(body['count'], len(expected))
+                seen.extend(r['id'] for r in body['results'])
+                if not body['next']:
+                    break
+                params['after'] = body['next']
+            self.assertEqual(len(seen), len(expected), sort)
+            self.assertEqual(set(seen), expected, sort)
+
+    def test_list_api_invalid_cursor(self):
+        resp = self.client.get(reverse('product_list_api'), {'after': 'garbage'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_list_api_streaming_formats(self):
+        Product.objects.create(name='Чехол "Lux"', slug='case', price='1999.90', old_price='2500.10', quantity=1, category=self.cat, brand=self.brand)
+        resp = self.client.get(reverse('product_list_api'), {'format': 'ndjson'})
+        self.assertTrue(resp.streaming)
+        lines = b''.join(resp.streaming_content).decode('utf-8').splitlines()
+        rows = [json.loads(line, parse_float=Decimal) for line in lines]
+        self.assertEqual([r['slug'] for r in rows], ['iphone', 'case'])
+        self.assertEqual(rows[1]['price'], Decimal('1999.90'))
+        self.assertEqual(rows[1]['name'], 'Чехол "Lux"')
+        resp = self.client.get(reverse('product_list_api'), {'format': 'json-stream'})
+        body = json.loads(b''.join(resp.streaming_content), parse_float=Decimal)
+        self.assertEqual(len(body), 2)
+        self.assertIsNone(body[0]['old_price'])
+        resp = self.client.get(reverse('product_list_api'), {'format': 'xml'})
+        self.assertEqual(resp.status_code, 400)
+
     def test_create_product_api(self):
         payload = {
             'name': 'New Phone',
@@ -87,6 +231,973 @@ class CatalogApiTests(TestCase):
         resp = self.client.delete(url)
         self.assertEqual(resp.status_code, 200)
 
+    def test_batch_api(self):
+        ordered = Product.objects.create(name='Ordered', slug='ordered', price=1, quantity=1, category=self.cat, brand=self.brand)
+        OrderItem.objects.create(order=Order.objects.create(code='ORD-B'), product=ordered, quantity=1, price=1)
+        operations = [
+            {'op': 'create', 'name': 'Pixel', 'price': '59990.50', 'category_slug': 'smartphones', 'brand_slug': 'apple'},
+            {'op': 'create', 'name': 'Pixel', 'price': 1, 'category_slug': 'smartphones', 'brand_slug': 'apple'},
+            {'op': 'create', 'name': 'Bad', 'price': 1, 'category_slug': 'missing', 'brand_slug': 'apple'},
+            {'op': 'update', 'id': self.product.pk, 'price': '99990', 'name': 'iPhone 16'},
+            {'op': 'delete', 'id': ordered.pk},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'merge'},
+        ]
+        url = reverse('product_batch_api')
+        resp = self.client.post(url, json.dumps({'operations': operations}), content_type='application/json')
+        self.assertEqual(resp.status_code, 403)
+        self.assertTrue(Product.objects.filter(pk=ordered.pk).exists())
+        self.client.force_login(User.objects.create_user('staff', password='pass', is_staff=True))
+        resp = self.client.post(url, json.dumps({'operations': operations, 'atomic': True}), content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Product.objects.filter(slug='pixel').exists())
+        resp = self.client.post(url, json.dumps({'operations': operations}), content_type='application/json')
+        data = json.loads(resp.content)
+        self.assertEqual(
+            [r.get('error', r['status']) for r in data['results']],
+            ['created', 'duplicate_slug', 'invalid_category', 'updated', 'protected', 'not_found', 'invalid_operation'],
+        )
+        self.assertEqual(Product.objects.get(slug='pixel').price, Decimal('59990.50'))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.price), ('iPhone 16', Decimal('99990.00')))
+        self.assertEqual(self.client.get(reverse('product_list'), {'search': 'pixel'}).context['products'][0].slug, 'pixel')
+        resp = self.client.post(url, json.dumps({'operations': [{'op': 'delete', 'id': Product.objects.get(slug='pixel').pk}]}), content_type='application/json')
+        self.assertEqual(json.loads(resp.content)['summary'], {'deleted': 1})
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Apple', slug='apple')
+        self.product = Product.objects.create(name='iPhone', slug='iphone', price=100000, quantity=5, category=self.cat, brand=self.brand)
+
+    def assertRevalidates(self, url, queries=1, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('public', resp['Cache-Control'])
+        self.assertTrue(resp.has_header('Last-Modified'))
+        etag = resp['ETag']
+        with self.assertNumQueries(queries):
+            resp = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        return etag
+
+    def test_pages_and_apis_return_304(self):
+        self.assertRevalidates(reverse('product_list'), category='smartphones')
+        # Товар с тегами читается один раз и для валидатора, и для страницы
+        self.assertRevalidates(reverse('product_detail', args=['iphone']), queries=2)
+        self.assertRevalidates(reverse('category_detail', args=['smartphones']))
+        self.assertRevalidates(reverse('product_list_api'))
+        self.assertRevalidates(reverse('product_list_api'), format='ndjson')
+        self.assertRevalidates(reverse('product_detail_api', args=[self.product.pk]))
+
+    def test_validators_change_with_data(self):
+        list_url = reverse('product_list_api')
+        detail_url = reverse('product_detail_api', args=[self.product.pk])
+        list_etag = self.assertRevalidates(list_url)
+        detail_etag = self.assertRevalidates(detail_url)
+        self.brand.name = 'Apple Inc.'
+        self.brand.save()
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        detail_etag = self.assertRevalidates(detail_url)
+        self.product.price = 90000
+        self.product.save()
+        resp = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual((resp.status_code, json.loads(resp.content)['price']), (200, 90000.0))
+        last_modified = resp['Last-Modified']
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+    def test_detail_page_revalidates_after_recommendations_build(self):
+        from .recommendations import build
+        url = reverse('product_detail', args=['iphone'])
+        etag = self.assertRevalidates(url, queries=2)
+        build()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertRevalidates(url, queries=2)
+
+class AsyncApiTests(TestCase):
+    """Асинхронные эндпоинты отвечают так же, как синхронные."""
+
+    def setUp(self):
+        from . import suggest
+        suggest.reset()
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Samsung', slug='samsung')
+        for i in range(3):
+            Product.objects.create(name=f'Galaxy {i}', slug=f'galaxy-{i}', price=1000 + i, quantity=5, category=self.cat, brand=self.brand)
+        self.product = Product.objects.get(slug='galaxy-0')
+
+    async def get_both(self, sync_name, async_name, args=(), **params):
+        sync_resp = await self.async_client.get(reverse(sync_name, args=args), params)
+        async_resp = await self.async_client.get(reverse(async_name, args=args), params)
+        self.assertEqual(async_resp.status_code, sync_resp.status_code)
+        return sync_resp, async_resp
+
+    async def test_list_matches_sync(self):
+        for params in ({'page_size': 2}, {'page_size': 2, 'page': 2}, {'pagination': 'cursor', 'page_size': 2}):
+            sync_resp, async_resp = await self.get_both('product_list_api', 'product_list_api_async', **params)
+            self.assertEqual(json.loads(async_resp.content), json.loads(sync_resp.content))
+            self.assertEqual(async_resp['ETag'], sync_resp['ETag'])
+        data = json.loads(async_resp.content)
+        resp = await self.async_client.get(reverse('product_list_api_async'), {'after': data['next'], 'page_size': 2})
+        self.assertEqual(len(json.loads(resp.content)['results']), 1)
+        resp = await self.async_client.get(reverse('product_list_api_async'), {'after': 'bad'})
+        self.assertEqual(resp.status_code, 400)
+
+    @override_settings(CATALOG_STREAM_CHUNK_SIZE=2)
+    async def test_streaming_export(self):
+        from asgiref.sync import sync_to_async
+        for fmt in ('ndjson', 'json-stream'):
+            sync_resp, async_resp = await self.get_both('product_list_api', 'product_list_api_async', format=fmt)
+            self.assertTrue(async_resp.streaming)
+            body = b''.join([chunk async for chunk in async_resp])
+            sync_body = await sync_to_async(b''.join)(sync_resp.streaming_content)
+            self.assertEqual(body, sync_body)
+
+    async def test_detail_revalidates(self):
+        sync_resp, async_resp = await self.get_both('product_detail_api', 'product_detail_api_async', args=[self.product.pk])
+        self.assertEqual(json.loads(async_resp.content), json.loads(sync_resp.content))
+        url = reverse('product_detail_api_async', args=[self.product.pk])
+        resp = await self.async_client.get(url, headers={'If-None-Match': async_resp['ETag']})
+        self.assertEqual(resp.status_code, 304)
+        resp = await self.async_client.get(reverse('product_detail_api_async', args=[999999]))
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_detail_writes_use_sync_view(self):
+        url = reverse('product_detail_api_async', args=[self.product.pk])
+        resp = await self.async_client.put(url, json.dumps({'price': 500}), content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((await Product.objects.aget(pk=self.product.pk)).price, 500)
+
+    async def test_suggest(self):
+        sync_resp, async_resp = await self.get_both('suggest_api', 'suggest_api_async', q='gal')
+        self.assertEqual(json.loads(async_resp.content), json.loads(sync_resp.content))
+        self.assertEqual(len(json.loads(async_resp.content)['results']), 3)
+
+    async def test_search(self):
+        # Слово дважды в названии — первый по релевантности; черновик в выдачу не попадает
+        self.product.name = 'Galaxy Ultra Galaxy'
+        await self.product.asave()
+        await Product.objects.acreate(name='Galaxy Draft', slug='galaxy-draft', price=1, quantity=1, category=self.cat, brand=self.brand, status=Product.Status.DRAFT)
+        sync_resp, async_resp = await self.get_both('search_api', 'search_api_async', q='galaxy', limit=5)
+        self.assertEqual(json.loads(async_resp.content), json.loads(sync_resp.content))
+        results = json.loads(async_resp.content)['results']
+        self.assertEqual(results[0]['slug'], 'galaxy-0')
+        self.assertEqual(len(results), 3)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        from . import suggest
+        suggest.reset()
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Samsung', slug='samsung')
+        self.product = Product.objects.create(name='Galaxy S24 Ultra', slug='galaxy-s24', price=100000, quantity=5, category=self.cat, brand=self.brand)
+
+    def suggest(self, q):
+        resp = self.client.get(reverse('suggest_api'), {'q': q})
+        self.assertEqual(resp.status_code, 200)
+        return [(r['type'], r['name']) for r in json.loads(resp.content)['results']]
+
+    def test_prefix_matches_any_word(self):
+        self.assertEqual(self.suggest('sa'), [('brand', 'Samsung')])
+        self.assertEqual(self.suggest('ULTRA'), [('product', 'Galaxy S24 Ultra')])
+        self.assertEqual(self.suggest('смарт'), [('category', 'Смартфоны')])
+
+    def test_incremental_updates(self):
+        self.suggest('x')
+        Product.objects.create(name='Galaxy Tab', slug='galaxy-tab', price=50000, quantity=1, category=self.cat, brand=self.brand)
+        self.assertEqual(len(self.suggest('gal')), 2)
+        self.product.status = Product.Status.DRAFT
+        self.product.save()
+        self.assertEqual(self.suggest('gal'), [('product', 'Galaxy Tab')])
+        self.cat.name = 'Телефоны'
+        self.cat.save()
+        self.assertEqual(self.suggest('смарт'), [])
+        self.assertEqual(self.suggest('тел'), [('category', 'Телефоны')])
+
+    def test_local_change_keeps_index(self):
+        from . import suggest
+        index = suggest.get_suggest_index()
+        Brand.objects.create(name='Sony', slug='sony')
+        self.assertIs(suggest.get_suggest_index(), index)
+        self.assertEqual(self.suggest('son'), [('brand', 'Sony')])
+
+    def test_change_in_another_process(self):
+        from . import fragments, suggest
+        index = suggest.get_suggest_index()
+        # update() не шлёт сигналов — как запись в другом процессе, видна только смена версии
+        Product.objects.filter(pk=self.product.pk).update(name='Pixel 9')
+        self.assertEqual(self.suggest('pix'), [])
+        fragments.bump(suggest.KIND)
+        self.assertEqual(self.suggest('pix'), [('product', 'Pixel 9')])
+        self.assertIsNot(suggest.get_suggest_index(), index)
+
+    def test_short_prefix_keeps_categories_and_brands(self):
+        from .suggest import SuggestIndex
+        index = SuggestIndex()
+        # Ключи товаров «sa 0»… идут раньше «samsung» и «satellite»
+        index.load([('product', i, f'Sa {i}', f'sa-{i}') for i in range(200)]
+                   + [('brand', 1, 'Samsung', 'samsung'), ('category', 1, 'Satellite', 'satellite')])
+        results = index.suggest('sa', limit=5)
+        self.assertEqual([kind for kind, _, _ in results], ['category', 'brand', 'product', 'product', 'product'])
+
+    def test_suggest_during_concurrent_updates(self):
+        import threading
+        from .suggest import SuggestIndex
+        index = SuggestIndex()
+        index.load([('product', i, f'Galaxy {i}', f'g-{i}') for i in range(500)])
+        errors = []
+
+        def write():
+            for i in range(2000):
+                index.upsert('product', i % 500, f'Galaxy {i}', f'g-{i}')
+
+        def read():
+            try:
+                for _ in range(500):
+                    for kind, name, slug in index.suggest('gal'):
+                        self.assertTrue(name.startswith('Galaxy'))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        from . import fragments
+        self.fragments = fragments
+        fragments.stats.reset()
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Samsung', slug='samsung')
+        self.tag = Tag.objects.create(name='Хит', slug='hit')
+        self.product = Product.objects.create(name='Galaxy', slug='galaxy', price=80000, quantity=3, category=self.cat, brand=self.brand)
+
+    def render(self, **params):
+        resp = self.client.get(reverse('product_list'), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.content.decode()
+
+    def test_fragments_reused_until_models_change(self):
+        first = self.render()
+        self.assertEqual(self.render(), first)
+        stats = self.fragments.stats.snapshot()
+        self.assertEqual((stats['card']['hits'], stats['card']['misses']), (1, 1))
+        self.assertEqual((stats['sidebar']['hits'], stats['sidebar']['misses']), (1, 1))
+
+        self.product.price = 70000
+        self.product.save()
+        self.assertIn('70000', self.render())
+        self.brand.name = 'Samsung Electronics'
+        self.brand.save()
+        self.assertIn('Samsung Electronics</p>', self.render())
+        self.product.tags.add(self.tag)
+        self.assertIn('#Хит', self.render())
+
+    def test_sidebar_keyed_by_filter_set(self):
+        self.render(categories='smartphones')
+        self.render(category='smartphones')
+        self.assertEqual(self.fragments.stats.snapshot()['sidebar']['hits'], 1)
+        self.assertNotIn('has-active', self.render())
+
+    def test_stats_endpoint_requires_staff(self):
+        url = reverse('fragment_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.render()
+        data = json.loads(self.client.get(url).content)
+        self.assertEqual(data['fragments']['card']['misses'], 1)
+
+
+class NavigationCacheTests(TestCase):
+    def setUp(self):
+        from . import navigation
+        self.navigation = navigation
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.tag = Tag.objects.create(name='Хит', slug='hit')
+
+    def test_lists_cached_until_category_or_tag_changes(self):
+        self.navigation.get_categories()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.navigation.get_categories(), [self.cat])
+            self.assertEqual(self.navigation.get_tags(), [self.tag])
+
+        self.cat.name = 'Телефоны'
+        self.cat.save()
+        self.assertEqual(self.navigation.get_categories()[0].name, 'Телефоны')
+        Tag.objects.create(name='Новинка', slug='new')
+        self.assertEqual(len(self.navigation.get_tags()), 2)
+        self.tag.delete()
+        self.assertEqual([t.slug for t in self.navigation.get_tags()], ['new'])
+
+    def test_version_bumped_by_another_process(self):
+        import subprocess
+        import sys
+        from django.conf import settings
+        cached = self.navigation.get_navigation()
+        # Другой процесс: его сигналы здесь не срабатывают, видна только версия в общем кэше
+        subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'shell', '-c',
+             'from catalog import navigation; navigation.invalidate()'],
+            check=True, capture_output=True,
+        )
+        self.assertIsNot(self.navigation.get_navigation(), cached)
+
+    def test_process_local_version_cache_warning(self):
+        from .checks import check_version_cache
+        self.assertEqual(check_version_cache(None), [])
+        with override_settings(CATALOG_VERSION_CACHE='default'):
+            self.assertEqual([w.id for w in check_version_cache(None)], ['catalog.W001'])
+
+    def test_menu_rendered_without_queries(self):
+        self.client.get(reverse('category_list'))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('category_list'))
+        self.assertContains(resp, 'Смартфоны')
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Apple', slug='apple')
+        self.p1 = Product.objects.create(name='iPhone', slug='iphone', price=Decimal('999.99'), quantity=5, category=self.cat, brand=self.brand)
+        self.p2 = Product.objects.create(name='iPad', slug='ipad', price=Decimal('450.00'), old_price=Decimal('500.00'), quantity=5, category=self.cat, brand=self.brand)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def prices(self):
+        return list(Product.objects.order_by('id').values_list('price', 'old_price'))
+
+    def test_operations_are_single_statements(self):
+        from . import pricing
+        products = Product.objects.all()
+        change = pricing.build_change('percent_discount', '12.5')
+        with self.assertNumQueries(1):
+            stats = pricing.preview(products, change)
+        self.assertEqual((stats['matched'], stats['changed']), (2, 2))
+        self.assertEqual(stats['new_total'], Decimal('874.99') + Decimal('437.50'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(pricing.apply(products, change), 2)
+        # Один UPDATE товаров и один — проекции витрины
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']], ['UPDATE', 'UPDATE'])
+        rows = list(ProductListing.objects.order_by('id').values_list('price', 'old_price', 'discount_percent'))
+        self.assertEqual([row[:2] for row in rows], self.prices())
+        self.assertAlmostEqual(rows[1][2], 12.5)
+        # Повторная скидка считается от old_price, а не сверху предыдущей
+        pricing.apply(products, change)
+        self.assertEqual(self.prices(), [(Decimal('874.99'), Decimal('999.99')), (Decimal('437.50'), Decimal('500.00'))])
+        pricing.apply(products, pricing.build_change('revert_discount'))
+        self.assertEqual(self.prices(), [(Decimal('999.99'), None), (Decimal('500.00'), None)])
+        pricing.apply(products, pricing.build_change('fixed_discount', 600))
+        self.assertEqual(self.prices(), [(Decimal('399.99'), Decimal('999.99')), (Decimal('500.00'), None)])
+        pricing.apply(products, pricing.build_change('round', 100))
+        self.assertEqual(self.prices(), [(Decimal('400.00'), Decimal('999.99')), (Decimal('500.00'), None)])
+        with self.assertRaises(ValueError):
+            pricing.build_change('percent_discount', 100)
+
+    def test_revert_discount_skips_old_price_below_price(self):
+        from . import pricing
+        # Цену подняли, а old_price остался прежним — это не скидка
+        Product.objects.filter(pk=self.p1.pk).update(old_price=Decimal('899.99'))
+        products = Product.objects.all()
+        change = pricing.build_change('revert_discount')
+        self.assertEqual(pricing.preview(products, change)['affected'], 1)
+        self.assertEqual(pricing.apply(products, change), 1)
+        self.assertEqual(self.prices(), [(Decimal('999.99'), Decimal('899.99')), (Decimal('500.00'), None)])
+
+    def test_admin_actions(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:catalog_product_changelist')
+        data = {'action': 'apply_percent_discount', '_selected_action': [self.p1.pk], 'pricing_value': '10', 'dry_run': 'on'}
+        self.client.post(url, data)
+        self.assertEqual(self.prices()[0], (Decimal('999.99'), None))
+        del data['dry_run']
+        self.client.post(url, data)
+        self.assertEqual(self.prices()[0], (Decimal('899.99'), Decimal('999.99')))
+        resp = self.client.post(reverse('admin:product_update_discount', args=[self.p2.pk]), {'percent': 0})
+        self.assertEqual(json.loads(resp.content)['price'], '500.00')
+
+    def test_pricing_api(self):
+        url = reverse('product_pricing_api')
+        body = {'operation': 'percent_discount', 'value': 50, 'filter': {'ids': [self.p2.pk]}, 'dry_run': True}
+        self.assertEqual(self.client.post(url, json.dumps(body), content_type='application/json').status_code, 403)
+        self.client.force_login(self.admin)
+        data = json.loads(self.client.post(url, json.dumps(body), content_type='application/json').content)
+        self.assertEqual((data['matched'], data['new_total']), (1, '250.00'))
+        body['dry_run'] = False
+        data = json.loads(self.client.post(url, json.dumps(body), content_type='application/json').content)
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(self.prices()[1], (Decimal('250.00'), Decimal('500.00')))
+        body['operation'] = 'double'
+        self.assertEqual(self.client.post(url, json.dumps(body), content_type='application/json').status_code, 400)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        import shutil, tempfile
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=media, CATALOG_THUMBNAIL_WORKERS=0)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Apple', slug='apple')
+
+    def upload(self, size=(1200, 800), fmt='JPEG', ext='.jpg'):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='iPhone', slug='iphone', price=100000, quantity=5, category=self.cat, brand=self.brand,
+                image=SimpleUploadedFile(f'photo{ext}', buffer.getvalue()),
+            )
+        product.refresh_from_db()
+        return product
+
+    def test_variants_generated_after_upload(self):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+        from .thumbnails import variant_name
+        product = self.upload()
+        name = product.image.name
+        self.assertEqual(product.image_variants, {'source': name, 'width': 1200, 'height': 800, 'widths': [240, 480, 960], 'ext': '.jpg'})
+        for width in (240, 480, 960):
+            for ext in ('.jpg', '.webp'):
+                with default_storage.open(variant_name(name, width, ext)) as f:
+                    self.assertEqual(Image.open(f).size, (width, width * 2 // 3))
+        self.assertTrue(default_storage.exists(variant_name(name, ext='.webp')))
+
+    def test_small_image_is_not_upscaled(self):
+        product = self.upload(size=(300, 300), fmt='PNG', ext='.png')
+        self.assertEqual((product.image_variants['widths'], product.image_variants['ext']), ([240], '.png'))
+
+    def test_srcset_in_templates(self):
+        product = self.upload()
+        stem = product.image.name[:-4]
+        for url in (reverse('product_list'), product.get_absolute_url()):
+            content = self.client.get(url).content.decode()
+            self.assertIn(f'<source type="image/webp" srcset="/media/{stem}_w240.webp 240w', content)
+            self.assertIn(f'/media/{stem}_w960.jpg 960w, /media/{stem}.jpg 1200w', content)
+        # Пока копии не готовы — обычный <img> с оригиналом
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        content = self.client.get(product.get_absolute_url()).content.decode()
+        self.assertNotIn('srcset', content)
+        self.assertIn(f'/media/{stem}.jpg', content)
+
+    def test_backfill_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        product = self.upload()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        out = StringIO()
+        call_command('backfill_thumbnails', '--threads', '--workers=2', stdout=out)
+        self.assertIn('Обработано изображений: 1', out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['widths'], [240, 480, 960])
+        call_command('backfill_thumbnails', stdout=out)
+        self.assertIn('уже обработаны', out.getvalue())
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        import shutil, tempfile
+        from techmarket.storage import ContentAddressedStorage
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.root)
+
+    def save(self, name, content):
+        from django.core.files.base import ContentFile
+        return self.storage.save(name, ContentFile(content))
+
+    def test_same_content_is_stored_once(self):
+        import hashlib, os
+        a = self.save('products/a.jpg', b'image')
+        b = self.save('products/b.jpg', b'image')
+        c = self.save('products/c.jpg', b'other')
+        self.assertEqual(os.stat(self.storage.path(a)).st_ino, os.stat(self.storage.path(b)).st_ino)
+        self.assertNotEqual(os.stat(self.storage.path(a)).st_ino, os.stat(self.storage.path(c)).st_ino)
+        self.assertEqual((self.storage.refcount(a), self.storage.refcount(c)), (2, 1))
+        with self.storage.open(b) as f:
+            self.assertEqual(f.read(), b'image')
+        self.assertEqual(self.storage.listdir('')[0], ['products'])
+        # Имя занято — как в FileSystemStorage, выбирается другое
+        a2 = self.save('products/a.jpg', b'image')
+        self.assertNotEqual(a2, a)
+
+        blob = self.storage.blob_path(hashlib.sha256(b'image').hexdigest())
+        for name in (a, b, a2):
+            self.assertTrue(os.path.exists(blob))
+            self.storage.delete(name)
+        self.assertFalse(os.path.exists(blob))
+        self.assertTrue(self.storage.exists(c))
+
+    def test_dedupe_media_command(self):
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        os.makedirs(os.path.join(self.root, 'uploads'))
+        for name in ('uploads/one.bin', 'uploads/two.bin', 'uploads/three.bin'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(b'x' * 2048 if name != 'uploads/three.bin' else b'y')
+        out = StringIO()
+        with override_settings(MEDIA_ROOT=self.root):
+            call_command('dedupe_media', '--dry-run', stdout=out)
+            self.assertIn('разного содержимого: 2, освободится: 2,0', out.getvalue())
+            call_command('dedupe_media', stdout=out)
+            self.assertIn('освобождено: 2,0', out.getvalue())
+            call_command('dedupe_media', stdout=out)
+            self.assertIn('освобождено: 0', out.getvalue())
+        one, two = (os.stat(os.path.join(self.root, 'uploads', n)) for n in ('one.bin', 'two.bin'))
+        self.assertEqual(one.st_ino, two.st_ino)
+
+
+class DatabaseProfileTests(TestCase):
+    def config(self, **env):
+        from pathlib import Path
+        from techmarket.db import database_config
+        return database_config(Path('/srv'), env)
+
+    def test_default_profile_keeps_plain_sqlite(self):
+        config = self.config()
+        self.assertEqual(str(config['NAME']), '/srv/db.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertNotIn('OPTIONS', config)
+
+    def test_sqlite_wal_profile(self):
+        config = self.config(DB_PROFILE='sqlite-wal', SQLITE_PATH='/tmp/x.sqlite3', SQLITE_BUSY_TIMEOUT='2000')
+        self.assertEqual(config['NAME'], '/tmp/x.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=2000', config['OPTIONS']['init_command'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(config['OPTIONS']['timeout'], 2)
+
+    def test_postgres_profile(self):
+        config = self.config(DB_PROFILE='postgres', DATABASE_URL='postgres://shop:p%40ss@db:5433/market')
+        self.assertEqual(
+            (config['NAME'], config['USER'], config['PASSWORD'], config['HOST'], config['PORT']),
+            ('market', 'shop', 'p@ss', 'db', '5433'),
+        )
+        # С пулом Django требует CONN_MAX_AGE = 0
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 10)
+        config = self.config(DB_PROFILE='postgres', PG_POOL='0', DB_CONN_MAX_AGE='30')
+        self.assertEqual((config['HOST'], config['CONN_MAX_AGE']), ('localhost', 30))
+        self.assertNotIn('OPTIONS', config)
+
+    def test_replicas(self):
+        from pathlib import Path
+        from techmarket.db import databases_config
+        databases = databases_config(Path('/srv'), {'DB_PROFILE': 'sqlite-wal', 'SQLITE_REPLICA_PATHS': '/r1.sqlite3, /r2.sqlite3'})
+        self.assertEqual(list(databases), ['default', 'replica1', 'replica2'])
+        self.assertEqual(databases['replica2']['NAME'], '/r2.sqlite3')
+        self.assertEqual(databases['replica1']['OPTIONS'], databases['default']['OPTIONS'])
+        self.assertEqual(databases['replica1']['TEST'], {'MIRROR': 'default'})
+        databases = databases_config(Path('/srv'), {'DB_PROFILE': 'postgres', 'DATABASE_REPLICA_URLS': 'postgres://u@replica/market'})
+        self.assertEqual((databases['replica1']['HOST'], databases['replica1']['NAME']), ('replica', 'market'))
+
+    def test_unknown_profile(self):
+        from django.core.exceptions import ImproperlyConfigured
+        with self.assertRaises(ImproperlyConfigured):
+            self.config(DB_PROFILE='mysql')
+
+
+@override_settings(DATABASE_REPLICAS=['test_replica'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        from techmarket.routers import ReplicaRouter
+        self.router = ReplicaRouter()
+
+    def test_catalog_reads_go_to_replica_until_a_write(self):
+        from techmarket.routers import primary, routing
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        with routing():
+            self.assertEqual(self.router.db_for_read(Product), 'test_replica')
+            self.assertEqual(self.router.db_for_read(Category), 'test_replica')
+            self.assertEqual(self.router.db_for_read(Order), 'default')
+            with primary():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+            self.assertEqual(self.router.db_for_read(Product), 'test_replica')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertFalse(self.router.allow_migrate('test_replica', 'catalog'))
+        self.assertTrue(self.router.allow_migrate('default', 'catalog'))
+
+    def test_middleware_pins_requests(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from techmarket.routers import PIN_COOKIE, ReplicaPinningMiddleware
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Product))
+            if request.GET.get('write'):
+                self.router.db_for_write(Product)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get('/catalog/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        middleware(factory.post('/catalog/'))
+        middleware(factory.get('/admin/catalog/product/'))
+        request = factory.get('/catalog/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['test_replica', 'default', 'default', 'default'])
+        response = middleware(factory.get('/catalog/', {'write': '1'}))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_middleware_keeps_state_for_streaming(self):
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory
+        from techmarket.routers import ReplicaPinningMiddleware
+
+        def view(request):
+            # База читается при итерации, уже после выхода из middleware
+            return StreamingHttpResponse(self.router.db_for_read(Product) for _ in range(2))
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get('/catalog/'))
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(b''.join(response.streaming_content), b'test_replicatest_replica')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+
+class ReplicaSyncTests(TransactionTestCase):
+    """Две базы SQLite: тестовая основная и файл реплики, обновляемый sync_replicas."""
+
+    def setUp(self):
+        import copy, tempfile
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        # Соединение без записи в DATABASES — тестовый раннер не создаёт для него базу
+        settings_dict = {**copy.deepcopy(connections['default'].settings_dict), 'NAME': path}
+        connections['test_replica'] = DatabaseWrapper(settings_dict, alias='test_replica')
+
+        def drop_replica():
+            connections['test_replica'].close()
+            del connections['test_replica']
+        self.addCleanup(drop_replica)
+
+    @override_settings(DATABASE_REPLICAS=['test_replica'])
+    def test_replica_lags_until_sync_and_writer_reads_primary(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from techmarket.routers import routing
+        category = Category.objects.create(name='Смартфоны', slug='smartphones')
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        product = Product.objects.create(name='iPhone', slug='iphone', price=100, quantity=1, category=category, brand=brand)
+        call_command('sync_replicas', stdout=StringIO())
+        Product.objects.filter(pk=product.pk).update(price=200)
+
+        with routing():
+            self.assertEqual(Product.objects.get(pk=product.pk).price, 100)
+        with routing() as state:
+            replica_product = Product.objects.select_related('category').get(pk=product.pk)
+            self.assertEqual(replica_product._state.db, 'test_replica')
+            replica_product.price = 300
+            replica_product.save()
+            self.assertTrue(state.wrote)
+            self.assertEqual(Product.objects.get(pk=product.pk).price, 300)
+        self.assertEqual(Product.objects.using('test_replica').get(pk=product.pk).price, 100)
+        call_command('sync_replicas', stdout=StringIO())
+        with routing():
+            self.assertEqual(Product.objects.get(pk=product.pk).price, 300)
+
+
+class ProductListingTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brand = Brand.objects.create(name='Apple', slug='apple')
+        self.tag = Tag.objects.create(name='Хит', slug='hit')
+        self.product = Product.objects.create(
+            name='iPhone', slug='iphone', price=900, old_price=1000, quantity=5, category=self.cat, brand=self.brand,
+        )
+        self.product.tags.add(self.tag)
+
+    def row(self):
+        return ProductListing.objects.filter(pk=self.product.pk).first()
+
+    def test_row_follows_product(self):
+        row = self.row()
+        self.assertEqual((row.brand_name, row.category_slug, row.tag_slugs), ('Apple', 'smartphones', ['hit']))
+        self.assertAlmostEqual(row.discount_percent, 10.0)
+        self.product.status = Product.Status.DRAFT
+        self.product.save()
+        self.assertIsNone(self.row())
+        self.product.status = Product.Status.PUBLISHED
+        self.product.save()
+        self.assertIsNotNone(self.row())
+        self.product.delete()
+        self.assertFalse(ProductListing.objects.exists())
+
+    def test_related_changes(self):
+        self.brand.name = 'Apple Inc.'
+        self.brand.save()
+        self.tag.slug = 'top'
+        self.tag.save()
+        self.assertEqual((self.row().brand_name, self.row().tag_slugs), ('Apple Inc.', ['top']))
+        self.tag.products.clear()
+        self.assertEqual(self.row().tag_slugs, [])
+        self.tag.products.add(self.product)
+        self.tag.delete()
+        self.assertEqual(self.row().tag_slugs, [])
+
+    def test_bulk_changes_and_rebuild(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .signals import invalidate_bulk_changes
+        Product.objects.update(is_available=False)
+        self.assertIsNotNone(self.row())
+        invalidate_bulk_changes([self.product.pk])
+        self.assertIsNone(self.row())
+        Product.objects.update(is_available=True)
+        call_command('rebuild_listing', stdout=StringIO())
+        self.assertEqual(self.row().tag_slugs, ['hit'])
+
+    def test_list_reads_listing_only(self):
+        with CaptureQueriesContext(connection) as ctx:
+            body = json.loads(self.client.get(reverse('product_list_api')).content)
+        self.assertEqual(body['results'][0]['brand__name'], 'Apple')
+        self.assertTrue(body['results'][0]['is_available'])
+        listing_queries = [q['sql'] for q in ctx.captured_queries if 'catalog_productlisting' in q['sql']]
+        self.assertEqual(len(listing_queries), 2)
+        self.assertFalse([sql for sql in listing_queries if 'JOIN' in sql])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        phones = Category.objects.create(name='Смартфоны', slug='smartphones')
+        cases = Category.objects.create(name='Чехлы', slug='cases')
+        apple = Brand.objects.create(name='Apple', slug='apple')
+        other = Brand.objects.create(name='Other', slug='other')
+        hit = Tag.objects.create(name='Хит', slug='hit')
+        make = lambda slug, price, category=phones, brand=apple: Product.objects.create(
+            name=slug, slug=slug, price=price, quantity=1, category=category, brand=brand,
+        )
+        self.phone = make('phone', 1000)
+        self.twin = make('twin', 1100)
+        self.cheap = make('cheap', 100, brand=other)
+        self.case = make('case', 50, category=cases, brand=other)
+        self.phone.tags.add(hit)
+        self.twin.tags.add(hit)
+        order = Order.objects.create(code='ORD-REC-1')
+        OrderItem.objects.create(order=order, product=self.phone, price=1000)
+        OrderItem.objects.create(order=order, product=self.case, price=50)
+
+    def ranked(self, product):
+        return list(product.recommendations.values_list('recommended__slug', flat=True))
+
+    def test_build_ranks_neighbours(self):
+        from . import recommendations
+        self.assertEqual(recommendations.build(use_numpy=False), 4)
+        # Другая категория попадает только через совместную покупку
+        self.assertEqual(self.ranked(self.phone), ['twin', 'case', 'cheap'])
+        self.assertEqual(self.ranked(self.twin), ['phone', 'cheap'])
+        resp = self.client.get(reverse('product_detail', args=['phone']))
+        self.assertEqual([p.slug for p in resp.context['similar_products']], ['twin', 'case', 'cheap'])
+
+    def test_numpy_matches_python(self):
+        from . import recommendations
+        if recommendations.numpy is None:
+            self.skipTest('NumPy не установлен')
+        data = recommendations.CatalogData()
+        rows = range(len(data.ids))
+        self.assertEqual(
+            list(recommendations.compute(data, rows, use_numpy=True)),
+            list(recommendations.compute(data, rows, use_numpy=False)),
+        )
+
+    def test_incremental(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from . import recommendations
+        call_command('build_recommendations', '--no-numpy', stdout=StringIO())
+        self.assertEqual(recommendations.stale_ids(), set())
+        self.cheap.is_available = False
+        self.cheap.save()
+        self.assertEqual(recommendations.stale_ids(), {self.phone.pk, self.twin.pk, self.cheap.pk})
+        call_command('build_recommendations', '--changed', '--no-numpy', stdout=StringIO())
+        self.assertEqual(self.ranked(self.twin), ['phone'])
+        self.assertEqual(self.ranked(self.cheap), [])
+        self.assertEqual(recommendations.stale_ids(), set())
+
+
+class CatalogIndexTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        brand = Brand.objects.create(name='Apple', slug='apple')
+        tag = Tag.objects.create(name='Хит', slug='hit')
+        for i in range(5):
+            Product.objects.create(name=f'Телефон {i}', slug=f'phone-{i}', price=1000 + i, quantity=1, category=cat, brand=brand).tags.add(tag)
+
+    def test_explain_catalog_uses_partial_indexes(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        out = StringIO()
+        call_command('explain_catalog', '--repeat=1', stdout=out)
+        output = out.getvalue()
+        self.assertIn('category_price', output)
+        self.assertIn('Запросов: 11', output)
+        if connection.vendor == 'sqlite':
+            self.assertIn('listing_cat_price_idx', output)
+            self.assertIn('product_pub_cat_created_idx', output)
+            self.assertIn('catalog_product_tags_tag_product_idx', output)
+
+    def test_explain_catalog_unknown_query(self):
+        from django.core.management import CommandError, call_command
+        with self.assertRaises(CommandError):
+            call_command('explain_catalog', 'nope')
+
+
+class PerfMiddlewareTests(TestCase):
+    def setUp(self):
+        from . import perf
+        self.perf = perf
+        perf.recorder.reset()
+        cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        brand = Brand.objects.create(name='Samsung', slug='samsung')
+        Product.objects.create(name='Galaxy', slug='galaxy', price=80000, quantity=3, category=cat, brand=brand)
+
+    def test_server_timing_header(self):
+        resp = self.client.get(reverse('product_list'))
+        names = [part.split(';')[0] for part in resp['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['total', 'db', 'tpl'])
+        self.assertRegex(resp['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        samples = self.perf.recorder.routes['product_list']
+        self.assertEqual(len(samples), 1)
+        self.assertGreater(samples[0]['queries'], 0)
+        self.assertGreater(samples[0]['template_ms'], 0)
+        self.assertEqual(samples[0]['bytes'], len(resp.content))
+
+    @override_settings(CATALOG_PERF_SAMPLE_RATE=0)
+    def test_sampling_keeps_header(self):
+        resp = self.client.get(reverse('product_list_api'))
+        self.assertIn('Server-Timing', resp)
+        self.assertEqual(self.perf.recorder.routes, {})
+
+    def test_percentiles(self):
+        percentile = self.perf.percentile
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, q) for q in (0.50, 0.95, 0.99)], [50, 95, 99])
+        self.assertEqual(percentile(list(range(1, 8)), 0.5), 4)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+        self.assertEqual(percentile([], 0.5, 0.0), 0.0)
+
+    def test_stats_endpoint_requires_staff(self):
+        url = reverse('perf_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        for _ in range(3):
+            self.client.get(reverse('product_list_api'))
+        self.client.get(reverse('admin:catalog_product_changelist'))
+        routes = json.loads(self.client.get(url).content)['routes']
+        self.assertEqual(routes['product_list_api']['count'], 3)
+        self.assertEqual(set(routes['product_list_api']['total_ms']), {'p50', 'p95', 'p99'})
+        self.assertIn('admin:catalog_product_changelist', routes)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
+        self.brands = [Brand.objects.create(name=f'Brand {i}', slug=f'brand-{i}') for i in range(3)]
+        self.tags = [Tag.objects.create(name=f'Tag {i}', slug=f'tag-{i}') for i in range(2)]
+        for i in range(6):
+            p = Product.objects.create(name=f'Phone {i}', slug=f'phone-{i}', price=1000 + i, quantity=1, category=self.cat, brand=self.brands[i % 3])
+            p.tags.set(self.tags)
+        ProductDetail.objects.create(product=p, sku='SKU-1')
+        for i in range(3):
+            order = Order.objects.create(code=f'ORD-{i}')
+            OrderItem.objects.create(order=order, product=p, quantity=2, price=p.price)
+            OrderItem.objects.create(order=order, product=p, quantity=1, price=p.price)
+        self.order = order
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        from .recommendations import build
+        build()
+
+    def assertPageWithinBudget(self, url_name, url, **params):
+        self.client.get(url, params)
+        with self.assertQueryBudget(url_name):
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_catalog_pages(self):
+        self.assertPageWithinBudget('product_list', reverse('product_list'))
+        self.assertPageWithinBudget('product_list', reverse('product_list'), tag='tag-1', search='phone')
+        self.assertPageWithinBudget('product_detail', reverse('product_detail', args=['phone-5']))
+        self.assertPageWithinBudget('category_detail', reverse('category_detail', args=['smartphones']))
+        self.assertPageWithinBudget('category_list', reverse('category_list'))
+
+    def test_catalog_api(self):
+        self.assertPageWithinBudget('product_list_api', reverse('product_list_api'))
+        self.assertPageWithinBudget('product_detail_api', reverse('product_detail_api', args=[self.order.items.first().product_id]))
+        self.assertPageWithinBudget('suggest_api', reverse('suggest_api'), q='pho')
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assertPageWithinBudget('admin:catalog_order_changelist', reverse('admin:catalog_order_changelist'))
+        self.assertPageWithinBudget('admin:catalog_order_change', reverse('admin:catalog_order_change', args=[self.order.pk]))
+        self.assertPageWithinBudget('admin:catalog_product_changelist', reverse('admin:catalog_product_changelist'))
+
+
+class BenchmarkRegressionTests(TestCase):
+    def result(self, rps=100.0, p50=10.0, p99=30.0, queries=3, peak_kb=500.0):
+        timing = {'rps': rps, 'p50_ms': p50, 'p99_ms': p99, 'errors': 0}
+        return {'sizes': {'1000': {'list': {
+            'queries': queries, 'peak_kb': peak_kb, 'inprocess': timing, 'http': dict(timing),
+        }}}}
+
+    def test_within_threshold(self):
+        from .loadtest import regressions
+        self.assertEqual(regressions(self.result(), self.result(rps=85.0, p50=12.0, peak_kb=600.0), 0.25), [])
+
+    def test_regressions_reported(self):
+        from .loadtest import regressions
+        found = regressions(self.result(), self.result(rps=60.0, p99=50.0, queries=4), 0.25)
+        self.assertEqual(len(found), 5)
+        self.assertIn('1000/list: SQL-запросов 3 → 4', found)
+        self.assertTrue(any(line.startswith('1000/list http: rps') for line in found))
+
+    def test_missing_entries_skipped(self):
+        from .loadtest import regressions
+        self.assertEqual(regressions(self.result(), {'sizes': {}}, 0.25), [])
+
+
+class FillDatabaseTests(TestCase):
+    def test_scale_generation_is_idempotent_for_base_data(self):
+        from io import StringIO
+        from django.core.management import call_command
+        call_command('fill_database', scale=200, seed=1, batch_size=64, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 250)
+        self.assertEqual(ProductDetail.objects.count(), 250)
+        self.assertEqual(Order.objects.count(), 23)
+        self.assertTrue(OrderItem.objects.filter(order__code__startswith='G1-').exists())
+        from .orders import drifted_orders
+        self.assertFalse(drifted_orders().exists())
+        self.assertTrue(Order.objects.filter(code='ORD-0001', items_count=5).exists())
+        self.assertEqual(Tag.objects.filter(slug='hit').count(), 1)
+        call_command('fill_database', stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 250)
+        self.assertEqual(Order.objects.count(), 23)
+
+
 class OrderTests(TestCase):
     def setUp(self):
         self.cat = Category.objects.create(name='Смартфоны', slug='smartphones')
@@ -100,6 +1211,53 @@ class OrderTests(TestCase):
         total = self.order.items.aggregate(total=Sum(F('quantity') * F('price')))
         self.assertEqual(int(total['total']), 200000)
 
+    def assertTotals(self, items_count, total):
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_count, self.order.total), (items_count, Decimal(total)))
+
+    def test_totals_follow_item_changes(self):
+        self.assertTotals(1, '200000.00')
+        item = OrderItem.objects.create(order=self.order, product=self.p, quantity=1, price=Decimal('99.99'))
+        self.assertTotals(2, '200099.99')
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 3
+        item.save()
+        item.save()
+        self.assertTotals(2, '200299.97')
+        item.delete()
+        self.assertTotals(1, '200000.00')
+        other = Order.objects.create(code='ORD-TST-2')
+        moved = self.order.items.get()
+        moved.order = other
+        moved.save()
+        self.assertTotals(0, '0.00')
+        other.refresh_from_db()
+        self.assertEqual((other.items_count, other.total), (1, Decimal('200000.00')))
+
+    def test_admin_inline_endpoints(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        item = self.order.items.get()
+        resp = self.client.post(reverse('admin:orderitem_update_inline', args=[item.pk]), {'quantity': 3})
+        self.assertEqual(json.loads(resp.content)['order_total'], '300000.00')
+        self.client.post(reverse('admin:orderitem_add_inline', args=[self.order.pk]), {'product_id': self.p.pk, 'quantity': 1})
+        self.assertTotals(2, '400000.00')
+        self.client.post(reverse('admin:orderitem_delete_inline', args=[item.pk]))
+        self.assertTotals(1, '100000.00')
+
+    def test_reconcile_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        Order.objects.filter(pk=self.order.pk).update(items_count=5, total=1)
+        out = StringIO()
+        call_command('reconcile_order_totals', dry_run=True, stdout=out)
+        self.assertIn('Расхождений: 1', out.getvalue())
+        self.assertTotals(5, '1.00')
+        call_command('reconcile_order_totals', stdout=StringIO())
+        self.assertTotals(1, '200000.00')
+        out = StringIO()
+        call_command('reconcile_order_totals', dry_run=True, stdout=out)
+        self.assertIn('Расхождений: 0', out.getvalue())
+
 from django.test import TestCase
 from django.utils.text import slugify
 from .forms import ProductForm
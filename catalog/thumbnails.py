@@ -0,0 +1,158 @@
+"""Уменьшенные копии изображений товаров.
+
+Для ``products/<uuid>.jpg`` рядом с оригиналом сохраняются
+``products/<uuid>_w240.jpg`` и ``products/<uuid>_w240.webp`` для каждой
+ширины из ``CATALOG_THUMBNAIL_WIDTHS``, меньшей исходной, и
+``products/<uuid>.webp`` в исходном размере. Что получилось, записывается в
+``Product.image_variants`` — шаблоны строят ``srcset`` без обращений к
+хранилищу.
+
+Новые изображения обрабатываются после коммита транзакции в пуле потоков
+(Pillow отпускает GIL при масштабировании и кодировании), запрос их не ждёт.
+``CATALOG_THUMBNAIL_WORKERS = 0`` — обработка сразу в текущем потоке.
+Существующие изображения — командой ``backfill_thumbnails``.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('catalog.thumbnails')
+
+DEFAULT_WIDTHS = (240, 480, 960)
+# Расширения, которые отдаются как есть; остальное (gif, bmp, webp) — как JPEG
+FALLBACK_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'CATALOG_THUMBNAIL_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def variant_name(name, width=None, ext=None):
+    root, original_ext = os.path.splitext(name)
+    suffix = f'_w{width}' if width else ''
+    return f'{root}{suffix}{ext or original_ext.lower()}'
+
+
+def _fallback_ext(name):
+    ext = os.path.splitext(name)[1].lower()
+    return ext if ext in FALLBACK_FORMATS else '.jpg'
+
+
+def _write(storage, name, image, fmt):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **SAVE_OPTIONS[fmt])
+    # Имена детерминированы: повторная генерация перезаписывает файлы
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def render_variants(name, widths=None, storage=None):
+    """Создаёт уменьшенные копии и WebP для файла ``name``; в БД не пишет.
+
+    Возвращает описание для ``Product.image_variants``.
+    """
+    storage = storage or default_storage
+    widths = widths or get_widths()
+    with storage.open(name) as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    width, height = image.size
+    ext = _fallback_ext(name)
+    done = []
+    for target in widths:
+        if target >= width:
+            break
+        resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS, reducing_gap=3.0)
+        _write(storage, variant_name(name, target, ext), resized, FALLBACK_FORMATS.get(ext, 'JPEG'))
+        _write(storage, variant_name(name, target, '.webp'), resized, 'WEBP')
+        done.append(target)
+    if os.path.splitext(name)[1].lower() != '.webp':
+        _write(storage, variant_name(name, ext='.webp'), image, 'WEBP')
+    return {'source': name, 'width': width, 'height': height, 'widths': done, 'ext': ext}
+
+
+def save_variants(pk, variants):
+    """Сохраняет описание копий, если изображение товара за это время не сменилось.
+
+    ``updated`` меняется, чтобы сбросить кэш карточки и ETag страниц.
+    """
+    from . import listing
+    from .models import Product
+
+    updated = Product.objects.filter(pk=pk, image=variants['source']).update(image_variants=variants, updated=Now())
+    if updated:
+        listing.refresh([pk])
+    return updated
+
+
+def srcsets(image, variants):
+    """``(srcset оригинального формата, srcset WebP)`` или ``None``, если копий ещё нет."""
+    if not image or not variants or variants.get('source') != image.name:
+        return None
+    storage = image.storage
+    name, ext = image.name, variants['ext']
+    fallback = [f'{storage.url(variant_name(name, w, ext))} {w}w' for w in variants['widths']]
+    webp = [f'{storage.url(variant_name(name, w, ".webp"))} {w}w' for w in variants['widths']]
+    fallback.append(f'{image.url} {variants["width"]}w')
+    webp_original = image.url if os.path.splitext(name)[1].lower() == '.webp' else storage.url(variant_name(name, ext='.webp'))
+    webp.append(f'{webp_original} {variants["width"]}w')
+    return ', '.join(fallback), ', '.join(webp)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CATALOG_THUMBNAIL_WORKERS', 2),
+                    thread_name_prefix='thumbnails',
+                )
+    return _executor
+
+
+def _done(pk, name, future):
+    try:
+        save_variants(pk, future.result())
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+    finally:
+        # Соединение открыто в потоке пула, а не в потоке запроса
+        connection.close()
+
+
+def schedule(pk, name):
+    """Ставит генерацию копий в очередь пула (или выполняет сразу при 0 потоков)."""
+    if getattr(settings, 'CATALOG_THUMBNAIL_WORKERS', 2) == 0:
+        try:
+            save_variants(pk, render_variants(name))
+        except Exception:
+            logger.exception('Не удалось создать копии изображения %s', name)
+        return None
+    future = get_executor().submit(render_variants, name)
+    future.add_done_callback(lambda f: _done(pk, name, f))
+    return future
@@ -1,5 +1,5 @@
 from django.urls import path, register_converter
-from . import views, converters
+from . import async_views, views, converters
 
 register_converter(converters.PriceRangeConverter, 'price_range')
 register_converter(converters.StatusConverter, 'order_status')
@@ -20,5 +20,15 @@ urlpatterns = [
     path('category/<slug:category_slug>/', views.CategoryDetailView.as_view(), name='category_detail'),
     path('orm-examples/', views.OrmExamplesView.as_view(), name='orm_examples'),
     path('api/products/', views.product_list_api, name='product_list_api'),
+    path('api/products/batch/', views.product_batch_api, name='product_batch_api'),
+    path('api/products/pricing/', views.product_pricing_api, name='product_pricing_api'),
     path('api/products/<int:product_id>/', views.product_detail_api, name='product_detail_api'),
+    path('api/suggest/', views.suggest_api, name='suggest_api'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/async/products/', async_views.product_list_api, name='product_list_api_async'),
+    path('api/async/products/<int:product_id>/', async_views.product_detail_api, name='product_detail_api_async'),
+    path('api/async/suggest/', async_views.suggest_api, name='suggest_api_async'),
+    path('api/async/search/', async_views.search_api, name='search_api_async'),
+    path('api/cache/fragments/', views.fragment_cache_stats, name='fragment_cache_stats'),
+    path('_perf/', views.perf_stats, name='perf_stats'),
 ]
@@ -1,25 +1,47 @@
+from django.conf import settings
 from django.http import HttpResponse, Http404, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
-from django.db.models import Q, Avg, Count, Sum, F, Value, FloatField, Case, When, CharField
+from django.db.models import Avg, Count, Sum, F, Value, FloatField, Case, When, CharField
 from django.core.paginator import Paginator, EmptyPage
 from django.utils.text import slugify
-from .models import Product, Category, Brand, Tag
+from .models import Product, ProductListing, Category, Brand, Tag
 from .forms import ProductForm
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView, FormView, CreateView, UpdateView, DeleteView
 from .mixins import DataMixin
+from .conditional import ConditionalGetMixin, conditional, list_validators, object_validators
+from .facets import get_facet_index
+from . import fragments, listing, perf, recommendations
+from .pagination import InvalidCursor, keyset_paginate
+from . import pricing
+from .batch import apply_batch
+from .search import search_ids, search_queryset
+from .suggest import get_suggest_index, suggestion_url
+from .streaming import STREAM_FORMATS, stream_products
 import json
 
-class ProductListView(DataMixin, ListView):
-    model = Product
+class ProductListView(ConditionalGetMixin, DataMixin, ListView):
+    # Плоская проекция опубликованных товаров, см. catalog.listing
+    model = ProductListing
     template_name = 'catalog/product_list.html'
     context_object_name = 'products'
     paginate_by = 10
 
+    def get_validators(self):
+        # В курсорном режиме COUNT берётся из фасетного индекса или cached_count
+        etag, last_modified, self._count = list_validators(self.get_queryset(), count=not self.is_cursor_mode())
+        return etag, last_modified
+
     def get_queryset(self):
-        qs = Product.objects.published()
+        # Вызывается и для валидаторов, и для страницы — поиск выполняем один раз
+        if not hasattr(self, '_queryset'):
+            self._queryset = self._build_queryset()
+        return self._queryset
+
+    def _build_queryset(self):
+        qs = ProductListing.objects.all()
         min_price = self.request.GET.get('min_price')
         max_price = self.request.GET.get('max_price')
         if min_price:
@@ -27,35 +49,36 @@ class ProductListView(DataMixin, ListView):
         if max_price:
             qs = qs.filter(price__lte=max_price)
         search_query = self.request.GET.get('search')
+        sort = self.request.GET.get('sort')
+        active_category_slugs, active_brand_slugs, active_tag_slugs = self.get_active_filters()
+        # Ранжированный поиск ограничен CATALOG_SEARCH_LIMIT; с фильтрами нужны все совпадения
+        ranked = bool(search_query) and not sort and not (
+            min_price or max_price or active_category_slugs or active_brand_slugs or active_tag_slugs
+        )
         if search_query:
-            qs = qs.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(brand__name__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
-        active_category_slugs = self._active_set('category', 'categories')
-        active_brand_slugs = self._active_set('brand', 'brands')
-        active_tag_slugs = self._active_set('tag', 'tags', slugify_items=True)
+            qs = search_queryset(qs, search_query, ranked=ranked)
         if active_category_slugs:
-            qs = qs.filter(category__slug__in=list(active_category_slugs))
+            qs = qs.filter(category_slug__in=list(active_category_slugs))
         if active_brand_slugs:
-            qs = qs.filter(brand__slug__in=list(active_brand_slugs))
+            qs = qs.filter(brand_slug__in=list(active_brand_slugs))
         if active_tag_slugs:
-            qs = qs.filter(tags__slug__in=list(active_tag_slugs)).distinct()
-        sort = self.request.GET.get('sort', '-created')
-        if sort in ['price', '-price', 'name', '-name', '-created']:
-            qs = qs.order_by(sort)
-        qs = qs.annotate(
-            discount_percent=Case(
-                When(old_price__gt=F('price'), then=(F('old_price') - F('price')) * 100.0 / F('old_price')),
-                default=Value(0.0),
-                output_field=FloatField()
-            ),
-            source_label=Value('Каталог', output_field=CharField())
-        )
+            tagged = Product.tags.through.objects.filter(tag__slug__in=list(active_tag_slugs))
+            qs = qs.filter(id__in=tagged.values('product_id'))
+        if not ranked:
+            sort = sort or '-created'
+            if sort in ['price', '-price', 'name', '-name', '-created']:
+                qs = qs.order_by(sort)
         return qs
 
+    def get_active_filters(self):
+        if not hasattr(self, '_active_filters'):
+            self._active_filters = (
+                self._active_set('category', 'categories'),
+                self._active_set('brand', 'brands'),
+                self._active_set('tag', 'tags', slugify_items=True),
+            )
+        return self._active_filters
+
     def _active_set(self, singular, plural, slugify_items=False):
         active = set()
         single = self.request.GET.get(singular)
@@ -82,68 +105,45 @@ class ProductListView(DataMixin, ListView):
         except Exception:
             return self.paginate_by
 
+    def is_cursor_mode(self):
+        return 'after' in self.request.GET or self.request.GET.get('pagination') == 'cursor'
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        if getattr(self, '_count', None) is not None:
+            # COUNT(*) уже посчитан вместе с валидаторами
+            paginator.count = self._count
+        return paginator
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_cursor_mode():
+            return super().paginate_queryset(queryset, page_size)
+        count = None
+        if not any(self.request.GET.get(p) for p in ('search', 'min_price', 'max_price')):
+            count = get_facet_index().count(*self.get_active_filters())
+        try:
+            self.cursor_page = keyset_paginate(
+                queryset,
+                self.request.GET.get('sort', '-created'),
+                self.request.GET.get('after'),
+                page_size,
+                count=count,
+            )
+        except InvalidCursor:
+            raise Http404('Некорректный курсор страницы')
+        return (None, None, self.cursor_page.object_list, False)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        base_products = Product.objects.published()
-        active_category_slugs = self._active_set('category', 'categories')
-        active_brand_slugs = self._active_set('brand', 'brands')
-        active_tag_slugs = self._active_set('tag', 'tags', slugify_items=True)
-        categories_counts_qs = base_products
-        if active_brand_slugs:
-            categories_counts_qs = categories_counts_qs.filter(brand__slug__in=list(active_brand_slugs))
-        if active_tag_slugs:
-            categories_counts_qs = categories_counts_qs.filter(tags__slug__in=list(active_tag_slugs)).distinct()
-        categories_counts = categories_counts_qs.values('category__slug', 'category__name').annotate(count=Count('id')).order_by('category__name')
-        brands_counts_qs = base_products
-        if active_category_slugs:
-            brands_counts_qs = brands_counts_qs.filter(category__slug__in=list(active_category_slugs))
-        if active_tag_slugs:
-            brands_counts_qs = brands_counts_qs.filter(tags__slug__in=list(active_tag_slugs)).distinct()
-        brands_counts = brands_counts_qs.values('brand__slug', 'brand__name').annotate(count=Count('id')).order_by('brand__name')
-        tags_counts_qs = base_products
-        if active_category_slugs:
-            tags_counts_qs = tags_counts_qs.filter(category__slug__in=list(active_category_slugs))
-        if active_brand_slugs:
-            tags_counts_qs = tags_counts_qs.filter(brand__slug__in=list(active_brand_slugs))
-        tags_counts = tags_counts_qs.values('tags__slug', 'tags__name').exclude(tags__slug__isnull=True).annotate(count=Count('id')).order_by('tags__name')
-        facet_categories = [
-            {
-                'slug': c['category__slug'],
-                'name': c['category__name'],
-                'count': c['count'],
-                'active': c['category__slug'] in active_category_slugs
-            }
-            for c in categories_counts
-            if c['count'] > 0
-        ]
-        facet_brands = [
-            {
-                'slug': b['brand__slug'],
-                'name': b['brand__name'],
-                'count': b['count'],
-                'active': b['brand__slug'] in active_brand_slugs
-            }
-            for b in brands_counts
-            if b['count'] > 0
-        ]
-        facet_tags = [
-            {
-                'slug': t['tags__slug'],
-                'name': t['tags__name'],
-                'count': t['count'],
-                'active': t['tags__slug'] in active_tag_slugs
-            }
-            for t in tags_counts
-            if t['count'] > 0
-        ]
+        active_category_slugs, active_brand_slugs, active_tag_slugs = self.get_active_filters()
+        facet_context = get_facet_index().facets(active_category_slugs, active_brand_slugs, active_tag_slugs)
         extras = self.get_user_context(**{
-            'facet_categories': facet_categories,
-            'facet_brands': facet_brands,
-            'facet_tags': facet_tags,
+            **facet_context,
             'active_category_slugs': list(active_category_slugs),
             'active_brand_slugs': list(active_brand_slugs),
             'active_tag_slugs': list(active_tag_slugs),
             'sort': self.request.GET.get('sort', '-created'),
+            'cursor_page': getattr(self, 'cursor_page', None),
             'title': 'Каталог товаров'
         })
         context.update(extras)
@@ -166,15 +166,20 @@ class CategoryOverviewView(DataMixin, TemplateView):
     template_name = 'catalog/category_overview.html'
 
 
-class CategoryDetailView(DataMixin, DetailView):
+class CategoryDetailView(ConditionalGetMixin, DataMixin, DetailView):
     model = Category
     template_name = 'catalog/category_detail.html'
     slug_field = 'slug'
     slug_url_kwarg = 'category_slug'
 
+    def get_validators(self):
+        products = Product.objects.published().filter(category__slug=self.kwargs[self.slug_url_kwarg])
+        etag, last_modified, _ = list_validators(products)
+        return etag, last_modified
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        products = Product.objects.published().filter(category=self.object)
+        products = Product.objects.published().filter(category=self.object).select_related('brand')
         extras = self.get_user_context(**{
             'products': products,
             'title': f'Товары категории {self.object.name}'
@@ -199,21 +204,33 @@ class StatusOrdersView(View):
         return HttpResponse(f"Заказы со статусом: {status}")
 
 
-class ProductDetailView(DataMixin, DetailView):
+class ProductDetailView(ConditionalGetMixin, DataMixin, DetailView):
     model = Product
     template_name = 'catalog/product_detail.html'
     slug_field = 'slug'
     slug_url_kwarg = 'product_slug'
 
     def get_queryset(self):
-        return Product.objects.published()
+        return Product.objects.published().select_related('brand', 'category', 'details').prefetch_related('tags')
+
+    def get_object(self, queryset=None):
+        # Один запрос и для валидаторов, и для страницы
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
+    def get_validators(self):
+        # Похожие товары меняются пересчётом рекомендаций, а не правкой товара
+        version = recommendations.get_version()
+        etag, last_modified = object_validators(self.get_object().updated, version)
+        return etag, max(last_modified, fragments.version_time(version))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
-        similar_products = Product.objects.published().filter(
-            category=product.category
-        ).exclude(id=product.id)[:4]
+        similar_products = recommendations.similar_products(product)
         savings = None
         if getattr(product, 'has_discount', False) and product.old_price is not None:
             try:
@@ -268,7 +285,9 @@ class OrmExamplesView(View):
             ),
             label=Value('ORM demo', output_field=CharField())
         ).values('name', 'discount_percent', 'label')[:5]
-        Product.objects.filter(brand__name='Apple').update(price=F('price') * 0.9)
+        apple_ids = list(apple_products.values_list('id', flat=True))
+        Product.objects.filter(id__in=apple_ids).update(price=F('price') * 0.9)
+        listing.refresh(apple_ids)
         context = {
             'total_products': all_products.count(),
             'available_count': available_products.count(),
@@ -327,17 +346,49 @@ def product_list_api(request):
         }
         return JsonResponse(data, status=201)
 
-    products = Product.objects.published().values(
-        'id', 'name', 'slug', 'price', 'old_price', 
-        'brand__name', 'category__name', 'is_available'
-    )
+    etag, last_modified, count = list_validators(ProductListing.objects.all(), count=_needs_count(request))
+    return conditional(lambda request: _product_list_get(request, count), lambda: (etag, last_modified))(request)
+
+def _is_cursor(request):
+    return 'after' in request.GET or request.GET.get('pagination') == 'cursor'
+
+def _needs_count(request):
+    """COUNT(*) нужен только постраничному списку: курсор берёт размер
+    фасетного индекса, выгрузке число не нужно"""
+    return not (request.GET.get('format') or _is_cursor(request))
+
+def _product_list_get(request, count):
+    export_format = request.GET.get('format')
+    if export_format:
+        if export_format not in STREAM_FORMATS:
+            return JsonResponse({'error': 'invalid_format'}, status=400)
+        return stream_products(ProductListing.objects.order_by('id'), export_format)
+
+    products = listing.api_values(ProductListing.objects.all())
     page = request.GET.get('page', 1)
     page_size = request.GET.get('page_size', 10)
     try:
         page_size = int(page_size)
     except Exception:
         page_size = 10
-    paginator = Paginator(list(products), page_size)
+    if _is_cursor(request):
+        try:
+            cursor_page = keyset_paginate(
+                listing.api_values(ProductListing.objects.all(), 'created'),
+                request.GET.get('sort', '-created'),
+                request.GET.get('after'),
+                max(1, page_size),
+                count=get_facet_index().size,
+            )
+        except InvalidCursor:
+            return JsonResponse({'error': 'invalid_cursor'}, status=400)
+        return JsonResponse({
+            'results': cursor_page.object_list,
+            'next': cursor_page.next_cursor,
+            'count': cursor_page.count,
+        })
+    paginator = Paginator(products, page_size)
+    paginator.count = count
     try:
         page_obj = paginator.get_page(page)
     except EmptyPage:
@@ -349,11 +400,131 @@ def product_list_api(request):
         'count': paginator.count
     })
 
+def product_batch_api(request):
+    """Пакетное создание, изменение и удаление товаров.
+
+    Тело запроса: ``{"operations": [{"op": "create", ...}, {"op": "update", "id": 1, ...},
+    {"op": "delete", "id": 2}], "atomic": false}``. Ответ — результат по каждой операции.
+    Только для персонала.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'method_not_allowed'}, status=405)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'error': 'invalid_json'}, status=400)
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list):
+        return JsonResponse({'error': 'missing_fields'}, status=400)
+    limit = getattr(settings, 'CATALOG_BATCH_MAX_OPERATIONS', 1000)
+    if len(operations) > limit:
+        return JsonResponse({'error': 'too_many_operations', 'limit': limit}, status=400)
+    results, applied = apply_batch(operations, atomic=bool(payload.get('atomic')))
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return JsonResponse({'applied': applied, 'summary': summary, 'results': results}, status=200 if applied else 400)
+
+def product_pricing_api(request):
+    """Массовое изменение цен: одна операция над выборкой товаров одним UPDATE.
+
+    Тело запроса: ``{"operation": "percent_discount", "value": 10,
+    "filter": {"ids": [...], "category": slug, "brand": slug, "tag": slug},
+    "dry_run": true}``. Только для персонала.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'invalid_method'}, status=405)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'error': 'invalid_json'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'invalid_json'}, status=400)
+    try:
+        change = pricing.build_change(payload.get('operation'), payload.get('value'))
+    except ValueError as e:
+        return JsonResponse({'error': 'invalid_operation', 'detail': str(e)}, status=400)
+    filters = payload.get('filter') or {}
+    if not isinstance(filters, dict):
+        return JsonResponse({'error': 'invalid_filter'}, status=400)
+    products = Product.objects.all()
+    if filters.get('ids') is not None:
+        try:
+            products = products.filter(pk__in=[int(pk) for pk in filters['ids']])
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'invalid_filter'}, status=400)
+    if filters.get('category'):
+        products = products.filter(category__slug=filters['category'])
+    if filters.get('brand'):
+        products = products.filter(brand__slug=filters['brand'])
+    if filters.get('tag'):
+        products = products.filter(tags__slug=filters['tag'])
+    stats = pricing.preview(products, change) if payload.get('dry_run') else None
+    data = {
+        'operation': payload.get('operation'),
+        'label': change.label,
+        'dry_run': bool(payload.get('dry_run')),
+    }
+    if stats is not None:
+        data.update({
+            'matched': stats['matched'],
+            'affected': stats['affected'],
+            'changed': stats['changed'],
+            'current_total': str(stats['current_total']),
+            'new_total': str(stats['new_total']),
+        })
+    else:
+        data['updated'] = pricing.apply(products, change)
+    return JsonResponse(data)
+
+def suggest_api(request):
+    """Подсказки по префиксу для строки поиска"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(20, int(request.GET.get('limit', 10))))
+    except Exception:
+        limit = 10
+    results = [
+        {'type': kind, 'name': name, 'url': suggestion_url(kind, slug)}
+        for kind, name, slug in get_suggest_index().suggest(query, limit)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
+def search_api(request):
+    """Полнотекстовый поиск по витрине: товары в порядке релевантности"""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(50, int(request.GET.get('limit', 20))))
+    except Exception:
+        limit = 20
+    ids = search_ids(query, limit, within=ProductListing.objects.all())
+    rows = {row['id']: row for row in listing.api_values(ProductListing.objects.filter(pk__in=ids))}
+    return JsonResponse({'query': query, 'results': [rows[pk] for pk in ids if pk in rows]})
+
+def fragment_cache_stats(request):
+    """Попадания и промахи кэша фрагментов в текущем процессе (только для персонала)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return JsonResponse({'fragments': fragments.stats.snapshot()})
+
+def perf_stats(request):
+    """Перцентили времени, SQL и размера ответов по маршрутам в текущем процессе (только для персонала)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return JsonResponse({
+        'sample_rate': getattr(settings, 'CATALOG_PERF_SAMPLE_RATE', 1.0),
+        'routes': perf.recorder.snapshot(),
+    })
+
 @csrf_exempt
 def product_detail_api(request, product_id):
     """API для работы с конкретным товаром"""
     if request.method == 'GET':
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.select_related('brand', 'category'), id=product_id)
         data = {
             'id': product.id,
             'name': product.name,
@@ -362,7 +533,7 @@ def product_detail_api(request, product_id):
             'brand': product.brand.name,
             'category': product.category.name,
         }
-        return JsonResponse(data)
+        return conditional(lambda request: JsonResponse(data), lambda: object_validators(product.updated))(request)
     if request.method == 'PUT':
         product = get_object_or_404(Product, id=product_id)
         try:
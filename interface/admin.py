@@ -1 +1,11 @@
 from django.contrib import admin
+
+from .models import UploadedFile
+
+
+@admin.register(UploadedFile)
+class UploadedFileAdmin(admin.ModelAdmin):
+    list_display = ["name", "original_name", "size", "modified", "content_hash"]
+    search_fields = ["name", "original_name", "content_hash"]
+    readonly_fields = ["name", "original_name", "size", "content_hash", "modified", "created"]
+    date_hierarchy = "modified"
@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from interface.models import UploadedFile
+from interface.uploads import file_modified, hash_file, uploads_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверка индекса UploadedFile с MEDIA_ROOT/uploads: новые файлы добавляются, "
+        "пропавшие удаляются из индекса, изменённые пересчитываются; "
+        "брошенные незавершённые загрузки удаляются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать расхождения")
+        parser.add_argument('--partial-age', type=float, default=24,
+                            help="Через сколько часов удалять незавершённые загрузки (0 — не удалять)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        base_dir = uploads_dir()
+        on_disk = {}
+        if os.path.isdir(base_dir):
+            for entry in os.scandir(base_dir):
+                # Служебные каталоги (.partial) — не файлы и в индекс не попадают
+                if entry.is_file() and not entry.name.startswith('.'):
+                    on_disk[entry.name] = entry.stat()
+        indexed = {row.name: row for row in UploadedFile.objects.all().iterator(chunk_size=options['batch_size'])}
+
+        missing = [name for name in indexed if name not in on_disk]
+        added, changed = [], []
+        for name, stat in on_disk.items():
+            row = indexed.get(name)
+            modified = file_modified(stat)
+            if row is None:
+                added.append(UploadedFile(name=name, original_name=name, size=stat.st_size, modified=modified))
+            elif row.size != stat.st_size or row.modified != modified:
+                row.size, row.modified = stat.st_size, modified
+                changed.append(row)
+
+        for label, names in (('нет на диске', missing), ('нет в индексе', [f.name for f in added]),
+                             ('изменены', [f.name for f in changed])):
+            for name in names[:20]:
+                self.stdout.write(f"  {label}: {name}")
+            if len(names) > 20:
+                self.stdout.write(f"  {label}: ... и ещё {len(names) - 20}")
+
+        stale = self.stale_partials(options['partial_age'])
+        if options['dry_run']:
+            self.stdout.write(
+                f"Добавить: {len(added)}, обновить: {len(changed)}, удалить: {len(missing)}, "
+                f"незавершённых загрузок: {len(stale)}"
+            )
+            return
+
+        # Хэш читает файл целиком — только для новых и изменённых файлов
+        for f in added + changed:
+            f.content_hash = hash_file(os.path.join(base_dir, f.name))
+        batch_size = options['batch_size']
+        UploadedFile.objects.bulk_create(added, batch_size=batch_size)
+        UploadedFile.objects.bulk_update(changed, ['size', 'modified', 'content_hash'], batch_size=batch_size)
+        for start in range(0, len(missing), batch_size):
+            UploadedFile.objects.filter(name__in=missing[start:start + batch_size]).delete()
+        for path in stale:
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено: {len(added)}, обновлено: {len(changed)}, удалено: {len(missing)}, "
+            f"удалено незавершённых загрузок: {len(stale)}"
+        ))
+
+    def stale_partials(self, hours):
+        partial_dir = os.path.join(uploads_dir(), '.partial')
+        if not hours or not os.path.isdir(partial_dir):
+            return []
+        deadline = time.time() - hours * 3600
+        return [entry.path for entry in os.scandir(partial_dir) if entry.is_file() and entry.stat().st_mtime < deadline]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('original_name', models.CharField(blank=True, max_length=255, verbose_name='Исходное имя')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('content_hash', models.CharField(db_index=True, max_length=64, verbose_name='Хэш содержимого')),
+                ('modified', models.DateTimeField(verbose_name='Изменён')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Добавлен в индекс')),
+            ],
+            options={
+                'verbose_name': 'Загруженный файл',
+                'verbose_name_plural': 'Загруженные файлы',
+                'ordering': ['-modified'],
+                'indexes': [models.Index(fields=['-modified'], name='interface_u_modifie_710ada_idx'), models.Index(fields=['size'], name='interface_u_size_eb4ad1_idx'), models.Index(fields=['original_name'], name='interface_u_origina_8844d4_idx')],
+            },
+        ),
+    ]
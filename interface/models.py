@@ -1 +1,36 @@
+from django.conf import settings
 from django.db import models
+
+
+class UploadedFile(models.Model):
+    """Файл в MEDIA_ROOT/uploads; запись создаётся при загрузке (interface.uploads).
+
+    Расхождения с диском исправляет команда reconcile_uploads.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="Имя файла")
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="Исходное имя")
+    size = models.BigIntegerField(verbose_name="Размер, байт")
+    content_hash = models.CharField(max_length=64, db_index=True, verbose_name="Хэш содержимого")
+    modified = models.DateTimeField(verbose_name="Изменён")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Добавлен в индекс")
+
+    class Meta:
+        verbose_name = "Загруженный файл"
+        verbose_name_plural = "Загруженные файлы"
+        ordering = ["-modified"]
+        indexes = [
+            models.Index(fields=["-modified"]),
+            models.Index(fields=["size"]),
+            models.Index(fields=["original_name"]),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return f"{settings.MEDIA_URL}uploads/{self.name}"
+
+    @property
+    def size_kb(self):
+        return round(self.size / 1024, 2)
@@ -1,5 +1,10 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from .forms import AddRecordForm
+import hashlib
+import os
 
 
 class AddRecordFormValidatorTests(TestCase):
@@ -37,3 +42,147 @@ class AddRecordFormValidatorTests(TestCase):
         })
         self.assertFalse(form.is_valid())
         self.assertIn("title", form.errors)
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=media,
+            INTERFACE_UPLOAD_MAX_SIZE=1000,
+            INTERFACE_UPLOAD_BLOCK_SIZE=16,
+            INTERFACE_UPLOAD_CHUNK_SIZE=32,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.uploads = os.path.join(media, "uploads")
+
+    def stored_files(self):
+        return sorted(e.name for e in os.scandir(self.uploads) if e.is_file())
+
+    def post_file(self, content, name="data.bin"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(reverse("upload_file"), {"file": SimpleUploadedFile(name, content)}, follow=True)
+
+    def put_chunk(self, upload_id, offset, data, checksum=None):
+        checksum = checksum or hashlib.sha256(data).hexdigest()
+        return self.client.put(
+            reverse("upload_api_session", args=[upload_id]), data, content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset), "Upload-Checksum": f"sha256={checksum}"},
+        )
+
+    def test_form_upload_is_moved_into_place_and_deduplicated(self):
+        content = b"x" * 100
+        resp = self.post_file(content)
+        self.assertContains(resp, "Файл загружен")
+        [name] = self.stored_files()
+        self.assertTrue(name.endswith(".bin"))
+        with open(os.path.join(self.uploads, name), "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(os.listdir(os.path.join(self.uploads, ".partial")), [])
+        resp = self.post_file(content, name="copy.bin")
+        self.assertContains(resp, f"Такой файл уже загружен: {name}")
+        self.assertEqual(self.stored_files(), [name])
+
+    def test_form_upload_size_cap(self):
+        resp = self.post_file(b"x" * 1001)
+        self.assertContains(resp, "Файл больше")
+        self.assertFalse(self.stored_files())
+        self.assertEqual(os.listdir(os.path.join(self.uploads, ".partial")), [])
+
+    def test_chunked_upload_resumes_and_matches_form_hash(self):
+        content = bytes(range(256)) * 3 + b"tail"
+        resp = self.client.post(reverse("upload_api_create"), {"name": "big.bin", "size": len(content)}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        session = resp.json()
+        upload_id = session["id"]
+        self.assertEqual(self.put_chunk(upload_id, 0, content[:32]).json()["offset"], 32)
+        # Повтор уже принятой части и неверная контрольная сумма не сдвигают смещение
+        self.assertEqual(self.put_chunk(upload_id, 0, content[:32]).status_code, 409)
+        self.assertEqual(self.put_chunk(upload_id, 32, content[32:64], checksum="0" * 64).json()["error"], "checksum_mismatch")
+        self.assertEqual(self.put_chunk(upload_id, 32, content[32:40]).json()["error"], "invalid_chunk_size")
+        self.assertEqual(self.client.get(reverse("upload_api_session", args=[upload_id])).json()["offset"], 32)
+        offset = 32
+        while offset < len(content):
+            resp = self.put_chunk(upload_id, offset, content[offset:offset + 64])
+            self.assertEqual(resp.status_code, 200)
+            offset += 64
+        result = resp.json()
+        self.assertEqual((result["status"], result["size"], result["duplicate"]), ("complete", len(content), False))
+        with open(os.path.join(self.uploads, result["name"]), "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(self.client.get(reverse("upload_api_session", args=[upload_id])).status_code, 404)
+        # Тот же файл через форму — дубль с тем же хэшем содержимого
+        resp = self.post_file(content)
+        self.assertContains(resp, f"Такой файл уже загружен: {result['name']}")
+
+    def test_chunked_upload_limits(self):
+        url = reverse("upload_api_create")
+        resp = self.client.post(url, {"name": "big.bin", "size": 1001}, content_type="application/json")
+        self.assertEqual(resp.status_code, 413)
+        upload_id = self.client.post(url, {"name": "a.bin", "size": 10}, content_type="application/json").json()["id"]
+        self.assertEqual(self.put_chunk(upload_id, 0, b"x" * 11).status_code, 413)
+        resp = self.client.delete(reverse("upload_api_session", args=[upload_id]))
+        self.assertEqual(resp.json()["status"], "aborted")
+        self.assertEqual(os.listdir(os.path.join(self.uploads, ".partial")), [])
+
+    def test_uploads_are_indexed(self):
+        from .models import UploadedFile
+        self.post_file(b"a" * 10, name="first.txt")
+        self.post_file(b"b" * 300, name="second.txt")
+        rows = {f.original_name: f for f in UploadedFile.objects.all()}
+        self.assertEqual(sorted(rows), ["first.txt", "second.txt"])
+        self.assertEqual(rows["second.txt"].size, 300)
+        self.assertEqual(sorted(f.name for f in rows.values()), self.stored_files())
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("uploaded_files_list"), {"sort": "-size"})
+        # COUNT для пагинатора и одна страница; запросы общего шаблона не считаем
+        own = [q for q in ctx.captured_queries if "interface_uploadedfile" in q["sql"]]
+        self.assertEqual(len(own), 2)
+        self.assertEqual([f.original_name for f in resp.context["files"]], ["second.txt", "first.txt"])
+        self.assertEqual(resp.context["paginator"].count, 2)
+
+    def test_upload_list_page_rendered(self):
+        self.post_file(b"a" * 10, name="first.txt")
+        resp = self.client.get(reverse("uploaded_files_list"))
+        self.assertTemplateUsed(resp, "base.html")
+        self.assertContains(resp, "<title>", count=1)
+        self.assertContains(resp, "Найдено 1 файл(ов)", count=1)
+        self.assertContains(resp, "first.txt", count=1)
+        self.assertContains(resp, '<a class="chip" href="?sort=name">по имени</a>', count=1, html=True)
+
+    def test_upload_list_empty(self):
+        resp = self.client.get(reverse("uploaded_files_list"))
+        self.assertContains(resp, "Файлов ещё нет", count=1)
+        self.assertNotContains(resp, "{%")
+
+    def test_reconcile_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import UploadedFile
+        self.post_file(b"keep", name="keep.txt")
+        self.post_file(b"gone", name="gone.txt")
+        gone = UploadedFile.objects.get(original_name="gone.txt")
+        os.remove(os.path.join(self.uploads, gone.name))
+        with open(os.path.join(self.uploads, "manual.txt"), "wb") as f:
+            f.write(b"keep")
+        partial = os.path.join(self.uploads, ".partial", "old.part")
+        open(partial, "wb").close()
+        os.utime(partial, (0, 0))
+
+        out = StringIO()
+        call_command("reconcile_uploads", "--dry-run", stdout=out)
+        self.assertIn("Добавить: 1, обновить: 0, удалить: 1, незавершённых загрузок: 1", out.getvalue())
+        self.assertTrue(UploadedFile.objects.filter(pk=gone.pk).exists())
+
+        call_command("reconcile_uploads", stdout=out)
+        self.assertFalse(UploadedFile.objects.filter(pk=gone.pk).exists())
+        manual = UploadedFile.objects.get(name="manual.txt")
+        self.assertEqual(manual.content_hash, UploadedFile.objects.get(original_name="keep.txt").content_hash)
+        self.assertFalse(os.path.exists(partial))
+        call_command("reconcile_uploads", stdout=out)
+        self.assertIn("Добавлено: 0, обновлено: 0, удалено: 0", out.getvalue().splitlines()[-1])
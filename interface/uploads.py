@@ -0,0 +1,343 @@
+"""Загрузка файлов в ``MEDIA_ROOT/uploads`` за один проход по данным.
+
+* Форма: ``DirectUploadHandler`` пишет файл из тела запроса сразу в
+  ``uploads/.partial/``, без временного файла в /tmp; после проверки формы
+  файл переименовывается в ``uploads/<uuid><ext>`` — в той же файловой
+  системе, без копирования.
+* Большие файлы: загрузка по частям с докачкой (``UploadSession``). Части
+  принимаются строго по смещению, у каждой проверяется SHA-256; прерванную
+  загрузку продолжают с последнего принятого смещения.
+
+Каждый сохранённый файл записывается в ``interface.models.UploadedFile``
+(размер, время изменения, хэш, исходное имя) — список файлов и поиск
+дублей идут по индексу, а не по каталогу.
+
+Хэш содержимого для поиска дублей считается во время записи — это SHA-256
+от склеенных hex-дайджестов SHA-256 блоков по ``INTERFACE_UPLOAD_BLOCK_SIZE``.
+Дайджесты готовых блоков хранятся в состоянии сессии, поэтому докачка в
+другом процессе не перечитывает уже записанное. Части, кроме последней,
+должны быть кратны размеру блока.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+READ_SIZE = 256 * 1024
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+StoredFile = namedtuple("StoredFile", "name size content_hash duplicate")
+
+
+class UploadError(Exception):
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+
+def get_max_size():
+    return getattr(settings, "INTERFACE_UPLOAD_MAX_SIZE", 5 * 1024 ** 3)
+
+
+def get_block_size():
+    return getattr(settings, "INTERFACE_UPLOAD_BLOCK_SIZE", 8 * 1024 ** 2)
+
+
+def get_chunk_size():
+    return getattr(settings, "INTERFACE_UPLOAD_CHUNK_SIZE", 4 * get_block_size())
+
+
+def uploads_dir():
+    return os.path.join(settings.MEDIA_ROOT, "uploads")
+
+
+def _service_dir(name):
+    path = os.path.join(uploads_dir(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class BlockHasher:
+    """SHA-256 по блокам фиксированного размера; состояние — список дайджестов."""
+
+    def __init__(self, block_size, digests=()):
+        self.block_size = block_size
+        self.digests = list(digests)
+        self._block = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.block_size - self._filled)
+            self._block.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == self.block_size:
+                self.digests.append(self._block.hexdigest())
+                self._block = hashlib.sha256()
+                self._filled = 0
+
+    def hexdigest(self):
+        digests = self.digests + ([self._block.hexdigest()] if self._filled else [])
+        return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+# --- Индекс и дубли --------------------------------------------------------
+
+def hash_file(path):
+    hasher = BlockHasher(get_block_size())
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_SIZE), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def file_modified(stat):
+    return datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)
+
+
+def find_duplicate(content_hash):
+    from .models import UploadedFile
+
+    for name in UploadedFile.objects.filter(content_hash=content_hash).values_list("name", flat=True):
+        if os.path.isfile(os.path.join(uploads_dir(), name)):
+            return name
+    return None
+
+
+def store(path, original_name, size, content_hash):
+    """Переносит готовый файл из ``.partial`` в ``uploads`` и записывает его в индекс.
+
+    Если файл с таким содержимым уже есть, новый удаляется.
+    """
+    from .models import UploadedFile
+
+    existing = find_duplicate(content_hash)
+    if existing:
+        os.remove(path)
+        return StoredFile(existing, size, content_hash, True)
+    ext = os.path.splitext(original_name)[1].lower()
+    name = f"{uuid.uuid4().hex}{ext}"
+    final_path = os.path.join(uploads_dir(), name)
+    os.replace(path, final_path)
+    UploadedFile.objects.create(
+        name=name,
+        original_name=os.path.basename(original_name)[:255],
+        size=size,
+        content_hash=content_hash,
+        modified=file_modified(os.stat(final_path)),
+    )
+    return StoredFile(name, size, content_hash, False)
+
+
+# --- Загрузка формой -------------------------------------------------------
+
+class DirectUploadedFile(UploadedFile):
+    """Файл, уже записанный в ``uploads/.partial``; хэш посчитан при записи."""
+
+    def __init__(self, path, name, content_type, size, charset, content_type_extra, content_hash):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.path = path
+        self.content_hash = content_hash
+
+    def temporary_file_path(self):
+        return self.path
+
+    def open(self, mode="rb"):
+        self.file = open(self.path, mode)
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DirectUploadHandler(FileUploadHandler):
+    """Обработчик загрузки: запись в ``uploads/.partial``, хэш и ограничение размера на лету."""
+
+    chunk_size = READ_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = get_max_size()
+        self.destination = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.path = os.path.join(_service_dir(".partial"), f"{uuid.uuid4().hex}.part")
+        self.destination = open(self.path, "wb")
+        self.hasher = BlockHasher(get_block_size())
+        self.size = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self._discard()
+            if self.request is not None:
+                self.request.upload_too_large = True
+            raise SkipFile()
+        self.destination.write(raw_data)
+        self.hasher.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.destination.close()
+        self.destination = None
+        return DirectUploadedFile(
+            self.path, self.file_name, self.content_type, file_size,
+            self.charset, self.content_type_extra, self.hasher.hexdigest(),
+        )
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def _discard(self):
+        if self.destination is not None:
+            self.destination.close()
+            self.destination = None
+            os.remove(self.path)
+
+
+def store_uploaded_file(fobj):
+    """Сохраняет файл из формы; файлы от других обработчиков копируются с подсчётом хэша."""
+    if isinstance(fobj, DirectUploadedFile):
+        fobj.close()
+        return store(fobj.path, fobj.name, fobj.size, fobj.content_hash)
+    path = os.path.join(_service_dir(".partial"), f"{uuid.uuid4().hex}.part")
+    hasher = BlockHasher(get_block_size())
+    with open(path, "wb") as dest:
+        for chunk in fobj.chunks():
+            dest.write(chunk)
+            hasher.update(chunk)
+    return store(path, fobj.name, fobj.size, hasher.hexdigest())
+
+
+# --- Загрузка по частям ---------------------------------------------------
+
+class UploadSession:
+    """Состояние — ``uploads/.partial/<id>.json``, данные — ``<id>.part`` рядом."""
+
+    def __init__(self, upload_id, state):
+        self.id = upload_id
+        self.state = state
+
+    @staticmethod
+    def _paths(upload_id):
+        base = os.path.join(_service_dir(".partial"), upload_id)
+        return base + ".json", base + ".part"
+
+    @classmethod
+    def create(cls, name, size):
+        if not isinstance(name, str) or not name.strip():
+            raise UploadError("invalid_name")
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise UploadError("invalid_size")
+        if size > get_max_size():
+            raise UploadError("too_large", status=413)
+        session = cls(uuid.uuid4().hex, {
+            "name": os.path.basename(name), "size": size, "offset": 0,
+            "block_size": get_block_size(), "blocks": [],
+        })
+        state_path, part_path = cls._paths(session.id)
+        open(part_path, "wb").close()
+        session._save()
+        return session
+
+    @classmethod
+    def load(cls, upload_id):
+        if not _ID_RE.match(upload_id or ""):
+            raise UploadError("not_found", status=404)
+        state_path, _ = cls._paths(upload_id)
+        try:
+            with open(state_path) as f:
+                return cls(upload_id, json.load(f))
+        except FileNotFoundError:
+            raise UploadError("not_found", status=404)
+
+    @property
+    def offset(self):
+        return self.state["offset"]
+
+    @property
+    def size(self):
+        return self.state["size"]
+
+    def as_dict(self):
+        return {"id": self.id, "name": self.state["name"], "offset": self.offset, "size": self.size,
+                "block_size": self.state["block_size"], "chunk_size": get_chunk_size()}
+
+    def _save(self):
+        state_path, _ = self._paths(self.id)
+        tmp = state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, state_path)
+
+    def abort(self):
+        for path in self._paths(self.id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write_chunk(self, stream, offset, length, checksum):
+        """Пишет часть из ``stream``; возвращает ``StoredFile``, если файл загружен целиком."""
+        block_size = self.state["block_size"]
+        if offset + length > self.size:
+            raise UploadError("too_large", status=413)
+        if length % block_size and offset + length != self.size:
+            raise UploadError("invalid_chunk_size")
+        _, part_path = self._paths(self.id)
+        with open(part_path, "r+b") as dest:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(dest, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadError("locked", status=409)
+            # Состояние могло измениться, пока ждали блокировку
+            self.state = self.load(self.id).state
+            if offset != self.offset:
+                raise UploadError("offset_mismatch", status=409)
+            dest.seek(offset)
+            dest.truncate()
+            hasher = BlockHasher(block_size, self.state["blocks"])
+            chunk_hash = hashlib.sha256()
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                dest.write(data)
+                hasher.update(data)
+                chunk_hash.update(data)
+                remaining -= len(data)
+            if remaining or chunk_hash.hexdigest() != checksum:
+                dest.truncate(offset)
+                raise UploadError("incomplete_chunk" if remaining else "checksum_mismatch")
+            self.state["offset"] = offset + length
+            self.state["blocks"] = hasher.digests
+            if self.offset < self.size:
+                self._save()
+                return None
+            content_hash = hasher.hexdigest()
+        stored = store(part_path, self.state["name"], self.size, content_hash)
+        self.abort()
+        return stored
@@ -5,5 +5,7 @@ urlpatterns = [
     path('', views.MainDashboardView.as_view(), name='main_dashboard'),
     path('add-record/', views.AddRecordView.as_view(), name='add_record'),
     path('upload/', views.UploadFileView.as_view(), name='upload_file'),
+    path('upload/api/', views.upload_api_create, name='upload_api_create'),
+    path('upload/api/<str:upload_id>/', views.upload_api_session, name='upload_api_session'),
     path('uploads/', views.UploadedFilesListView.as_view(), name='uploaded_files_list'),
 ]
@@ -1,11 +1,14 @@
-from django.http import HttpResponseNotFound
+from django.http import HttpResponseNotFound, JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.template.defaultfilters import filesizeformat
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from .forms import AddRecordForm, UploadFileForm
+from .models import UploadedFile
+from .uploads import DirectUploadedFile, DirectUploadHandler, UploadError, UploadSession, get_chunk_size, get_max_size, store_uploaded_file
 from django.conf import settings
-import os
-import uuid
-import datetime
+import json
 from django.views.generic import TemplateView, FormView, ListView
 
 
@@ -32,46 +35,122 @@ class AddRecordView(FormView):
         return render(self.request, self.template_name, {"form": form})
 
 def _handle_uploaded_file(fobj):
-    base_dir = os.path.join(settings.MEDIA_ROOT, "uploads")
-    os.makedirs(base_dir, exist_ok=True)
-    ext = os.path.splitext(fobj.name)[1].lower()
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    full_path = os.path.join(base_dir, unique_name)
-    with open(full_path, "wb") as dest:
-        for chunk in fobj.chunks():
-            dest.write(chunk)
-    return unique_name
+    return store_uploaded_file(fobj)
 
+# csrf_exempt снаружи и csrf_protect внутри: обработчики загрузки можно
+# заменить только до того, как CsrfViewMiddleware прочитает request.POST
+@method_decorator(csrf_exempt, name="dispatch")
 class UploadFileView(FormView):
     template_name = "interface/upload.html"
     form_class = UploadFileForm
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["max_size"] = get_max_size()
+        context["chunk_size"] = get_chunk_size()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        request.upload_handlers = [DirectUploadHandler(request)]
+        try:
+            return csrf_protect(super().post)(request, *args, **kwargs)
+        finally:
+            # Файлы, не перенесённые в uploads (ошибка формы, отказ CSRF),
+            # удаляются; если тело не разбиралось, разбирать его не нужно
+            if hasattr(request, "_files"):
+                for f in request.FILES.values():
+                    if isinstance(f, DirectUploadedFile):
+                        f.discard()
+
     def form_valid(self, form):
         f = form.cleaned_data["file"]
-        saved_name = _handle_uploaded_file(f)
-        messages.success(self.request, f"Файл загружен: {saved_name}")
+        stored = _handle_uploaded_file(f)
+        if stored.duplicate:
+            messages.success(self.request, f"Такой файл уже загружен: {stored.name}")
+        else:
+            messages.success(self.request, f"Файл загружен: {stored.name}")
         return redirect("upload_file")
 
     def form_invalid(self, form):
+        if getattr(self.request, "upload_too_large", False):
+            form.add_error("file", f"Файл больше {filesizeformat(get_max_size())}")
         messages.error(self.request, "Ошибка: проверьте корректность файла")
-        return render(self.request, self.template_name, {"form": form, "title": "Загрузка файла"})
+        return render(self.request, self.template_name, self.get_context_data(form=form, title="Загрузка файла"))
+
+@csrf_exempt
+def upload_api_create(request):
+    """Начало загрузки по частям: {"name": ..., "size": ...}"""
+    if request.method != "POST":
+        return JsonResponse({"error": "method_not_allowed"}, status=405)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        session = UploadSession.create(payload.get("name"), payload.get("size"))
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "invalid_json"}, status=400)
+    except UploadError as e:
+        return JsonResponse({"error": e.code}, status=e.status)
+    return JsonResponse(session.as_dict(), status=201)
+
+@csrf_exempt
+def upload_api_session(request, upload_id):
+    """GET — принятое смещение для докачки, PUT — очередная часть, DELETE — отмена.
+
+    Часть передаётся телом запроса с заголовками Upload-Offset и
+    Upload-Checksum (hex SHA-256 части) и читается потоком, без буфера.
+    """
+    try:
+        session = UploadSession.load(upload_id)
+        if request.method == "GET":
+            return JsonResponse(session.as_dict())
+        if request.method == "DELETE":
+            session.abort()
+            return JsonResponse({"status": "aborted"})
+        if request.method != "PUT":
+            return JsonResponse({"error": "method_not_allowed"}, status=405)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"] or 0)
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "invalid_offset"}, status=400)
+        checksum = request.headers.get("Upload-Checksum", "").removeprefix("sha256=").lower()
+        if not checksum:
+            return JsonResponse({"error": "checksum_required"}, status=400)
+        stored = session.write_chunk(request, offset, length, checksum)
+    except UploadError as e:
+        return JsonResponse({"error": e.code}, status=e.status)
+    if stored is None:
+        return JsonResponse(session.as_dict())
+    return JsonResponse({
+        "status": "complete",
+        "name": stored.name,
+        "url": f"{settings.MEDIA_URL}uploads/{stored.name}",
+        "size": stored.size,
+        "content_hash": stored.content_hash,
+        "duplicate": stored.duplicate,
+    })
 
 class UploadedFilesListView(ListView):
     template_name = "interface/upload_list.html"
     context_object_name = "files"
+    paginate_by = 50
+    # Сортировки, для которых есть индекс в UploadedFile
+    SORTS = {
+        "-modified": ("-modified", "-id"),
+        "modified": ("modified", "id"),
+        "-size": ("-size", "-id"),
+        "size": ("size", "id"),
+        "name": ("original_name", "id"),
+    }
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort", "-modified")
+        return sort if sort in self.SORTS else "-modified"
 
     def get_queryset(self):
-        base_dir = os.path.join(settings.MEDIA_ROOT, "uploads")
-        files = []
-        if os.path.isdir(base_dir):
-            for entry in os.scandir(base_dir):
-                if entry.is_file():
-                    stat = entry.stat()
-                    files.append({
-                        "name": entry.name,
-                        "url": f"{settings.MEDIA_URL}uploads/{entry.name}",
-                        "size_kb": round(stat.st_size / 1024, 2),
-                        "modified": datetime.datetime.fromtimestamp(stat.st_mtime),
-                    })
-        files.sort(key=lambda x: x["modified"], reverse=True)
-        return files
+        return UploadedFile.objects.order_by(*self.SORTS[self.get_sort()])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["sort"] = self.get_sort()
+        context["querystring"] = f"sort={self.get_sort()}"
+        return context
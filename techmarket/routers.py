@@ -0,0 +1,193 @@
+"""Чтение каталога с реплик.
+
+``ReplicaRouter`` отправляет чтение опубликованного каталога (товары,
+категории, бренды, теги, проекция витрины) на реплику из
+``DATABASE_REPLICAS``, всё остальное и любую запись — на ``default``.
+Реплика выбирается одна на запрос, чтобы COUNT и страница списка были из
+одного снимка.
+
+Read-your-writes: после записи в таблицы каталога все следующие чтения
+того же запроса идут в основную базу, а ``ReplicaPinningMiddleware`` ставит
+cookie на ``DATABASE_REPLICA_PIN_SECONDS`` — пока реплика догоняет, запросы
+этого клиента тоже читают основную базу. Небезопасные методы (POST, PUT,
+...) и адреса из ``DATABASE_REPLICA_PRIMARY_PATHS`` (админка) всегда
+читают основную базу.
+
+Вне HTTP-запроса (команды, фоновые потоки) реплики не используются.
+``primary()`` делает то же внутри запроса — для данных, которые кэшируются
+в процессе и не должны собираться из отстающей реплики.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary'
+REPLICA_MODELS = frozenset({
+    'catalog.product', 'catalog.product_tags', 'catalog.productdetail',
+    'catalog.category', 'catalog.brand', 'catalog.tag', 'catalog.productlisting',
+})
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.forced = 0
+        self.replica = None
+
+    @property
+    def use_primary(self):
+        return self.pinned or self.wrote or self.forced > 0
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def _is_primary(alias):
+    # В тестах реплика — зеркало default (TEST['MIRROR']) и читает ту же базу
+    # через отдельное соединение, которое не видит транзакцию теста
+    databases = connections.settings
+    if alias not in databases:
+        return False
+    replica, primary = databases[alias], databases[DEFAULT_DB_ALIAS]
+    return (replica['NAME'], replica.get('HOST')) == (primary['NAME'], primary.get('HOST'))
+
+
+@contextmanager
+def routing(pinned=False):
+    """Чтение с реплик внутри блока — так работает каждый HTTP-запрос."""
+    token = _state.set(RoutingState(pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    state.forced += 1
+    try:
+        yield
+    finally:
+        state.forced -= 1
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        # Явный алиас и для остальных моделей: иначе Django взял бы базу
+        # объекта из подсказки instance, то есть ту же реплику
+        state = _state.get()
+        if state is None or state.use_primary or model._meta.label_lower not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            replicas = [alias for alias in get_replicas() if not _is_primary(alias)]
+            state.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.label_lower in REPLICA_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплики приносит репликация
+        return db not in get_replicas()
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        pinned = (
+            request.method not in SAFE_METHODS
+            or PIN_COOKIE in request.COOKIES
+            or request.path.startswith(tuple(getattr(settings, 'DATABASE_REPLICA_PRIMARY_PATHS', ())))
+        )
+        return RoutingState(pinned)
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        if response.streaming:
+            # Потоковые ответы читают базу уже после выхода из middleware
+            if response.is_async:
+                response.streaming_content = _aiter_with_state(response.streaming_content, state)
+            else:
+                response.streaming_content = _iter_with_state(response.streaming_content, state)
+        return response
+
+
+def _iter_with_state(content, state):
+    # Состояние ставится только на время получения порции: между порциями
+    # итератор может продолжаться в другом контексте
+    iterator = iter(content)
+    while True:
+        token = _state.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _state.reset(token)
+        yield chunk
+
+
+async def _aiter_with_state(content, state):
+    iterator = aiter(content)
+    while True:
+        token = _state.set(state)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _state.reset(token)
+        yield chunk
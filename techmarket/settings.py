@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from techmarket.db import databases_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,13 +45,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'techmarket.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'catalog.querybudget.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'techmarket.urls'
@@ -75,11 +80,45 @@ WSGI_APPLICATION = 'techmarket.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# Профиль задаётся переменными окружения (DB_PROFILE=sqlite|sqlite-wal|postgres),
+# реплики — DATABASE_REPLICA_URLS или SQLITE_REPLICA_PATHS, см. techmarket/db.py
+DATABASES = databases_config(BASE_DIR)
+
+# Чтение каталога с реплик, запись и всё остальное — в default (techmarket/routers.py)
+DATABASE_ROUTERS = ['techmarket.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Сколько секунд после записи клиент читает основную базу (запас на отставание реплик)
+DATABASE_REPLICA_PIN_SECONDS = 5
+# Адреса, которые всегда читают основную базу
+DATABASE_REPLICA_PRIMARY_PATHS = ('/admin/',)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'fragments' — отрендеренные карточки товаров и панели фильтров (catalog.fragments).
+# locmem вытесняет записи по LRU при превышении MAX_ENTRIES. Для кэша, общего
+# для нескольких процессов:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+#   (с maxmemory-policy allkeys-lru)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+    },
+    # Версии для инвалидации фрагментов, меню и ETag (catalog.fragments) должны
+    # быть общими для всех процессов: файловый кэш — для воркеров на одной
+    # машине, для нескольких машин — Redis или DatabaseCache
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'versions',
+        'TIMEOUT': None,
+    },
 }
 
 
@@ -123,7 +162,45 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Медиа хранятся с дедупликацией по содержимому (жёсткие ссылки на общие блобы)
+STORAGES = {
+    'default': {'BACKEND': 'techmarket.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Catalog
+# Время жизни кэшированного COUNT(*) для курсорной пагинации (секунды)
+CATALOG_COUNT_CACHE_TIMEOUT = 60
+# Поисковый бэкенд: 'auto' (FTS5 на SQLite, иначе индекс в памяти), 'fts5' или 'memory'
+CATALOG_SEARCH_BACKEND = 'auto'
+CATALOG_SEARCH_LIMIT = 500
+# Размер пачки строк при потоковой выгрузке product_list_api?format=ndjson|json-stream
+CATALOG_STREAM_CHUNK_SIZE = 2000
+# Cache-Control для страниц каталога и API с ETag/Last-Modified (catalog.conditional):
+# браузер всегда перепроверяет ответ (304), CDN может отдавать его до 30 секунд
+CATALOG_CACHE_CONTROL = {'public': True, 'max_age': 0, 's_maxage': 30, 'stale_while_revalidate': 30}
+# Максимум операций в одном запросе к /catalog/api/products/batch/
+CATALOG_BATCH_MAX_OPERATIONS = 1000
+# Алиас из CACHES для кэша фрагментов шаблонов; None отключает кэширование
+CATALOG_FRAGMENT_CACHE = 'fragments'
+# Алиас из CACHES для версий фрагментов и меню — общий для всех процессов
+# (manage.py check --deploy предупреждает о locmem)
+CATALOG_VERSION_CACHE = 'versions'
+# Ширины уменьшенных копий изображений товаров (плюс WebP каждой и оригинала)
+CATALOG_THUMBNAIL_WIDTHS = (240, 480, 960)
+# Потоков для генерации копий после загрузки; 0 — сразу, в потоке запроса
+CATALOG_THUMBNAIL_WORKERS = 2
+# Замеры запросов (catalog.perf): доля запросов, попадающих в буфер для
+# /catalog/_perf/, и сколько последних записей хранить на маршрут
+CATALOG_PERF_SAMPLE_RATE = 1.0
+CATALOG_PERF_BUFFER_SIZE = 1000
+# Загрузка файлов в interface (см. interface.uploads): предельный размер файла,
+# блок хэша содержимого и рекомендуемый размер части при загрузке по частям
+INTERFACE_UPLOAD_MAX_SIZE = 5 * 1024 ** 3
+INTERFACE_UPLOAD_BLOCK_SIZE = 8 * 1024 ** 2
+INTERFACE_UPLOAD_CHUNK_SIZE = 32 * 1024 ** 2
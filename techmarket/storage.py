@@ -0,0 +1,161 @@
+"""Файловое хранилище медиа с дедупликацией по содержимому.
+
+Каждый файл пишется во временный файл с подсчётом SHA-256 на лету, после
+чего становится блобом ``MEDIA_ROOT/.cas/blobs/ab/cd/<sha256>``. Под
+запрошенным именем (``products/<uuid>.jpg``) сохраняется жёсткая ссылка на
+блоб. Одинаковые файлы — это одна копия на диске и один inode, то есть и
+одна копия в page cache; URL и имена файлов не меняются, веб-сервер
+отдаёт их как обычные файлы.
+
+Счётчик ссылок — это ``st_nlink`` блоба, его ведёт файловая система:
+``delete()`` удаляет имя, а блоб — когда на него не осталось других имён.
+Если жёсткие ссылки не поддерживаются (другая ФС, лимит ссылок), файл
+копируется, как в обычном ``FileSystemStorage``. Изменять сохранённые файлы
+на месте нельзя — изменятся все имена с тем же содержимым.
+
+Файлы, записанные в обход хранилища, переводятся на блобы командой
+``dedupe_media``.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+CAS_DIR = '.cas'
+# Ошибки os.link, при которых файл копируется вместо ссылки
+_NO_LINK_ERRORS = (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EACCES)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def _cas_path(self, *parts):
+        return os.path.join(self.location, CAS_DIR, *parts)
+
+    def blob_path(self, digest):
+        return self._cas_path('blobs', digest[:2], digest[2:4], digest)
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _link(self, source, blob, full_path):
+        """Ссылка ``full_path`` на блоб; ``source`` становится блобом, если его ещё нет."""
+        self._makedirs(os.path.dirname(blob))
+        for _ in range(3):
+            try:
+                os.link(source, blob)
+            except FileExistsError:
+                pass
+            try:
+                os.link(blob, full_path)
+                return
+            except FileNotFoundError:
+                # Блоб удалили между двумя link (последнее имя удалено) — создаём заново
+                continue
+        raise FileNotFoundError(errno.ENOENT, 'Блоб удаляется параллельно', blob)
+
+    def _save(self, name, content):
+        tmp_dir = self._cas_path('tmp')
+        self._makedirs(tmp_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    digest.update(chunk)
+            blob = self.blob_path(digest.hexdigest())
+            while True:
+                full_path = self.path(name)
+                self._makedirs(os.path.dirname(full_path))
+                try:
+                    try:
+                        self._link(tmp_path, blob, full_path)
+                    except OSError as e:
+                        if isinstance(e, FileExistsError) or e.errno not in _NO_LINK_ERRORS:
+                            raise
+                        with open(full_path, 'xb') as dest, open(tmp_path, 'rb') as src:
+                            shutil.copyfileobj(src, dest)
+                    break
+                except FileExistsError:
+                    # Имя заняли после get_available_name — как в FileSystemStorage
+                    name = self.get_available_name(name)
+        finally:
+            os.remove(tmp_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return str(name).replace('\\', '/')
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        if os.path.isdir(path):
+            os.rmdir(path)
+            return
+        # Две ссылки — это имя и блоб: после удаления имени блоб никому не нужен
+        blob = self.blob_path(file_digest(path)) if stat.st_nlink == 2 else None
+        os.remove(path)
+        if blob is not None:
+            try:
+                blob_stat = os.stat(blob)
+            except FileNotFoundError:
+                return
+            if blob_stat.st_ino == stat.st_ino and blob_stat.st_nlink == 1:
+                os.remove(blob)
+
+    def refcount(self, name):
+        """Сколько имён в хранилище ссылаются на содержимое файла ``name`` (без блоба)."""
+        return os.stat(self.path(name)).st_nlink - 1
+
+    def adopt(self, name):
+        """Переводит файл, записанный в обход хранилища, на общий блоб.
+
+        Возвращает число освобождённых байт (размер файла, если такое
+        содержимое уже было, иначе 0).
+        """
+        path = self.path(name)
+        stat = os.stat(path)
+        blob = self.blob_path(file_digest(path))
+        self._makedirs(os.path.dirname(blob))
+        try:
+            os.link(path, blob)
+            return 0
+        except FileExistsError:
+            pass
+        if os.stat(blob).st_ino == stat.st_ino:
+            return 0
+        tmp_dir = self._cas_path('tmp')
+        self._makedirs(tmp_dir)
+        tmp_path = os.path.join(tmp_dir, f'{os.path.basename(blob)}.{os.getpid()}.link')
+        os.link(blob, tmp_path)
+        # Атомарная подмена: имя всё время указывает на полный файл
+        os.replace(tmp_path, path)
+        return stat.st_size
+
+    def listdir(self, path):
+        directories, files = super().listdir(path)
+        if not path or path in ('.', '/'):
+            directories = [d for d in directories if d != CAS_DIR]
+        return directories, files